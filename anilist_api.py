@@ -1,6 +1,10 @@
 import requests
-import time
-import json
+import itertools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from http_transport import anilist_transport
+from rate_limiter import submit_in_context
 
 def get_auth_headers(token):
     return {
@@ -15,7 +19,7 @@ def get_anilist_user_id(username, token):
     url = 'https://graphql.anilist.co'
     
     try:
-        response = requests.post(url, json={'query': query, 'variables': variables}, headers=get_auth_headers(token))
+        response = anilist_transport.post(url, json={'query': query, 'variables': variables}, headers=get_auth_headers(token))
         response.raise_for_status()
         data = response.json()
         
@@ -27,101 +31,222 @@ def get_anilist_user_id(username, token):
     except requests.exceptions.RequestException as e:
         return None
 
-def fetch_anilist_library_map(user_id, token, media_type='MANGA', yield_progress_callback=None):
-    """
-    Fetches a user's library for a specific media type (MANGA or ANIME).
-    """
-    query = """
-    query ($page: Int, $perPage: Int, $userId: Int, $mediaType: MediaType) {
-        Page (page: $page, perPage: $perPage) {
-            pageInfo { currentPage, lastPage, hasNextPage }
-            mediaList(userId: $userId, type: $mediaType) {
-                status
-                progress
-                media {
-                    id
-                    siteUrl
-                    format
-                    synonyms
-                    title { romaji, english, native }
-                    coverImage { large, medium}
-                }
+_ANILIST_LIBRARY_QUERY_TEMPLATE = """
+query ($page: Int, $perPage: Int, $userId: Int, $mediaType: MediaType) {
+    Page (page: $page, perPage: $perPage) {
+        pageInfo { currentPage, lastPage, hasNextPage }
+        mediaList(userId: $userId, type: $mediaType__SORT__) {
+            status
+            progress
+            updatedAt
+            media {
+                id
+                idMal
+                siteUrl
+                format
+                synonyms
+                title { romaji, english, native }
+                coverImage { large, medium}
             }
         }
     }
-    """
+}
+"""
+ANILIST_LIBRARY_QUERY = _ANILIST_LIBRARY_QUERY_TEMPLATE.replace('__SORT__', '')
+# MediaList has no "updated since" filter, so changes are found by walking
+# the list newest-first and stopping at the first unchanged entries.
+ANILIST_LIBRARY_UPDATES_QUERY = _ANILIST_LIBRARY_QUERY_TEMPLATE.replace('__SORT__', ', sort: UPDATED_TIME_DESC')
+
+ANILIST_PAGE_CONCURRENCY = 4
+
+def _fetch_anilist_library_page(page, user_id, token, media_type, newest_first=False):
     variables = {
         'userId': user_id,
-        'page': 1,
+        'page': page,
         'perPage': 50,
-        'mediaType': media_type.upper() # Ensure it's uppercase (MANGA or ANIME)
+        'mediaType': media_type
     }
+    query = ANILIST_LIBRARY_UPDATES_QUERY if newest_first else ANILIST_LIBRARY_QUERY
     url = 'https://graphql.anilist.co'
-    
-    anilist_title_map = {}
-    entry_count = 0
-    
-    while True:
-        try:
-            response = requests.post(url, json={'query': query, 'variables': variables}, headers=get_auth_headers(token))
-            response.raise_for_status()
-            data = response.json()
 
-            if 'errors' in data:
+    try:
+        response = anilist_transport.post(url, json={'query': query, 'variables': variables}, headers=get_auth_headers(token))
+        response.raise_for_status()
+        data = response.json()
+    except requests.exceptions.RequestException as e:
+        return None
+
+    if 'errors' in data:
+        return None
+    return data['data']['Page']
+
+def _anilist_page_entries(page_data, media_type):
+    entries = []
+    for entry in page_data.get('mediaList') or []:
+        media = entry.get('media')
+
+        # Filter out novels if we are fetching manga
+        if media_type == 'MANGA' and media and media.get('format') == 'NOVEL':
+            continue
+
+        if not media:
+            continue
+
+        titles_to_add = set()
+        if media.get('title'):
+            if media['title'].get('romaji'): titles_to_add.add(media['title']['romaji'])
+            if media['title'].get('english'): titles_to_add.add(media['title']['english'])
+            if media['title'].get('native'): titles_to_add.add(media['title']['native'])
+        if media.get('synonyms'):
+            titles_to_add.update(media['synonyms'])
+
+        entries.append({
+            'mediaId': media['id'],
+            'idMal': media.get('idMal'),
+            'status': entry['status'],
+            'progress': entry['progress'],
+            'updatedAt': entry.get('updatedAt'),
+            'siteUrl': media.get('siteUrl'),
+            'title': media.get('title', {}),
+            'titles': sorted(titles_to_add),
+            'coverImage': media.get('coverImage', {})
+        })
+    return entries
+
+def iter_anilist_library_pages(user_id, token, media_type='MANGA', yield_progress_callback=None, max_concurrency=ANILIST_PAGE_CONCURRENCY, updated_after=None, library_info=None, page_callback=None):
+    """
+    Yields a user's list entries for one media type (MANGA or ANIME) a page
+    at a time, in page order.
+
+    The first page tells us `lastPage`; the remaining pages are fetched in
+    parallel with at most `max_concurrency` in flight, and each raw page is
+    dropped as soon as its entries are yielded.
+
+    With `updated_after` (a unix timestamp) pages are instead walked one by
+    one newest-first by `updatedAt`, and the walk stops at the first page
+    reaching entries that are not newer; that page is still yielded whole.
+    If given, `library_info['complete']` records whether every page
+    arrived, and `page_callback(pages_done, pages_total, entry_count)` is
+    called after each page (`pages_total` is None while walking changes).
+
+    Nothing is yielded if the first page cannot be fetched; otherwise page 1
+    is always yielded, even when it is empty.
+    """
+    media_type = media_type.upper() # Ensure it's uppercase (MANGA or ANIME)
+
+    newest_first = updated_after is not None
+    first_page = _fetch_anilist_library_page(1, user_id, token, media_type, newest_first)
+    if first_page is None:
+        return
+    if library_info is not None:
+        library_info['complete'] = True
+
+    if newest_first:
+        page, page_data = 1, first_page
+        del first_page
+        checked = 0
+        while True:
+            raw_entries = page_data.get('mediaList') or []
+            # Taken before novels are filtered out, so they still count.
+            oldest = raw_entries[-1].get('updatedAt') if raw_entries else None
+            checked += len(raw_entries)
+            has_next_page = page_data['pageInfo']['hasNextPage']
+            entries = _anilist_page_entries(page_data, media_type)
+            del page_data, raw_entries
+            if page_callback:
+                page_callback(page, None, len(entries))
+            yield entries
+            if not has_next_page or not oldest or oldest <= updated_after:
                 break
+            page += 1
+            page_data = _fetch_anilist_library_page(page, user_id, token, media_type, newest_first)
+            if page_data is None:
+                if library_info is not None:
+                    library_info['complete'] = False
+                break
+        if yield_progress_callback:
+            yield_progress_callback(f"Fetched AniList changes ({checked} entries checked)")
+        return
 
-            page_data = data['data']['Page']
-            if 'mediaList' in page_data:
-                for entry in page_data['mediaList']:
-                    media = entry.get('media')
-                    
-                    # Filter out novels if we are fetching manga
-                    if media_type.upper() == 'MANGA' and media and media.get('format') == 'NOVEL':
-                        continue 
-                    
-                    if not media:
-                        continue
-                    
-                    entry_count += 1
-                    
-                    entry_data = {
-                        'mediaId': media['id'],
-                        'status': entry['status'],
-                        'progress': entry['progress'],
-                        'siteUrl': media.get('siteUrl'),
-                        'title': media.get('title', {}),
-                        'coverImage': media.get('coverImage', {})
-                    }
-                    
-                    titles_to_add = set()
-                    if media.get('title'):
-                        if media['title'].get('romaji'): titles_to_add.add(media['title']['romaji'])
-                        if media['title'].get('english'): titles_to_add.add(media['title']['english'])
-                        if media['title'].get('native'): titles_to_add.add(media['title']['native'])
-                    if media.get('synonyms'):
-                        titles_to_add.update(media['synonyms'])
-                    
-                    for title in titles_to_add:
-                        anilist_title_map[title] = entry_data
-
-            page_info = page_data['pageInfo']
-            
-            if yield_progress_callback:
-                progress_message = f"Fetched AniList page {page_info['currentPage']} / {page_info['lastPage']}"
-                yield_progress_callback(progress_message)
+    page_info = first_page['pageInfo']
+    last_page = page_info.get('lastPage') or 1
+    has_next_page = page_info['hasNextPage']
+    entries = _anilist_page_entries(first_page, media_type)
+    del first_page
+    pages_done = 1
+    if yield_progress_callback:
+        yield_progress_callback(f"Fetched AniList page 1 / {last_page}")
+    if page_callback:
+        page_callback(pages_done, last_page, len(entries))
+    yield entries
+
+    if not has_next_page:
+        return
 
-            if not page_info['hasNextPage']: break
-            variables['page'] += 1
-            time.sleep(1)
+    pages = iter(range(2, last_page + 1))
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+        def submit(page):
+            return page, submit_in_context(executor, _fetch_anilist_library_page, page, user_id, token, media_type)
 
-        except requests.exceptions.RequestException as e:
+        in_flight = deque(submit(page) for page in itertools.islice(pages, max(1, max_concurrency)))
+        while in_flight:
+            page, future = in_flight.popleft()
+            next_page = next(pages, None)
+            if next_page is not None:
+                in_flight.append(submit(next_page))
+
+            page_data = future.result()
+            pages_done += 1
+            if page_data is None:
+                if library_info is not None:
+                    library_info['complete'] = False
+                if page_callback:
+                    page_callback(pages_done, last_page, 0)
+                continue
+            has_next_page = page_data['pageInfo']['hasNextPage']
+            entries = _anilist_page_entries(page_data, media_type)
+            del page_data
+            if yield_progress_callback:
+                yield_progress_callback(f"Fetched AniList page {page} / {last_page}")
+            if page_callback:
+                page_callback(pages_done, last_page, len(entries))
+            yield entries
+
+    # `lastPage` can lag behind the real list size; walk on sequentially if
+    # the last page still reports more data.
+    page = last_page
+    while has_next_page:
+        page += 1
+        page_data = _fetch_anilist_library_page(page, user_id, token, media_type)
+        if page_data is None:
+            if library_info is not None:
+                library_info['complete'] = False
             break
-            
-    return anilist_title_map
+        has_next_page = page_data['pageInfo']['hasNextPage']
+        entries = _anilist_page_entries(page_data, media_type)
+        del page_data
+        pages_done += 1
+        if yield_progress_callback:
+            yield_progress_callback(f"Fetched AniList page {page}")
+        if page_callback:
+            page_callback(pages_done, page + int(has_next_page), len(entries))
+        yield entries
 
-def search_anilist_by_title(title, token, media_type='MANGA'):
+def fetch_anilist_library_entries(user_id, token, media_type='MANGA', yield_progress_callback=None, max_concurrency=ANILIST_PAGE_CONCURRENCY, updated_after=None, library_info=None, page_callback=None):
+    """
+    Fetches a user's list entries for a specific media type (MANGA or ANIME)
+    as one list; see `iter_anilist_library_pages`. Returns None if the first
+    page cannot be fetched.
+    """
+    pages = list(iter_anilist_library_pages(user_id, token, media_type, yield_progress_callback, max_concurrency, updated_after, library_info, page_callback))
+    if not pages:
+        return None
+    return [entry for page in pages for entry in page]
+
+def search_anilist_by_title(title, token, media_type='MANGA', raise_on_error=False):
     """
     Searches AniList for a media item by title and type.
+    With `raise_on_error`, request failures raise instead of looking like "no match".
     """
     query = """
     query ($search: String, $page: Int, $perPage: Int, $mediaType: MediaType) {
@@ -145,7 +270,7 @@ def search_anilist_by_title(title, token, media_type='MANGA'):
     url = 'https://graphql.anilist.co'
     
     try:
-        response = requests.post(url, json={'query': query, 'variables': variables}, headers=get_auth_headers(token))
+        response = anilist_transport.post(url, json={'query': query, 'variables': variables}, headers=get_auth_headers(token))
         response.raise_for_status()
         data = response.json()
         
@@ -160,8 +285,90 @@ def search_anilist_by_title(title, token, media_type='MANGA'):
             return None
             
     except requests.exceptions.RequestException:
+        if raise_on_error:
+            raise
+        return None
+
+# AniList rejects documents above its query complexity limit; this many
+# aliased searches stays well inside it. Oversized batches are split anyway.
+ANILIST_SEARCH_BATCH_SIZE = 20
+
+_ANILIST_SEARCH_FRAGMENT = """
+fragment SearchMedia on Media {
+  id
+  siteUrl
+  format
+  title { romaji, english }
+  coverImage { large, medium }
+}
+"""
+
+def _first_search_match(media_list, media_type):
+    for media in media_list or []:
+        # Filter out novels if we are searching for manga
+        if media_type == 'MANGA' and media.get('format') == 'NOVEL':
+            continue
+        return media
+    return None
+
+def _search_anilist_batch(titles, token, media_type):
+    variable_defs = ''.join(f", $q{i}: String" for i in range(len(titles)))
+    selections = '\n'.join(
+        f"  q{i}: Page(page: 1, perPage: 5) {{ media(search: $q{i}, type: $mediaType, sort: SEARCH_MATCH) {{ ...SearchMedia }} }}"
+        for i in range(len(titles))
+    )
+    query = f"query ($mediaType: MediaType{variable_defs}) {{\n{selections}\n}}\n{_ANILIST_SEARCH_FRAGMENT}"
+    variables = {'mediaType': media_type}
+    variables.update({f"q{i}": title for i, title in enumerate(titles)})
+    url = 'https://graphql.anilist.co'
+
+    try:
+        response = anilist_transport.post(url, json={'query': query, 'variables': variables}, headers=get_auth_headers(token))
+        data = response.json()
+    except (requests.exceptions.RequestException, ValueError):
+        return None
+
+    if not data.get('data'):
+        # Only a query AniList rejected as a whole (a GraphQL validation or
+        # complexity error) is worth retrying in halves; rate limits, auth
+        # and server errors would fail the same way for every half.
+        rejected_query = response.status_code in (200, 400) and data.get('errors')
+        if len(titles) > 1 and rejected_query:
+            middle = len(titles) // 2
+            first = _search_anilist_batch(titles[:middle], token, media_type)
+            second = _search_anilist_batch(titles[middle:], token, media_type)
+            if first is None and second is None:
+                return None
+            return {**(first or {}), **(second or {})}
         return None
 
+    results = {}
+    for i, title in enumerate(titles):
+        page = data['data'].get(f"q{i}")
+        if page is None:
+            # The alias failed on its own; leave it unanswered.
+            continue
+        results[title] = _first_search_match(page.get('media'), media_type)
+    return results
+
+def search_anilist_by_titles(titles, token, media_type='MANGA', batch_size=ANILIST_SEARCH_BATCH_SIZE):
+    """
+    Searches AniList for many titles at once by packing up to `batch_size`
+    aliased Page(search: ...) selections into each GraphQL request.
+
+    Returns a map of title -> best media match (None when AniList has no
+    match). Titles whose request failed are left out, so callers can tell
+    "no match" apart from "not answered".
+    """
+    media_type = media_type.upper()
+    unique_titles = list(dict.fromkeys(t for t in titles if t))
+    results = {}
+    for i in range(0, len(unique_titles), batch_size):
+        batch_results = _search_anilist_batch(unique_titles[i:i + batch_size], token, media_type)
+        if batch_results:
+            results.update(batch_results)
+    return results
+
 def update_anilist_entry_full(media_id, status, progress, token):
     mutation = """
     mutation ($mediaId: Int, $status: MediaListStatus, $progress: Int) {
@@ -179,7 +386,7 @@ def update_anilist_entry_full(media_id, status, progress, token):
     }
     url = 'https://graphql.anilist.co'
     try:
-        response = requests.post(url, json={'query': mutation, 'variables': variables}, headers=get_auth_headers(token))
+        response = anilist_transport.post(url, json={'query': mutation, 'variables': variables}, headers=get_auth_headers(token))
         response.raise_for_status()
         data = response.json()
         if 'errors' in data:
@@ -204,7 +411,7 @@ def update_anilist_entry_status(media_id, status, token):
     }
     url = 'https://graphql.anilist.co'
     try:
-        response = requests.post(url, json={'query': mutation, 'variables': variables}, headers=get_auth_headers(token))
+        response = anilist_transport.post(url, json={'query': mutation, 'variables': variables}, headers=get_auth_headers(token))
         response.raise_for_status()
         data = response.json()
         if 'errors' in data:
@@ -213,3 +420,63 @@ def update_anilist_entry_status(media_id, status, token):
             return True
     except requests.exceptions.RequestException as e:
         return False
+
+ANILIST_MUTATION_BATCH_SIZE = 25
+
+def _update_anilist_entries_batch(items, token):
+    variable_defs = []
+    selections = []
+    variables = {}
+    for i, item in enumerate(items):
+        arguments = [f"mediaId: $m{i}", f"status: $s{i}"]
+        variable_defs += [f"$m{i}: Int", f"$s{i}: MediaListStatus"]
+        variables[f"m{i}"] = item['mediaId']
+        variables[f"s{i}"] = item.get('status')
+        if item.get('progress') is not None:
+            arguments.append(f"progress: $p{i}")
+            variable_defs.append(f"$p{i}: Int")
+            variables[f"p{i}"] = item['progress']
+        selections.append(f"  e{i}: SaveMediaListEntry({', '.join(arguments)}) {{ id status progress }}")
+    mutation = f"mutation ({', '.join(variable_defs)}) {{\n" + '\n'.join(selections) + "\n}"
+    url = 'https://graphql.anilist.co'
+
+    try:
+        response = anilist_transport.post(url, json={'query': mutation, 'variables': variables}, headers=get_auth_headers(token))
+        data = response.json()
+    except (requests.exceptions.RequestException, ValueError) as e:
+        return [{'mediaId': item['mediaId'], 'success': False, 'retryable': True, 'message': f"Request failed: {e}"} for item in items]
+
+    # Errors name the alias they belong to through `path`.
+    errors_by_alias = {}
+    for error in data.get('errors') or []:
+        path = error.get('path') or []
+        errors_by_alias.setdefault(path[0] if path else None, error.get('message', 'Unknown error'))
+
+    saved = data.get('data') or {}
+    server_side = response.status_code == 429 or response.status_code >= 500
+    results = []
+    for i, item in enumerate(items):
+        alias = f"e{i}"
+        if saved.get(alias):
+            results.append({'mediaId': item['mediaId'], 'success': True, 'retryable': False, 'message': 'Saved.'})
+        else:
+            message = errors_by_alias.get(alias) or errors_by_alias.get(None) or f"HTTP {response.status_code}"
+            # An error aimed at this entry (bad status, unknown media) will not go away on retry.
+            retryable = server_side and alias not in errors_by_alias
+            results.append({'mediaId': item['mediaId'], 'success': False, 'retryable': retryable, 'message': message})
+    return results
+
+def update_anilist_entries_bulk(items, token, batch_size=ANILIST_MUTATION_BATCH_SIZE):
+    """
+    Saves many list entries with aliased SaveMediaListEntry mutations, up to
+    `batch_size` per request. Each item is a dict with `mediaId`, `status`
+    and optionally `progress` (left unchanged when None).
+
+    Returns one {'mediaId', 'success', 'retryable', 'message'} dict per item,
+    in order; `retryable` marks failures worth another attempt (network
+    errors, 429 and 5xx responses).
+    """
+    results = []
+    for i in range(0, len(items), batch_size):
+        results.extend(_update_anilist_entries_batch(items[i:i + batch_size], token))
+    return results
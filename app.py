@@ -1,446 +1,101 @@
 import os
-import time
 import json
-import re
-import unicodedata
-from flask import Flask, render_template, Response, stream_with_context, request, jsonify
+import requests
+from flask import Flask, render_template, Response, stream_with_context, request, jsonify, send_file, redirect
 from flask_cors import CORS
 from dotenv import load_dotenv
 
 from anilist_api import (
-    get_anilist_user_id, fetch_anilist_library_map, search_anilist_by_title,
-    update_anilist_entry_full, update_anilist_entry_status
+    update_anilist_entry_full, update_anilist_entry_status, update_anilist_entries_bulk
 )
 from kitsu_api import (
-    fetch_kitsu_library, get_kitsu_auth_token, get_kitsu_user_id_from_token,
-    update_kitsu_entry, translate_anilist_to_kitsu_status,
-    search_kitsu_by_title, add_kitsu_entry
+    update_kitsu_entry, translate_anilist_to_kitsu_status, add_kitsu_entry
 )
-from audit import compare_and_report
+from audit_pipeline import AuditAccount, run_audit, audit_concurrency
+from http_transport import anilist_transport, kitsu_transport, fit_pools
+from credentials import credential_cache
+from library_snapshots import SnapshotStore
+from search_cache import SearchCache
+from sync_jobs import SyncJobManager, parse_sync_item
+from report_view import (
+    REPORT_CATEGORIES, HIDDEN_CATEGORIES, REPORT_SYNC_ACTIONS, REPORT_PAGE_LIMIT, REPORT_MAX_LIMIT,
+    filter_report_items, report_counts, report_page, sync_payload
+)
+from report_store import ReportStore
+from audit_registry import AuditRegistry
+from thumbnails import ThumbnailCache
 
 load_dotenv()
 ANILIST_USERNAME = os.getenv('ANILIST_USERNAME')
 ANILIST_ACCESS_TOKEN = os.getenv('ANILIST_ACCESS_TOKEN')
 KITSU_USERNAME = os.getenv('KITSU_USERNAME')
 KITSU_PASSWORD = os.getenv('KITSU_PASSWORD')
+SNAPSHOT_DB_PATH = os.getenv('SNAPSHOT_DB_PATH', 'library_snapshots.sqlite3')
+SEARCH_CACHE_PATH = os.getenv('SEARCH_CACHE_PATH', 'search_cache.sqlite3')
+SEARCH_CACHE_HIT_TTL_HOURS = float(os.getenv('SEARCH_CACHE_HIT_TTL_HOURS', 24 * 7))
+SEARCH_CACHE_MISS_TTL_HOURS = float(os.getenv('SEARCH_CACHE_MISS_TTL_HOURS', 24))
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv('SEARCH_CACHE_MAX_ENTRIES', 20000))
+FUZZY_MATCH_THRESHOLD = float(os.getenv('FUZZY_MATCH_THRESHOLD', 0.8))
+SEARCH_LANE_WORKERS = int(os.getenv('SEARCH_LANE_WORKERS', 2))
+SYNC_JOB_WORKERS = int(os.getenv('SYNC_JOB_WORKERS', 6))
+REPORT_DB_PATH = os.getenv('REPORT_DB_PATH', 'reports.sqlite3')
+REPORT_HISTORY_LIMIT = int(os.getenv('REPORT_HISTORY_LIMIT', 100))
+THUMBNAIL_CACHE_DIR = os.getenv('THUMBNAIL_CACHE_DIR', 'thumbnail_cache')
+THUMBNAIL_CACHE_MAX_MB = float(os.getenv('THUMBNAIL_CACHE_MAX_MB', 200))
+# Thumbnails are keyed by source URL, so browsers may keep them for a year.
+THUMBNAIL_MAX_AGE = 365 * 24 * 3600
 
 app = Flask(__name__)
 CORS(app) 
 
-latest_report = None
-kitsu_token = None
-KITSU_USER_ID_MANUAL = None
+snapshot_store = SnapshotStore(SNAPSHOT_DB_PATH)
+search_cache = SearchCache(
+    SEARCH_CACHE_PATH,
+    hit_ttl=SEARCH_CACHE_HIT_TTL_HOURS * 3600,
+    miss_ttl=SEARCH_CACHE_MISS_TTL_HOURS * 3600,
+    max_entries=SEARCH_CACHE_MAX_ENTRIES
+)
+sync_jobs = SyncJobManager(workers=SYNC_JOB_WORKERS)
+report_store = ReportStore(REPORT_DB_PATH, history_limit=REPORT_HISTORY_LIMIT)
+audit_registry = AuditRegistry()
+thumbnail_cache = ThumbnailCache(THUMBNAIL_CACHE_DIR, max_bytes=int(THUMBNAIL_CACHE_MAX_MB * 1024 * 1024))
+# An audit and a "Sync all" job can be talking to the same provider at once.
+fit_pools(audit_concurrency(SEARCH_LANE_WORKERS) + SYNC_JOB_WORKERS)
 
 def _sse_format(message, event_type='log'):
     return f"event: {event_type}\ndata: {json.dumps({'message': message})}\n\n"
 
-def _derive_large_from_anilist_url(url):
-    if not url:
-        return None
-    return url.replace('/cover/small/', '/cover/large/').replace('/cover/medium/', '/cover/large/')
-
-def _pick_anilist_image(cover_dict):
-    if not isinstance(cover_dict, dict):
-        return None
-    return cover_dict.get('large') or cover_dict.get('medium') or _derive_large_from_anilist_url(cover_dict.get('small')) or cover_dict.get('small')
-
-def _normalize_title_for_match(s):
-    if not s:
-        return None
-    cleaned = re.sub(r'[~:;,\-–—\.…·!?"\'\(\)\[\]\{\}\/\\&]', ' ', s)
-    cleaned = re.sub(r'\s+', ' ', cleaned).strip().lower()
-    return cleaned or None
-
-def _sanitize_search_query(s):
-    if not s:
-        return None
-    q = re.sub(r'[~:;,\-–—\.…·!?"\'\(\)\[\]\{\}\/\\]', ' ', s)
-    q = re.sub(r'\s+', ' ', q).strip()
-    return q or None
-
-def _normalize_for_dedupe(s):
-    if not s:
-        return None
-    nk = unicodedata.normalize('NFKD', s)
-    ascii_only = nk.encode('ascii', 'ignore').decode('ascii')
-    cleaned = re.sub(r'[^0-9A-Za-z\s]', ' ', ascii_only)
-    cleaned = re.sub(r'\s+', ' ', cleaned).strip().lower()
-    return cleaned or None
-
-def run_audit_stream(media_type='MANGA'):
-    global latest_report
-    global kitsu_token
-    global KITSU_USER_ID_MANUAL
-    
-    if media_type.upper() not in ['MANGA', 'ANIME']:
-        media_type = 'MANGA'
-    else:
-        media_type = media_type.upper()
-        
-    kitsu_media_type = media_type.lower()
-    
+def _load_report(media_type=None):
+    # The newest stored report for the configured accounts.
+    return report_store.latest(ANILIST_USERNAME, KITSU_USERNAME, media_type)
+
+def _configured_account():
+    return AuditAccount(ANILIST_USERNAME, ANILIST_ACCESS_TOKEN, KITSU_USERNAME, KITSU_PASSWORD)
+
+def run_audit_stream(media_type='MANGA', cancelled=None, account=None):
+    """Runs an audit of `account` (the configured accounts by default) as SSE messages and stores its report."""
+    account = account or _configured_account()
+    for event_type, payload in run_audit(account, snapshot_store, search_cache, media_type=media_type,
+                                         fuzzy_threshold=FUZZY_MATCH_THRESHOLD, search_lane_workers=SEARCH_LANE_WORKERS,
+                                         cancelled=cancelled):
+        if event_type in ('log', 'error'):
+            yield _sse_format(payload, event_type)
+        elif event_type == 'report':
+            report_store.save(account.anilist_username, account.kitsu_username, payload['report']['media_type'], payload['report'],
+                              summary=payload['summary'])
+            yield f"event: report\ndata: {json.dumps(payload['summary'])}\n\n"
+        elif event_type != 'item':
+            yield f"event: {event_type}\ndata: {json.dumps(payload)}\n\n"
+
+def _with_kitsu_token(request_fn):
+    return credential_cache.with_kitsu_token(KITSU_USERNAME, KITSU_PASSWORD, request_fn)
+
+def _kitsu_write(request_fn):
+    # Failures come back as False, like the Kitsu write helpers without `raise_on_error`.
     try:
-        def yield_log(message):
-            yield _sse_format(message)
-        
-        def yield_progress(current, total, message):
-            progress_data = { 'current': current, 'total': total, 'message': message }
-            yield f"event: progress\ndata: {json.dumps(progress_data)}\n\n"
-
-        if not ANILIST_ACCESS_TOKEN or len(ANILIST_ACCESS_TOKEN) < 50:
-            yield _sse_format("ERROR: Your ANILIST_ACCESS_TOKEN in .env looks incorrect or is missing.", "error")
-            return
-        
-        yield _sse_format(f"--- Starting {media_type.capitalize()} Library Audit ---")
-
-        yield _sse_format("Getting Kitsu token...")
-        kitsu_token = get_kitsu_auth_token(KITSU_USERNAME, KITSU_PASSWORD)
-        if not kitsu_token:
-            yield _sse_format("Halting: Could not get Kitsu access token. Check credentials in .env.", "error")
-            return
-        yield _sse_format("  -> Kitsu token OK.")
-
-        yield _sse_format("Getting Kitsu User ID...")
-        kitsu_id = get_kitsu_user_id_from_token(kitsu_token)
-        if not kitsu_id:
-            yield _sse_format("Halting: Could not fetch Kitsu User ID.", "error")
-            return
-        yield _sse_format(f"  -> Found Kitsu User ID: {kitsu_id}")
-
-        yield _sse_format("Getting AniList User ID...")
-        anilist_id = get_anilist_user_id(ANILIST_USERNAME, ANILIST_ACCESS_TOKEN)
-        if not anilist_id:
-            yield _sse_format("Halting: Could not get Anilist User ID. Is your ACCESS_TOKEN valid?", "error")
-            return
-        yield _sse_format(f"  -> Found AniList User ID: {anilist_id}")
-        
-        yield _sse_format(f"Fetching AniList {media_type.capitalize()} library (this may take a moment)...")
-        anilist_title_map = fetch_anilist_library_map(
-            anilist_id, 
-            ANILIST_ACCESS_TOKEN,
-            media_type=media_type,
-            yield_progress_callback=lambda msg: next(yield_log(msg), None)
-        )
-        anilist_norm_map = {}
-        anilist_media_norm_titles = {}
-        for raw_title, entry in anilist_title_map.items():
-            norm = _normalize_title_for_match(raw_title)
-            if not norm:
-                continue
-
-            anilist_norm_map.setdefault(norm, entry)
-            media_id = entry.get('mediaId')
-            if media_id:
-                anilist_media_norm_titles.setdefault(media_id, set()).add(norm)
-        yield _sse_format("  -> AniList fetch complete.")
-
-        yield _sse_format(f"Fetching Kitsu {media_type.capitalize()} library (this may take a moment)...")
-        kitsu_media_list = fetch_kitsu_library(
-            kitsu_id, 
-            kitsu_token,
-            media_type=kitsu_media_type,
-            yield_progress_callback=lambda msg: next(yield_log(msg), None)
-        )
-        if not kitsu_media_list:
-            yield _sse_format("Halting: Kitsu library could not be fetched.", "error")
-            return
-        yield _sse_format("  -> Kitsu fetch complete.")
-
-        anilist_media_map = {entry['mediaId']: entry for entry in anilist_title_map.values()}
-        
-        reports = {
-            'ok': [], 'mismatch_status': [], 'anilist_higher': [], 'kitsu_higher': [],
-            'found_on_anilist': [], 
-            'not_found_on_anilist': [],
-            'found_on_kitsu': [], 
-            'not_found_on_kitsu': []
-        }
-        processed_kitsu_indices = set()
-        processed_anilist_media_ids = set()
-
-        total_kitsu_entries = len(kitsu_media_list)
-        yield _sse_format(f"--- Comparing Libraries (Pass 1: Kitsu -> AniList)... ---")
-        yield _sse_format(f"Found {total_kitsu_entries} Kitsu entries to check.")
-
-        for i, kitsu_entry in enumerate(kitsu_media_list):
-            kitsu_title = kitsu_entry.get('canonicalTitle')
-            
-            yield from yield_progress(
-                current=i + 1,
-                total=total_kitsu_entries,
-                message=f"Checking (1/2): {kitsu_title}"
-            )
-
-            match_found = False
-            anilist_entry = None
-            for title in kitsu_entry.get('titles', []):
-                norm = _normalize_title_for_match(title)
-                if not norm:
-                    continue
-                entry = anilist_norm_map.get(norm)
-                if entry:
-                    anilist_entry = entry
-                    match_found = True
-                    break
-            
-            if match_found:
-                media_id = anilist_entry['mediaId']
-                if media_id not in processed_anilist_media_ids:
-                    processed_kitsu_indices.add(i)
-                    processed_anilist_media_ids.add(media_id)
-                    compare_and_report(
-                        kitsu_entry, 
-                        anilist_entry, 
-                        reports, 
-                        kitsu_entry['kitsuUrl'], 
-                        anilist_entry['siteUrl']
-                    )
-            
-        yield _sse_format(f"--- Comparing Libraries (Pass 2: AniList -> Kitsu)... ---")
-        total_anilist_entries = len(anilist_media_map)
-        pass_2_checked = 0
-        
-        for media_id, anilist_entry in anilist_media_map.items():
-            pass_2_checked += 1
-            if media_id in processed_anilist_media_ids:
-                continue 
-
-            yield from yield_progress(
-                current=pass_2_checked,
-                total=total_anilist_entries,
-                message=f"Checking (2/2): Unmatched AniList item {media_id}"
-            )
-            
-            anilist_titles_set = anilist_media_norm_titles.get(media_id, set())
-            
-            for i, kitsu_entry in enumerate(kitsu_media_list):
-                if i in processed_kitsu_indices:
-                    continue 
-
-                kitsu_norm_titles = {_normalize_title_for_match(t) for t in kitsu_entry.get('titles', [])}
-                if kitsu_norm_titles & anilist_titles_set:
-                    yield _sse_format(f"  -> Found reverse match for AL item: {next(iter(kitsu_norm_titles & anilist_titles_set))}")
-                    processed_kitsu_indices.add(i)
-                    processed_anilist_media_ids.add(media_id)
-                    compare_and_report(
-                        kitsu_entry, 
-                        anilist_entry, 
-                        reports, 
-                        kitsu_entry['kitsuUrl'], 
-                        anilist_entry['siteUrl']
-                    )
-                    break 
-
-    
-        yield _sse_format("--- Searching for database matches for missing items... ---")
-        
-        unprocessed_kitsu_items = [k for i, k in enumerate(kitsu_media_list) if i not in processed_kitsu_indices]
-        unprocessed_anilist_items = [a for m_id, a in anilist_media_map.items() if m_id not in processed_anilist_media_ids]
-
-        total_search_items = len(unprocessed_kitsu_items) + len(unprocessed_anilist_items)
-        current_search_item = 0
-
-        found_on_anilist_ids = set()
-        found_on_kitsu_ids = set()
-
-        for kitsu_entry in unprocessed_kitsu_items:
-            current_search_item += 1
-            k_title = kitsu_entry['canonicalTitle']
-            yield from yield_progress(
-                current_search_item, 
-                total_search_items, 
-                f"Searching AniList for: {k_title}"
-            )
-            
-            search_result = None
-            for title_to_search in kitsu_entry.get('titles', []):
-                 search_q = _sanitize_search_query(title_to_search)
-                 if not search_q:
-                     continue
-                 search_result = search_anilist_by_title(search_q, ANILIST_ACCESS_TOKEN, media_type=media_type)
-                 time.sleep(1) # Rate limit
-                 if search_result:
-                     break
-            
-            if search_result:
-                media_id = search_result.get('id')
-                if media_id in anilist_media_map:
-                    yield _sse_format(f"  -> SKIP: AniList media {media_id} for {k_title} is already in user library.")
-                    processed_anilist_media_ids.add(media_id)
-                    continue
-                if media_id in found_on_anilist_ids or media_id in processed_anilist_media_ids:
-                    yield _sse_format(f"  -> Skipping duplicate AniList DB match for: {k_title}")
-                    continue
-
-                yield _sse_format(f"  -> Found AniList DB match for: {k_title}")
-                reports['found_on_anilist'].append({
-                    'k_title': kitsu_entry.get('canonicalTitle'),
-                    'k_url': kitsu_entry.get('kitsuUrl'),
-                    'k_image': kitsu_entry.get('kitsuImage', {}).get('large'),
-                    'k_status': kitsu_entry.get('status'),
-                    'k_progress': kitsu_entry.get('progress'),
-                    
-                    'a_title': search_result.get('title', {}).get('romaji') or search_result.get('title', {}).get('english'),
-                    'a_url': search_result.get('siteUrl'),
-                    'a_image': _pick_anilist_image(search_result.get('coverImage', {})),
-                    'a_media_id': search_result.get('id')
-                })
-                found_on_anilist_ids.add(media_id)
-            else:
-                yield _sse_format(f"  -> No AniList DB match for: {k_title}")
-                reports['not_found_on_anilist'].append({
-                    'k_title': kitsu_entry.get('canonicalTitle'),
-                    'k_url': kitsu_entry.get('kitsuUrl'),
-                    'k_image': kitsu_entry.get('kitsuImage', {}).get('large'),
-                    'k_status': kitsu_entry.get('status'),
-                    'k_progress': kitsu_entry.get('progress'),
-                })
-
-        kitsu_media_ids_in_library = {str(k.get('media_id')) for k in kitsu_media_list if k.get('media_id')}
-        for anilist_entry in unprocessed_anilist_items:
-            current_search_item += 1
-            title_obj = anilist_entry.get('title') or {}
-            a_title = title_obj.get('romaji') or title_obj.get('english') or title_obj.get('native')
-            if not a_title:
-                a_title = anilist_entry.get('a_title_romaji') or anilist_entry.get('a_title_english')
-
-            if not a_title:
-                yield _sse_format("  -> Skipping AniList item with no usable title.")
-                reports['not_found_on_kitsu'].append({
-                    'a_title': None,
-                    'a_url': anilist_entry.get('siteUrl'),
-                    'a_image': _pick_anilist_image(anilist_entry.get('coverImage', {})),
-                    'a_status': anilist_entry.get('status'),
-                    'a_progress': anilist_entry.get('progress'),
-                })
-                continue
-
-            yield from yield_progress(
-                current_search_item,
-                total_search_items,
-                f"Searching Kitsu for: {a_title}"
-            )
-
-            search_q = _sanitize_search_query(a_title)
-            if not search_q:
-                search_result = None
-            else:
-                search_result = search_kitsu_by_title(search_q, kitsu_token, media_type=kitsu_media_type)
-                time.sleep(1) # Rate limit
-
-            if search_result:
-                k_media_id = search_result.get('id')
-                if k_media_id in kitsu_media_ids_in_library:
-                    yield _sse_format(f"  -> SKIP: Kitsu media {k_media_id} for {a_title} is already in user library.")
-                    continue
-                if k_media_id in found_on_kitsu_ids:
-                    yield _sse_format(f"  -> Skipping duplicate Kitsu DB match for: {a_title}")
-                    continue
-
-                yield _sse_format(f"  -> Found Kitsu DB match for: {a_title}")
-                reports['found_on_kitsu'].append({
-                    'a_title': a_title,
-                    'a_url': anilist_entry.get('siteUrl'),
-                    'a_image': _pick_anilist_image(anilist_entry.get('coverImage', {})),
-                    'a_status': anilist_entry.get('status'),
-                    'a_progress': anilist_entry.get('progress'),
-                    
-                    'k_title': search_result.get('attributes', {}).get('canonicalTitle'),
-                    'k_url': f"https://kitsu.io/{kitsu_media_type}/{search_result.get('attributes', {}).get('slug')}",
-                    'k_image': search_result.get('attributes', {}).get('posterImage', {}).get('large'),
-                    'k_media_id': search_result.get('id'),
-                    'a_media_id': anilist_entry.get('mediaId'),
-                    'media_type': kitsu_media_type
-                })
-                found_on_kitsu_ids.add(k_media_id)
-            else:
-                yield _sse_format(f"  -> No Kitsu DB match for: {a_title}")
-                reports['not_found_on_kitsu'].append({
-                    'a_title': a_title,
-                    'a_url': anilist_entry.get('siteUrl'),
-                    'a_image': _pick_anilist_image(anilist_entry.get('coverImage', {})),
-                    'a_status': anilist_entry.get('status'),
-                    'a_progress': anilist_entry.get('progress'),
-                })
-
-        
-        seen_a_ids = set()
-        seen_k_ids = set()
-        seen_pairs = set()
-
-        def _pair(it):
-            return (_normalize_for_dedupe(it.get('k_title') or ''), _normalize_for_dedupe(it.get('a_title') or ''))
-
-        anilist_out = []
-        for it in reports['found_on_anilist']:
-            a_id = it.get('a_media_id')
-            k_id = it.get('k_media_id')
-            pair = _pair(it)
-            if a_id and a_id in seen_a_ids:
-                continue
-            if k_id and k_id in seen_k_ids:
-                continue
-            if pair in seen_pairs:
-                continue
-            anilist_out.append(it)
-            if a_id:
-                seen_a_ids.add(a_id)
-            if k_id:
-                seen_k_ids.add(k_id)
-            seen_pairs.add(pair)
-        reports['found_on_anilist'] = anilist_out
-
-        kitsu_out = []
-        for it in reports['found_on_kitsu']:
-            a_id = it.get('a_media_id')
-            k_id = it.get('k_media_id')
-            pair = _pair(it)
-
-            if a_id and a_id in seen_a_ids:
-                continue
-            if k_id and k_id in seen_k_ids:
-                continue
-            if pair in seen_pairs:
-                continue
-            kitsu_out.append(it)
-            if a_id:
-                seen_a_ids.add(a_id)
-            if k_id:
-                seen_k_ids.add(k_id)
-            seen_pairs.add(pair)
-        reports['found_on_kitsu'] = kitsu_out
-
-        if seen_a_ids:
-            reports['not_found_on_kitsu'] = [n for n in reports['not_found_on_kitsu'] if n.get('a_title') and _normalize_for_dedupe(n.get('a_title')) not in {p[1] for p in seen_pairs} and n.get('a_title') not in {it.get('a_title') for it in reports['found_on_anilist']}]
-        if seen_k_ids:
-            reports['not_found_on_anilist'] = [n for n in reports['not_found_on_anilist'] if n.get('k_title') and _normalize_for_dedupe(n.get('k_title')) not in {p[0] for p in seen_pairs} and n.get('k_title') not in {it.get('k_title') for it in reports['found_on_kitsu']}]
-
-        latest_report = reports
-        latest_report['kitsu_user_id'] = kitsu_id
-        latest_report['media_type'] = kitsu_media_type
-        
-        report_summary_data = {
-            'kitsu_total': len(kitsu_media_list),
-            'anilist_total': len(anilist_media_map),
-            'ok': len(reports['ok']),
-            'mismatch_status': len(reports['mismatch_status']),
-            'anilist_higher': len(reports['anilist_higher']),
-            'kitsu_higher': len(reports['kitsu_higher']),
-            'found_on_anilist': len(reports['found_on_anilist']),
-            'not_found_on_anilist': len(reports['not_found_on_anilist']),
-            'found_on_kitsu': len(reports['found_on_kitsu']),
-            'not_found_on_kitsu': len(reports['not_found_on_kitsu']),
-        }
-        
-        yield f"event: report\ndata: {json.dumps(report_summary_data)}\n\n"
-        yield _sse_format("--- Audit Complete ---")
-
-    except GeneratorExit:
-        return
-    except Exception as e:
-        yield _sse_format(f"An uncaught error occurred: {e}", "error")
-        import traceback
-        traceback.print_exc()
+        return _with_kitsu_token(request_fn)
+    except requests.exceptions.RequestException:
+        return False
 
 @app.route('/sync', methods=['POST'])
 def sync_entry():
@@ -451,7 +106,7 @@ def sync_entry():
     try:
         kitsu_token = None
         if sync_target == 'kitsu': 
-            kitsu_token = get_kitsu_auth_token(KITSU_USERNAME, KITSU_PASSWORD)
+            kitsu_token = credential_cache.kitsu_token(KITSU_USERNAME, KITSU_PASSWORD)
             if not kitsu_token:
                 return jsonify({'success': False, 'message': 'Could not get Kitsu token.'}), 500
 
@@ -489,24 +144,25 @@ def sync_entry():
 
             if sync_type == 'full':
                 k_library_id = data.get('kEntryId')
-                success = update_kitsu_entry(k_library_id, kitsu_status, progress_val, kitsu_token)
+                success = _kitsu_write(lambda token: update_kitsu_entry(k_library_id, kitsu_status, progress_val, token, raise_on_error=True))
             elif sync_type == 'status':
                 k_library_id = data.get('kEntryId')
-                success = update_kitsu_entry(k_library_id, kitsu_status, None, kitsu_token)
+                success = _kitsu_write(lambda token: update_kitsu_entry(k_library_id, kitsu_status, None, token, raise_on_error=True))
             elif sync_type == 'add':
                 k_media_id = data.get('kMediaId')
                 media_type = data.get('mediaType', 'manga')
                 
                 k_user_id = data.get('kUserId')
                 if not k_user_id:
-                    k_user_id = get_kitsu_user_id_from_token(kitsu_token)
+                    k_user_id = credential_cache.kitsu_user_id(KITSU_USERNAME, kitsu_token)
                     if not k_user_id:
                         return jsonify({'success': False, 'message': 'Could not determine Kitsu user id for add operation.'}), 500
 
                 if not k_media_id:
                     return jsonify({'success': False, 'message': 'Missing kMediaId for add operation.'}), 400
 
-                success = add_kitsu_entry(k_user_id, k_media_id, kitsu_status, progress_val or 0, kitsu_token, media_type=media_type)
+                success = _kitsu_write(lambda token: add_kitsu_entry(k_user_id, k_media_id, kitsu_status, progress_val or 0, token,
+                                                                     media_type=media_type, raise_on_error=True))
             else:
                 return jsonify({'success': False, 'message': 'Invalid sync_type for kitsu.'}), 400
 
@@ -522,23 +178,251 @@ def sync_entry():
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
+@app.route('/sync/bulk', methods=['POST'])
+def sync_bulk():
+    """
+    Applies many AniList sync operations in a few batched mutations.
+    Expects {'target': 'anilist', 'items': [{aMediaId, syncType, status, progress}, ...]}.
+    """
+    data = request.json or {}
+    if data.get('target') != 'anilist':
+        return jsonify({'success': False, 'message': 'Bulk sync is only supported for AniList.'}), 400
+
+    try:
+        parsed = [parse_sync_item(dict(item, target='anilist')) for item in data.get('items') or []]
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    items = [{'mediaId': item['aMediaId'], 'status': item['status'], 'progress': item['progress']} for item in parsed]
+
+    if not items:
+        return jsonify({'success': False, 'message': 'No items to sync.'}), 400
+
+    try:
+        results = update_anilist_entries_bulk(items, ANILIST_ACCESS_TOKEN)
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+    succeeded = sum(1 for r in results if r['success'])
+    return jsonify({
+        'success': succeeded == len(results),
+        'message': f'{succeeded} of {len(results)} AniList entries updated.',
+        'results': results
+    })
+
+def _report_sync_items(data):
+    # Report-backed jobs tag each item with its category index as `ref`.
+    category, target = data.get('category'), data.get('target')
+    report = _load_report(data.get('type'))
+    if not report:
+        raise ValueError('No report to sync from; run an audit first.')
+    if target not in REPORT_SYNC_ACTIONS.get(category, {}):
+        raise ValueError(f'Category {category} has no sync to {target}.')
+    items = []
+    for index, report_item in filter_report_items(report, category, data.get('q'), data.get('status')):
+        item = parse_sync_item(sync_payload(category, report_item, target))
+        item['ref'] = index
+        items.append(item)
+    return items
+
+@app.route('/sync/jobs', methods=['POST'])
+def submit_sync_job():
+    """
+    Queues a batch of sync operations and returns the job ID straight away.
+    The batch is either {'items': [...]}, each shaped like a `/sync`
+    request, or {'category', 'target'[, 'type', 'q', 'status']} to sync
+    every (filtered) item of a category of the newest report. Follow progress on
+    /sync/jobs/<id>/events.
+    """
+    data = request.json or {}
+    try:
+        if data.get('category'):
+            items = _report_sync_items(data)
+        else:
+            items = [parse_sync_item(item) for item in data.get('items') or []]
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    if not items:
+        return jsonify({'success': False, 'message': 'No items to sync.'}), 400
+
+    kitsu_token = kitsu_user_id = None
+    if any(item['target'] == 'kitsu' for item in items):
+        kitsu_token = credential_cache.kitsu_token(KITSU_USERNAME, KITSU_PASSWORD)
+        if not kitsu_token:
+            return jsonify({'success': False, 'message': 'Could not get Kitsu token.'}), 500
+        if any(item['target'] == 'kitsu' and item['syncType'] == 'add' for item in items):
+            kitsu_user_id = data.get('kUserId') or credential_cache.kitsu_user_id(KITSU_USERNAME, kitsu_token)
+
+    job = sync_jobs.submit(items, anilist_token=ANILIST_ACCESS_TOKEN, with_kitsu_token=_with_kitsu_token, kitsu_user_id=kitsu_user_id)
+    return jsonify({'success': True, 'jobId': job.id, 'total': len(items)}), 202
+
+@app.route('/sync/jobs/<job_id>')
+def sync_job_status(job_id):
+    job = sync_jobs.get(job_id)
+    if not job:
+        return jsonify({'success': False, 'message': 'Unknown sync job.'}), 404
+    return jsonify(job.summary())
+
+@app.route('/sync/jobs/<job_id>/events')
+def sync_job_events(job_id):
+    job = sync_jobs.get(job_id)
+    if not job:
+        return jsonify({'success': False, 'message': 'Unknown sync job.'}), 404
+
+    def stream():
+        seen = 0
+        while True:
+            results, finished = job.wait_for_results(seen, timeout=15)
+            for result in results:
+                yield f"event: result\ndata: {json.dumps(result)}\n\n"
+            seen += len(results)
+            if finished and not results:
+                yield f"event: done\ndata: {json.dumps(job.summary())}\n\n"
+                return
+            if not results:
+                # Keeps proxies from closing an idle stream during long retries.
+                yield ": keep-alive\n\n"
+
+    return Response(stream_with_context(stream()), content_type='text/event-stream')
+
 @app.route('/report')
 def report():
-    global latest_report
-    if not latest_report:
-        return render_template('report.html', report={}, anilist_user=ANILIST_USERNAME, kitsu_user=KITSU_USERNAME, media_type='manga')
-        
-    return render_template('report.html', 
-                           report=latest_report, 
-                           anilist_user=ANILIST_USERNAME, 
+    latest_report = _load_report(request.args.get('type')) or {}
+    media_type = latest_report.get('media_type', 'manga')
+    counts = report_counts(latest_report)
+    sections = [
+        {
+            'category': category,
+            'title': title,
+            'count': counts[category],
+            'bulk_targets': list(REPORT_SYNC_ACTIONS.get(category, {})),
+        }
+        for category, title in REPORT_CATEGORIES if category not in HIDDEN_CATEGORIES
+    ]
+    return render_template('report.html',
+                           sections=sections,
+                           anilist_user=ANILIST_USERNAME,
                            kitsu_user=KITSU_USERNAME,
-                           media_type=latest_report.get('media_type', 'manga'))
+                           media_type=media_type)
+
+@app.route('/api/report')
+def report_api():
+    """
+    Paged report data. Without `category` returns the item count of every
+    category; with it, `offset`/`limit` items of that category. `q` filters
+    on title, `status` on either side's status. `type` picks the media
+    type; by default the newest report of either is used.
+    """
+    latest_report = _load_report(request.args.get('type'))
+    if not latest_report:
+        return jsonify({'success': False, 'message': 'No report yet; run an audit first.'}), 404
+
+    q = request.args.get('q')
+    status = request.args.get('status')
+    category = request.args.get('category')
+    if not category:
+        return jsonify({'media_type': latest_report.get('media_type', 'manga'), 'counts': report_counts(latest_report, q, status)})
+    if category not in dict(REPORT_CATEGORIES):
+        return jsonify({'success': False, 'message': f'Unknown category: {category}'}), 400
+
+    try:
+        offset = max(0, int(request.args.get('offset', 0)))
+        limit = min(REPORT_MAX_LIMIT, max(0, int(request.args.get('limit', REPORT_PAGE_LIMIT))))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'offset and limit must be integers.'}), 400
+    return jsonify(report_page(latest_report, category, offset, limit, q, status))
+
+@app.route('/api/report/history')
+def report_history():
+    """Stored audit runs for the configured accounts, newest first."""
+    return jsonify({'runs': report_store.runs(ANILIST_USERNAME, KITSU_USERNAME, request.args.get('type'))})
+
+@app.route('/api/report/diff')
+def report_diff():
+    """
+    Items whose category, status or progress changed between two runs of
+    one media type (`type`, default manga). Compares the newest run (or
+    `to`) with the one before it, the run `from`, or the newest run at or
+    before the unix time `since`.
+    """
+    media_type = (request.args.get('type') or 'manga').lower()
+    runs = report_store.runs(ANILIST_USERNAME, KITSU_USERNAME, media_type)
+    try:
+        to_id = int(request.args['to']) if request.args.get('to') else None
+        from_id = int(request.args['from']) if request.args.get('from') else None
+        since = float(request.args['since']) if request.args.get('since') else None
+    except ValueError:
+        return jsonify({'success': False, 'message': 'from and to must be run IDs and since a unix time.'}), 400
+
+    runs_by_id = {run['id']: run for run in runs}
+    new_run = runs_by_id.get(to_id) if to_id else (runs[0] if runs else None)
+    if not new_run:
+        return jsonify({'success': False, 'message': 'No stored report to compare.'}), 404
+    if from_id:
+        old_run = runs_by_id.get(from_id)
+    elif since is not None:
+        old_run = report_store.run_before(ANILIST_USERNAME, KITSU_USERNAME, media_type, since)
+    else:
+        # runs is newest first, so the next one in the list is the previous run.
+        old_run = next(iter(runs[runs.index(new_run) + 1:]), None)
+    if not old_run:
+        return jsonify({'success': False, 'message': 'No earlier report to compare against.'}), 404
+
+    changes = report_store.diff(old_run['id'], new_run['id'])
+    return jsonify({
+        'media_type': media_type,
+        'from': {'id': old_run['id'], 'created_at': old_run['created_at']},
+        'to': {'id': new_run['id'], 'created_at': new_run['created_at']},
+        'total': len(changes),
+        'changes': changes,
+    })
+
+@app.route('/thumbnail')
+def thumbnail():
+    """Serves a cached, downscaled copy of a Kitsu or AniList cover image."""
+    url = request.args.get('url', '')
+    try:
+        path = thumbnail_cache.get(url)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except requests.exceptions.RequestException:
+        # Let the browser try the CDN itself rather than show a broken image.
+        return redirect(url)
+    response = send_file(path, max_age=THUMBNAIL_MAX_AGE)
+    response.cache_control.immutable = True
+    return response
+
+@app.route('/api/http-stats')
+def http_stats():
+    return jsonify({
+        anilist_transport.name: anilist_transport.stats(),
+        kitsu_transport.name: kitsu_transport.stats(),
+    })
 
 @app.route('/stream-audit')
 def stream_audit():
+    """
+    Streams an audit. A request for an audit of the same accounts and media
+    type as one already running follows that run from its first message
+    instead of starting another.
+    """
     media_type = request.args.get('type', 'MANGA').upper()
-    return Response(stream_with_context(run_audit_stream(media_type=media_type)),
-                    content_type='text/event-stream')
+    if media_type not in ('MANGA', 'ANIME'):
+        media_type = 'MANGA'
+    account = _configured_account()
+    run, attached = audit_registry.start_or_attach(
+        account.audit_key(media_type),
+        lambda cancelled: run_audit_stream(media_type=media_type, cancelled=cancelled, account=account))
+
+    def stream():
+        if attached:
+            yield _sse_format("--- Joined an audit already in progress ---")
+        yield from run.follow()
+
+    return Response(stream_with_context(stream()), content_type='text/event-stream')
+
+@app.route('/api/audits')
+def running_audits():
+    return jsonify({'audits': audit_registry.active()})
 
 @app.route('/')
 def index():
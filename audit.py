@@ -1,6 +1,8 @@
 import sys
 import time
 
+from thumbnails import smallest_image, KITSU_POSTER_WIDTHS, ANILIST_COVER_WIDTHS
+
 def compare_and_report(kitsu_entry, anilist_entry, reports, k_url, a_url):
     kitsu_title = kitsu_entry['canonicalTitle']
 
@@ -21,12 +23,12 @@ def compare_and_report(kitsu_entry, anilist_entry, reports, k_url, a_url):
         'k_progress': k_progress,
         'k_url': k_url,
 
-        'k_image': kitsu_entry.get('kitsuImage', {}).get('large'),
+        'k_image': smallest_image(kitsu_entry.get('kitsuImage'), KITSU_POSTER_WIDTHS),
         'a_title': anilist_entry.get('title', {}).get('romaji') or anilist_entry.get('title', {}).get('english') or "AniList Title",
         'a_status': a_status,
         'a_progress': a_progress,
         'a_url': a_url,
-        'a_image': anilist_entry.get('coverImage', {}).get('large'),
+        'a_image': smallest_image(anilist_entry.get('coverImage'), ANILIST_COVER_WIDTHS),
         
         'k_library_id': kitsu_entry.get('libraryEntryId'),
         'a_media_id': anilist_entry.get('mediaId')
@@ -0,0 +1,101 @@
+"""
+Runs an audit without the web server and streams the results as NDJSON,
+one JSON object per line:
+
+    {"type": "item", "category": "kitsu_higher", "k_title": ..., "a_progress": ...}
+    {"type": "summary", "kitsu_total": ..., "ok": ..., "kitsu_higher": ...}
+
+Matched pairs are written as soon as they are compared and are not kept in
+memory; database search results follow once duplicates are removed. Log
+lines go to stderr. Uses the same .env settings as the web app.
+
+Exit status: 0 when both libraries agree, 1 when drift was found, 2 when
+the audit failed.
+
+    python audit_cli.py [--type manga|anime] [--output FILE] [--drift-only] [--save-report] [--quiet]
+"""
+import argparse
+import json
+import os
+import sys
+
+from dotenv import load_dotenv
+
+from audit_pipeline import AuditAccount, run_audit, audit_concurrency
+from http_transport import fit_pools
+from library_snapshots import SnapshotStore
+from report_store import ReportStore
+from search_cache import SearchCache
+
+EXIT_OK = 0
+EXIT_DRIFT = 1
+EXIT_ERROR = 2
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Audit Kitsu against AniList and write the results as NDJSON.")
+    parser.add_argument('--type', default='manga', type=str.lower, choices=['manga', 'anime'], help="media type to audit")
+    parser.add_argument('--output', '-o', default='-', help="file to write NDJSON to (default: stdout)")
+    parser.add_argument('--drift-only', action='store_true', help="leave out items that are already in sync")
+    parser.add_argument('--save-report', action='store_true',
+                        help="also store the full report for the web report page (keeps it in memory)")
+    parser.add_argument('--quiet', '-q', action='store_true', help="do not print log lines to stderr")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    load_dotenv()
+    account = AuditAccount(os.getenv('ANILIST_USERNAME'), os.getenv('ANILIST_ACCESS_TOKEN'),
+                           os.getenv('KITSU_USERNAME'), os.getenv('KITSU_PASSWORD'))
+    snapshot_store = SnapshotStore(os.getenv('SNAPSHOT_DB_PATH', 'library_snapshots.sqlite3'))
+    search_cache = SearchCache(
+        os.getenv('SEARCH_CACHE_PATH', 'search_cache.sqlite3'),
+        hit_ttl=float(os.getenv('SEARCH_CACHE_HIT_TTL_HOURS', 24 * 7)) * 3600,
+        miss_ttl=float(os.getenv('SEARCH_CACHE_MISS_TTL_HOURS', 24)) * 3600,
+        max_entries=int(os.getenv('SEARCH_CACHE_MAX_ENTRIES', 20000))
+    )
+
+    out = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+
+    def write(record):
+        out.write(json.dumps(record) + '\n')
+        out.flush()
+
+    search_lane_workers = int(os.getenv('SEARCH_LANE_WORKERS', 2))
+    fit_pools(audit_concurrency(search_lane_workers))
+    events = run_audit(account, snapshot_store, search_cache, media_type=args.type, keep_report=args.save_report,
+                       fuzzy_threshold=float(os.getenv('FUZZY_MATCH_THRESHOLD', 0.8)),
+                       search_lane_workers=search_lane_workers)
+    drift = False
+    try:
+        for event_type, payload in events:
+            if event_type == 'item':
+                if payload['category'] != 'ok':
+                    drift = True
+                elif args.drift_only:
+                    continue
+                write({'type': 'item', 'category': payload['category'], **payload['item']})
+            elif event_type == 'log':
+                if not args.quiet:
+                    print(payload, file=sys.stderr)
+            elif event_type == 'error':
+                print(payload, file=sys.stderr)
+                write({'type': 'error', 'message': payload})
+                return EXIT_ERROR
+            elif event_type == 'report':
+                if args.save_report:
+                    report = payload['report']
+                    ReportStore(os.getenv('REPORT_DB_PATH', 'reports.sqlite3')).save(
+                        account.anilist_username, account.kitsu_username, report['media_type'], report, summary=payload['summary'])
+                write({'type': 'summary', **payload['summary']})
+    except BrokenPipeError:
+        # The reader went away (e.g. `| head`); stop quietly, without
+        # another error when Python flushes stdout on exit.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    finally:
+        events.close()
+        if out is not sys.stdout:
+            out.close()
+    return EXIT_DRIFT if drift else EXIT_OK
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,270 @@
+"""
+Audits many Kitsu / AniList account pairs on a schedule from one process.
+
+All accounts share the process-wide AniList and Kitsu rate limiters, so
+the daemon stays inside one budget per provider however many accounts it
+runs. While several accounts are being audited, each limiter hands out
+requests round-robin across them. Reports are stored per account in the
+report store, so the web app's diff API and history work for each one.
+
+The config file is JSON:
+
+    {
+      "interval_hours": 24,
+      "workers": 4,
+      "accounts": [
+        {"name": "alice", "anilist_username": "...", "anilist_token": "...",
+         "kitsu_username": "...", "kitsu_password": "...", "media_types": ["manga", "anime"]}
+      ]
+    }
+
+`media_types` defaults to ["manga"], and `interval_hours` may also be set
+per account. Storage paths come from the same environment settings as the
+web app.
+
+    python audit_daemon.py accounts.json [--once] [--quiet]
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from dotenv import load_dotenv
+
+from audit_pipeline import AuditAccount, run_audit, audit_concurrency, MATCH_CATEGORIES, SEARCH_CATEGORIES
+from http_transport import fit_pools
+from library_snapshots import SnapshotStore
+from rate_limiter import budget_share, anilist_limiter, kitsu_limiter
+from report_store import ReportStore
+from search_cache import SearchCache
+
+DEFAULT_INTERVAL_HOURS = 24
+DEFAULT_WORKERS = 4
+# Accounts audited per hour are reported over this trailing window.
+THROUGHPUT_WINDOW = 60 * 60
+DRIFT_CATEGORIES = [c for c in MATCH_CATEGORIES + SEARCH_CATEGORIES if c != 'ok']
+
+def _print_log(message, error=False):
+    print(message, file=sys.stderr, flush=True)
+
+def load_config(path):
+    """Reads the daemon config and returns (accounts, workers); raises ValueError when invalid."""
+    with open(path, encoding='utf-8') as f:
+        config = json.load(f)
+
+    interval_hours = float(config.get('interval_hours', DEFAULT_INTERVAL_HOURS))
+    accounts = []
+    for i, entry in enumerate(config.get('accounts') or []):
+        missing = [k for k in ('anilist_username', 'anilist_token', 'kitsu_username', 'kitsu_password') if not entry.get(k)]
+        if missing:
+            raise ValueError(f"Account {entry.get('name') or i} is missing {', '.join(missing)}")
+        media_types = [m.lower() for m in entry.get('media_types') or ['manga']]
+        if any(m not in ('manga', 'anime') for m in media_types):
+            raise ValueError(f"Account {entry.get('name') or i} has an invalid media type: {media_types}")
+        accounts.append(ScheduledAccount(
+            AuditAccount(entry['anilist_username'], entry['anilist_token'], entry['kitsu_username'],
+                         entry['kitsu_password'], name=entry.get('name')),
+            media_types,
+            float(entry.get('interval_hours', interval_hours)) * 3600
+        ))
+    if not accounts:
+        raise ValueError("The config lists no accounts.")
+    names = [a.account.name for a in accounts]
+    if len(set(names)) != len(names):
+        raise ValueError("Account names must be unique.")
+    return accounts, int(config.get('workers', DEFAULT_WORKERS))
+
+class ScheduledAccount:
+    """One account pair, the media types to audit and when it is next due."""
+
+    def __init__(self, account, media_types, interval):
+        self.account = account
+        self.media_types = media_types
+        self.interval = interval
+        self.next_run_at = 0.0
+
+class ThroughputMeter:
+    """Counts finished account audits; thread-safe."""
+
+    def __init__(self, window=THROUGHPUT_WINDOW):
+        self.window = window
+        self.started_at = time.monotonic()
+        self.completed = 0
+        self.failed = 0
+        self._recent = deque()
+        self._lock = threading.Lock()
+
+    def record(self, success):
+        now = time.monotonic()
+        with self._lock:
+            if success:
+                self.completed += 1
+                self._recent.append(now)
+            else:
+                self.failed += 1
+            while self._recent and self._recent[0] < now - self.window:
+                self._recent.popleft()
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self._lock:
+            while self._recent and self._recent[0] < now - self.window:
+                self._recent.popleft()
+            uptime = max(now - self.started_at, 1e-6)
+            return {
+                'completed': self.completed,
+                'failed': self.failed,
+                'accounts_per_hour': round(self.completed * 3600 / uptime, 1),
+                'accounts_last_hour': len(self._recent),
+                'uptime_hours': round(uptime / 3600, 2),
+            }
+
+class AuditDaemon:
+    """
+    Runs due accounts on a worker pool, `workers` at a time, rescheduling
+    each one `interval` after its audit finishes. Every audit runs with
+    `budget_share` set to its account name, which is what the rate
+    limiters share their budget by.
+    """
+
+    def __init__(self, accounts, snapshot_store, search_cache, report_store, workers=DEFAULT_WORKERS,
+                 log=_print_log, audit_kwargs=None):
+        self.accounts = accounts
+        self.snapshot_store = snapshot_store
+        self.search_cache = search_cache
+        self.report_store = report_store
+        self.workers = max(1, workers)
+        self.log = log
+        self.audit_kwargs = audit_kwargs or {}
+        self.meter = ThroughputMeter()
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    def audit_account(self, scheduled):
+        """Audits every media type of one account; returns (success, drifted items)."""
+        account = scheduled.account
+        token = budget_share.set(account.name)
+        started = time.monotonic()
+        drift = 0
+        try:
+            for media_type in scheduled.media_types:
+                report = None
+                for event_type, payload in run_audit(account, self.snapshot_store, self.search_cache,
+                                                     media_type=media_type, **self.audit_kwargs):
+                    if event_type == 'error':
+                        self.log(f"[{account.name}] {media_type}: {payload}", error=True)
+                        return False, drift
+                    if event_type == 'report':
+                        report = payload
+                if report is None:
+                    return False, drift
+                self.report_store.save(account.anilist_username, account.kitsu_username, media_type,
+                                       report['report'], summary=report['summary'])
+                drift += sum(report['summary'][category] for category in DRIFT_CATEGORIES)
+            self.log(f"[{account.name}] audited {', '.join(scheduled.media_types)} in "
+                     f"{time.monotonic() - started:.1f}s, {drift} items drifted")
+            return True, drift
+        except Exception as e:
+            self.log(f"[{account.name}] audit failed: {e}", error=True)
+            return False, drift
+        finally:
+            budget_share.reset(token)
+
+    def _status_line(self):
+        m = self.meter.snapshot()
+        return (f"{m['completed']} accounts audited ({m['failed']} failed), {m['accounts_per_hour']} accounts/hour "
+                f"overall, {m['accounts_last_hour']} in the last hour; AniList {anilist_limiter.rate * 60:.0f} req/min, "
+                f"Kitsu {kitsu_limiter.rate * 60:.0f} req/min, throttled {anilist_limiter.throttled_count}/{kitsu_limiter.throttled_count}")
+
+    def run(self, once=False):
+        """
+        Schedules audits until `stop()` is called, or, with `once`, until
+        every account has been audited one time. Returns the meter snapshot.
+        """
+        in_flight = {}
+        audited = set()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='audit-daemon') as pool:
+            try:
+                while not self._stop.is_set():
+                    now = time.time()
+                    running = set(in_flight.values())
+                    due = sorted((a for a in self.accounts
+                                  if a not in running and a.next_run_at <= now and not (once and a in audited)),
+                                 key=lambda a: a.next_run_at)
+                    for scheduled in due[:self.workers - len(in_flight)]:
+                        in_flight[pool.submit(self.audit_account, scheduled)] = scheduled
+                        audited.add(scheduled)
+                    if once and not in_flight:
+                        break
+
+                    # Wake for the first finished audit or the next account falling due.
+                    running = set(in_flight.values())
+                    next_due = min((a.next_run_at for a in self.accounts if a not in running), default=now + 60)
+                    timeout = max(1.0, min(60.0, next_due - now))
+                    if in_flight:
+                        done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+                    else:
+                        self._stop.wait(timeout)
+                        done = ()
+                    for future in done:
+                        scheduled = in_flight.pop(future)
+                        success, _ = future.result()
+                        scheduled.next_run_at = time.time() + scheduled.interval
+                        self.meter.record(success)
+                        self.log(self._status_line())
+            except KeyboardInterrupt:
+                self.log("Stopping once the audits in progress finish...", error=True)
+                self._stop.set()
+        return self.meter.snapshot()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Audit many Kitsu / AniList account pairs on a schedule.")
+    parser.add_argument('config', help="JSON file listing the account pairs")
+    parser.add_argument('--once', action='store_true', help="audit every account one time and exit")
+    parser.add_argument('--quiet', '-q', action='store_true', help="only print failures and the final summary")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    try:
+        accounts, workers = load_config(args.config)
+    except (OSError, ValueError) as e:
+        print(f"Invalid config: {e}", file=sys.stderr)
+        return 2
+
+    def log(message, error=False):
+        if error or not args.quiet:
+            _print_log(message)
+
+    search_lane_workers = int(os.getenv('SEARCH_LANE_WORKERS', 2))
+    fit_pools(max(1, workers) * audit_concurrency(search_lane_workers))
+
+    daemon = AuditDaemon(
+        accounts,
+        SnapshotStore(os.getenv('SNAPSHOT_DB_PATH', 'library_snapshots.sqlite3')),
+        SearchCache(
+            os.getenv('SEARCH_CACHE_PATH', 'search_cache.sqlite3'),
+            hit_ttl=float(os.getenv('SEARCH_CACHE_HIT_TTL_HOURS', 24 * 7)) * 3600,
+            miss_ttl=float(os.getenv('SEARCH_CACHE_MISS_TTL_HOURS', 24)) * 3600,
+            max_entries=int(os.getenv('SEARCH_CACHE_MAX_ENTRIES', 20000))
+        ),
+        ReportStore(os.getenv('REPORT_DB_PATH', 'reports.sqlite3'), history_limit=int(os.getenv('REPORT_HISTORY_LIMIT', 100))),
+        workers=workers,
+        log=log,
+        audit_kwargs={
+            'fuzzy_threshold': float(os.getenv('FUZZY_MATCH_THRESHOLD', 0.8)),
+            'search_lane_workers': search_lane_workers,
+        },
+    )
+    print(f"Auditing {len(accounts)} accounts, {daemon.workers} at a time.", file=sys.stderr, flush=True)
+    summary = daemon.run(once=args.once)
+    print(json.dumps(summary))
+    return 1 if summary['failed'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,638 @@
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from anilist_api import search_anilist_by_titles, ANILIST_PAGE_CONCURRENCY
+from kitsu_api import search_kitsu_by_title, KITSU_PAGE_CONCURRENCY
+from audit import compare_and_report
+from normalization import sanitize_search_query, normalize_for_dedupe, normalize_titles_for_match
+from matching import IncrementalMatcher, ids_compatible
+from fuzzy_match import fuzzy_match_pairs, FUZZY_MATCH_THRESHOLD
+from http_transport import anilist_transport, kitsu_transport
+from credentials import credential_cache
+from library_snapshots import iter_anilist_library, iter_kitsu_library
+from progress_events import EventChannel, FetchProgress
+from rate_limiter import submit_in_context
+from thumbnails import smallest_image, KITSU_POSTER_WIDTHS, ANILIST_COVER_WIDTHS
+
+SEARCH_LANE_WORKERS = 2
+
+# Categories filled by comparing matched pairs; they are reported as soon as
+# a pair is found. The rest come from database searches and are reported
+# once duplicates have been removed at the end of the audit.
+MATCH_CATEGORIES = ('ok', 'mismatch_status', 'anilist_higher', 'kitsu_higher')
+SEARCH_CATEGORIES = ('found_on_anilist', 'not_found_on_anilist', 'found_on_kitsu', 'not_found_on_kitsu')
+
+class AuditAccount:
+    """Credentials of one AniList / Kitsu account pair."""
+
+    def __init__(self, anilist_username, anilist_token, kitsu_username, kitsu_password, name=None):
+        self.anilist_username = anilist_username
+        self.anilist_token = anilist_token
+        self.kitsu_username = kitsu_username
+        self.kitsu_password = kitsu_password
+        self.name = name or f"{anilist_username}/{kitsu_username}"
+
+    def audit_key(self, media_type):
+        """
+        Identifies audits of this account pair: the usernames and media type,
+        plus a digest of the credentials, so callers holding different tokens
+        for the same usernames never share a run.
+        """
+        secret = f"{self.anilist_token}\0{self.kitsu_password}".encode('utf-8')
+        return (self.anilist_username, self.kitsu_username, media_type, hashlib.sha256(secret).hexdigest()[:16])
+
+def audit_concurrency(search_lane_workers=SEARCH_LANE_WORKERS):
+    """
+    The most requests one audit keeps in flight to a single provider: the
+    library page fetchers, then the search lane workers.
+    """
+    return max(ANILIST_PAGE_CONCURRENCY, KITSU_PAGE_CONCURRENCY, search_lane_workers)
+
+def _http_stats_snapshot():
+    return {transport.name: transport.stats() for transport in (anilist_transport, kitsu_transport)}
+
+def _http_stats_lines(baseline):
+    # Transports are shared by concurrent audits, so report the counters'
+    # growth since `baseline` (a `_http_stats_snapshot`) instead of resetting them.
+    lines = []
+    for transport in (anilist_transport, kitsu_transport):
+        before = baseline.get(transport.name, {})
+        stats = {}
+        for endpoint, s in transport.stats().items():
+            b = before.get(endpoint, {})
+            delta = {field: s[field] - b.get(field, 0) for field in ('requests', 'errors', 'bytes', 'total_latency')}
+            if delta['requests']:
+                stats[endpoint] = delta
+        requests_sent = sum(s['requests'] for s in stats.values())
+        if not requests_sent:
+            continue
+        total_bytes = sum(s['bytes'] for s in stats.values())
+        avg_ms = sum(s['total_latency'] for s in stats.values()) * 1000 / requests_sent
+        lines.append(f"  -> {transport.name}: {requests_sent} requests, {total_bytes / 1024:.0f} KiB, avg {avg_ms:.0f} ms")
+        for endpoint, s in sorted(stats.items()):
+            lines.append(f"       {endpoint}: {s['requests']} req, {s['errors']} err, avg {s['total_latency'] * 1000 / s['requests']:.1f} ms")
+    return lines
+
+def _cached_search(search_cache, provider, media_type, query, search_fn, stats):
+    # Failed requests raise out of search_fn so they are never cached as misses.
+    try:
+        return search_cache.search(provider, media_type, query, search_fn, stats)
+    except requests.exceptions.RequestException:
+        return None
+
+class _AuditHalted(Exception):
+    """Raised on a fetch thread to stop the audit with a user-facing message."""
+
+class _SearchFailed(Exception):
+    """Set on a search slot whose requests failed, as opposed to finding nothing."""
+
+class _SearchSlot:
+    """One item's search answer, filled in by a search lane thread."""
+
+    def __init__(self):
+        self._done = threading.Event()
+        self._value = None
+        self._error = None
+
+    def done(self):
+        return self._done.is_set()
+
+    def set(self, value=None, error=None):
+        self._value = value
+        self._error = error
+        self._done.set()
+
+    def result(self):
+        self._done.wait()
+        if self._error:
+            raise self._error
+        return self._value
+
+def _derive_large_from_anilist_url(url):
+    if not url:
+        return None
+    return url.replace('/cover/small/', '/cover/large/').replace('/cover/medium/', '/cover/large/')
+
+def _pick_anilist_image(cover_dict):
+    if not isinstance(cover_dict, dict):
+        return None
+    return smallest_image(cover_dict, ANILIST_COVER_WIDTHS) or _derive_large_from_anilist_url(cover_dict.get('small')) or cover_dict.get('small')
+
+def run_audit(account, snapshot_store, search_cache, media_type='MANGA', keep_report=True,
+              fuzzy_threshold=FUZZY_MATCH_THRESHOLD, search_lane_workers=SEARCH_LANE_WORKERS,
+              credentials=credential_cache, cancelled=None):
+    """
+    Audits one account pair and yields (event type, payload) tuples:
+
+    - 'log' / 'error': a message; the audit stops after an error.
+    - 'progress': {'current', 'total', 'message'} for the progress bar.
+    - 'fetch-progress': a `FetchProgress` snapshot while libraries download.
+    - 'item': {'category', 'item'}, one per report entry. Matched pairs are
+      sent as they are compared, search results after de-duplication.
+    - 'report': {'summary', 'report'} once at the end. `report` holds every
+      item by category, or only the search categories when `keep_report`
+      is off, so long audits need not keep matched pairs in memory.
+
+    Setting `cancelled` (a threading.Event) stops the library downloads at
+    their next page and ends the audit with an error; closing the generator
+    does the same before it returns.
+    """
+    if media_type.upper() not in ['MANGA', 'ANIME']:
+        media_type = 'MANGA'
+    else:
+        media_type = media_type.upper()
+        
+    kitsu_media_type = media_type.lower()
+    
+    try:
+        def yield_progress(current, total, message):
+            progress_data = { 'current': current, 'total': total, 'message': message }
+            yield 'progress', progress_data
+
+        def yield_fetch_progress(*trackers):
+            # Drive the main progress bar by pages while the libraries download.
+            snapshots = [t.snapshot() for t in trackers]
+            done = sum(snap['pages_done'] for snap in snapshots)
+            total = sum(snap['pages_total'] or snap['pages_done'] for snap in snapshots)
+            parts = [f"{snap['provider']} {snap['pages_done']}/{snap['pages_total'] or '?'} pages, {snap['entries_per_sec']:.0f} entries/s" for snap in snapshots]
+            yield from yield_progress(done, max(total, 1), "Fetching libraries: " + "; ".join(parts))
+
+        if not account.anilist_token or len(account.anilist_token) < 50:
+            yield 'error', "ERROR: The AniList access token looks incorrect or is missing."
+            return
+        
+        yield 'log', f"--- Starting {media_type.capitalize()} Library Audit ---"
+        http_baseline = _http_stats_snapshot()
+
+        # The two providers share nothing until matching, so each side's
+        # identity lookups and library fetch run on their own thread. Library
+        # pages come back through the same queue as log lines and are matched
+        # as they arrive, while the rest is still downloading.
+        fetch_events = EventChannel()
+        log = fetch_events.log
+        cancelled = cancelled or threading.Event()
+
+        # Set as soon as either side fails: the audit is over, so the other
+        # side should stop paging a library nobody will look at.
+        fetch_failed = threading.Event()
+
+        def check_cancelled():
+            if cancelled.is_set():
+                raise _AuditHalted("Audit cancelled.")
+
+        def halts_other_side(fetch_side):
+            def run():
+                try:
+                    return fetch_side()
+                except BaseException:
+                    fetch_failed.set()
+                    raise
+            return run
+        anilist_progress = FetchProgress('AniList', anilist_transport)
+        kitsu_progress = FetchProgress('Kitsu', kitsu_transport)
+
+        def progress_reporter(tracker):
+            return lambda pages_done, pages_total, entry_count: fetch_events.put(
+                'fetch-progress', tracker.page_done(pages_done, pages_total, entry_count))
+
+        def fetch_anilist_side():
+            log("Getting AniList User ID...")
+            anilist_id = credentials.anilist_user_id(account.anilist_username, account.anilist_token)
+            if not anilist_id:
+                raise _AuditHalted("Halting: Could not get Anilist User ID. Is your ACCESS_TOKEN valid?")
+            log(f"  -> Found AniList User ID: {anilist_id}")
+
+            check_cancelled()
+            if fetch_failed.is_set():
+                return
+            log(f"Fetching AniList {media_type.capitalize()} library (this may take a moment)...")
+            # An empty library still yields one (empty) page; none at all means AniList could not be reached.
+            got_pages = False
+            for page in iter_anilist_library(snapshot_store, anilist_id, account.anilist_token, media_type,
+                                             yield_progress_callback=log, page_callback=progress_reporter(anilist_progress)):
+                check_cancelled()
+                if fetch_failed.is_set():
+                    return
+                got_pages = True
+                fetch_events.put('anilist', page)
+            if not got_pages:
+                raise _AuditHalted("Halting: AniList library could not be fetched.")
+            log("  -> AniList fetch complete.")
+
+        def fetch_kitsu_side():
+            log("Getting Kitsu token...")
+            token = credentials.kitsu_token(account.kitsu_username, account.kitsu_password)
+            if not token:
+                raise _AuditHalted("Halting: Could not get Kitsu access token. Check the Kitsu credentials.")
+            log("  -> Kitsu token OK.")
+
+            def renew_token():
+                # These lookups hide status codes, so a failure may be a
+                # revoked token: drop it and let the caller try once more.
+                credentials.invalidate_kitsu_token(account.kitsu_username, token)
+                return credentials.kitsu_token(account.kitsu_username, account.kitsu_password)
+
+            log("Getting Kitsu User ID...")
+            user_id = credentials.kitsu_user_id(account.kitsu_username, token)
+            if not user_id:
+                token = renew_token()
+                user_id = token and credentials.kitsu_user_id(account.kitsu_username, token)
+            if not user_id:
+                raise _AuditHalted("Halting: Could not fetch Kitsu User ID.")
+            log(f"  -> Found Kitsu User ID: {user_id}")
+
+            check_cancelled()
+            if fetch_failed.is_set():
+                return user_id
+            log(f"Fetching Kitsu {media_type.capitalize()} library (this may take a moment)...")
+            got_pages = False
+            for attempt in range(2):
+                for page in iter_kitsu_library(snapshot_store, user_id, token, kitsu_media_type,
+                                               yield_progress_callback=log, page_callback=progress_reporter(kitsu_progress)):
+                    check_cancelled()
+                    if fetch_failed.is_set():
+                        return user_id
+                    got_pages = True
+                    fetch_events.put('kitsu', page)
+                if got_pages or attempt:
+                    break
+                token = renew_token()
+                if not token:
+                    break
+                log("  -> Kitsu library fetch failed; retrying with a fresh token.")
+            log("  -> Kitsu fetch complete.")
+            return user_id
+
+        reports = {category: [] for category in MATCH_CATEGORIES + SEARCH_CATEGORIES}
+        match_counts = dict.fromkeys(MATCH_CATEGORIES, 0)
+
+        def record_match(kitsu_entry, anilist_entry):
+            compared = {category: [] for category in MATCH_CATEGORIES}
+            compare_and_report(kitsu_entry, anilist_entry, compared, kitsu_entry['kitsuUrl'], anilist_entry['siteUrl'])
+            for category, items in compared.items():
+                for item in items:
+                    match_counts[category] += 1
+                    if keep_report:
+                        reports[category].append(item)
+                    yield 'item', {'category': category, 'item': item}
+
+        def record_pairs(pairs):
+            for kitsu_index, media_id, _ in pairs:
+                yield from record_match(matcher.kitsu_entries[kitsu_index], matcher.anilist_entries[media_id])
+
+        matcher = IncrementalMatcher(normalize_titles_for_match)
+
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix='library-fetch') as fetch_pool:
+            anilist_future = submit_in_context(fetch_pool, halts_other_side(fetch_anilist_side))
+            kitsu_future = submit_in_context(fetch_pool, halts_other_side(fetch_kitsu_side))
+            try:
+                for kind, payload in fetch_events.drain([anilist_future, kitsu_future]):
+                    if kind == 'log':
+                        yield 'log', payload
+                        continue
+                    if kind == 'fetch-progress':
+                        yield 'fetch-progress', payload
+                        yield from yield_fetch_progress(anilist_progress, kitsu_progress)
+                        continue
+
+                    pairs = matcher.add_anilist(payload) if kind == 'anilist' else matcher.add_kitsu(payload)
+                    yield from record_pairs(pairs)
+                    if pairs:
+                        differing = match_counts['kitsu_higher'] + match_counts['anilist_higher'] + match_counts['mismatch_status']
+                        yield 'log', f"  -> Matched {len(matcher.matched_kitsu)} entries so far, {differing} with differences."
+            except GeneratorExit:
+                # Leaving the pool waits for the fetch threads; stop them at their next page.
+                cancelled.set()
+                raise
+
+        try:
+            anilist_future.result()
+            kitsu_id = kitsu_future.result()
+        except _AuditHalted as e:
+            yield 'error', str(e)
+            return
+
+        kitsu_media_list = matcher.kitsu_entries
+        if not kitsu_media_list:
+            yield 'error', "Halting: Kitsu library could not be fetched."
+            return
+        fetch_match_count = len(matcher.matched_kitsu)
+        yield from record_pairs(matcher.finish())
+        anilist_media_map = matcher.anilist_entries
+        kitsu_norm_titles = matcher.kitsu_norm_titles
+        anilist_media_norm_titles = matcher.anilist_norm_titles
+        processed_kitsu_indices = matcher.matched_kitsu
+        processed_anilist_media_ids = matcher.matched_anilist
+
+        yield 'log', (f"  -> Matched {len(processed_kitsu_indices)} of {len(kitsu_media_list)} Kitsu entries "
+                      f"({fetch_match_count} while fetching, {matcher.id_match_count} by AniList/MAL ID).")
+
+        yield 'log', "--- Fuzzy matching leftovers against both libraries... ---"
+
+        def _ids_compatible(kitsu_index, anilist_media_id):
+            # Never let a fuzzy title pair contradict Kitsu's own ID mappings.
+            return ids_compatible(kitsu_media_list[kitsu_index], anilist_media_map[anilist_media_id])
+
+        fuzzy_pairs = fuzzy_match_pairs(
+            [(i, kitsu_norm_titles[i]) for i in range(len(kitsu_media_list)) if i not in processed_kitsu_indices],
+            [(m_id, anilist_media_norm_titles.get(m_id, set())) for m_id in anilist_media_map if m_id not in processed_anilist_media_ids],
+            threshold=fuzzy_threshold,
+            is_compatible=_ids_compatible
+        )
+        for pair in fuzzy_pairs:
+            kitsu_entry = kitsu_media_list[pair['kitsu_key']]
+            anilist_entry = anilist_media_map[pair['anilist_key']]
+            yield 'log', f"  -> Fuzzy match ({pair['score']:.2f}): '{pair['kitsu_title']}' <-> '{pair['anilist_title']}'"
+            processed_kitsu_indices.add(pair['kitsu_key'])
+            processed_anilist_media_ids.add(pair['anilist_key'])
+            yield from record_match(kitsu_entry, anilist_entry)
+        yield 'log', f"  -> Fuzzy matching resolved {len(fuzzy_pairs)} pairs without a network search."
+
+        yield 'log', "--- Searching for database matches for missing items... ---"
+        
+        unprocessed_kitsu_items = [k for i, k in enumerate(kitsu_media_list) if i not in processed_kitsu_indices]
+        unprocessed_anilist_items = [a for m_id, a in anilist_media_map.items() if m_id not in processed_anilist_media_ids]
+
+        total_search_items = len(unprocessed_kitsu_items) + len(unprocessed_anilist_items)
+        current_search_item = 0
+
+        found_on_anilist_ids = set()
+        found_on_kitsu_ids = set()
+        search_cache_stats = {'hits': 0, 'negative_hits': 0, 'misses': 0}
+
+        search_cancelled = threading.Event()
+
+        def search_anilist_batched(kitsu_entries, slots):
+            # Round N sends every still-unmatched entry's Nth title variant as
+            # aliased queries in a few batched requests, instead of one
+            # request per title.
+            try:
+                variants = [[q for q in (sanitize_search_query(t) for t in k.get('titles', [])) if q] for k in kitsu_entries]
+                pending = []
+                for i, item_variants in enumerate(variants):
+                    if item_variants:
+                        pending.append(i)
+                    else:
+                        slots[i].set(None)
+
+                # Items with a title variant AniList never answered; if no
+                # variant matches they end as failed searches, not misses.
+                unanswered = set()
+                round_no = 0
+                while pending and not search_cancelled.is_set():
+                    answers = search_cache.search_many(
+                        'anilist', media_type, [variants[i][round_no] for i in pending],
+                        lambda queries: search_anilist_by_titles(queries, account.anilist_token, media_type=media_type),
+                        search_cache_stats
+                    )
+                    still_pending = []
+                    for i in pending:
+                        query = variants[i][round_no]
+                        if query not in answers:
+                            unanswered.add(i)
+                        search_result = answers.get(query)
+                        if search_result:
+                            slots[i].set(search_result)
+                        elif round_no + 1 < len(variants[i]):
+                            still_pending.append(i)
+                        elif i in unanswered:
+                            slots[i].set(error=_SearchFailed())
+                        else:
+                            slots[i].set(None)
+                    pending = still_pending
+                    round_no += 1
+            except Exception as e:
+                for slot in slots:
+                    if not slot.done():
+                        slot.set(error=e)
+                raise
+
+        def search_kitsu_for(a_title):
+            search_q = sanitize_search_query(a_title)
+            if not search_q:
+                return None
+            return _cached_search(
+                search_cache, 'kitsu', kitsu_media_type, search_q,
+                lambda q: credentials.with_kitsu_token(
+                    account.kitsu_username, account.kitsu_password,
+                    lambda token: search_kitsu_by_title(q, token, media_type=kitsu_media_type, raise_on_error=True)),
+                search_cache_stats
+            )
+
+        def anilist_display_title(anilist_entry):
+            title_obj = anilist_entry.get('title') or {}
+            a_title = title_obj.get('romaji') or title_obj.get('english') or title_obj.get('native')
+            if not a_title:
+                a_title = anilist_entry.get('a_title_romaji') or anilist_entry.get('a_title_english')
+            return a_title
+
+        # One lane per provider: both providers' searches run at the same time
+        # under their own rate limits, while results are still reported below
+        # in the same order as a sequential run.
+        anilist_lane = ThreadPoolExecutor(max_workers=1)
+        kitsu_lane = ThreadPoolExecutor(max_workers=search_lane_workers)
+        try:
+            anilist_searches = [_SearchSlot() for _ in unprocessed_kitsu_items]
+            submit_in_context(anilist_lane, search_anilist_batched, unprocessed_kitsu_items, anilist_searches)
+            anilist_titles = [anilist_display_title(a) for a in unprocessed_anilist_items]
+            kitsu_searches = [submit_in_context(kitsu_lane, search_kitsu_for, t) if t else None for t in anilist_titles]
+            for kitsu_entry, anilist_search in zip(unprocessed_kitsu_items, anilist_searches):
+                current_search_item += 1
+                k_title = kitsu_entry['canonicalTitle']
+                yield from yield_progress(
+                    current_search_item, 
+                    total_search_items, 
+                    f"Searching AniList for: {k_title}"
+                )
+                
+                try:
+                    search_result = anilist_search.result()
+                except _SearchFailed:
+                    yield 'log', f"  -> AniList search failed for: {k_title}"
+                    continue
+                if search_result:
+                    media_id = search_result.get('id')
+                    if media_id in anilist_media_map:
+                        yield 'log', f"  -> SKIP: AniList media {media_id} for {k_title} is already in user library."
+                        processed_anilist_media_ids.add(media_id)
+                        continue
+                    if media_id in found_on_anilist_ids or media_id in processed_anilist_media_ids:
+                        yield 'log', f"  -> Skipping duplicate AniList DB match for: {k_title}"
+                        continue
+
+                    yield 'log', f"  -> Found AniList DB match for: {k_title}"
+                    reports['found_on_anilist'].append({
+                        'k_title': kitsu_entry.get('canonicalTitle'),
+                        'k_url': kitsu_entry.get('kitsuUrl'),
+                        'k_image': smallest_image(kitsu_entry.get('kitsuImage'), KITSU_POSTER_WIDTHS),
+                        'k_status': kitsu_entry.get('status'),
+                        'k_progress': kitsu_entry.get('progress'),
+                    
+                        'a_title': search_result.get('title', {}).get('romaji') or search_result.get('title', {}).get('english'),
+                        'a_url': search_result.get('siteUrl'),
+                        'a_image': _pick_anilist_image(search_result.get('coverImage', {})),
+                        'a_media_id': search_result.get('id')
+                    })
+                    found_on_anilist_ids.add(media_id)
+                else:
+                    yield 'log', f"  -> No AniList DB match for: {k_title}"
+                    reports['not_found_on_anilist'].append({
+                        'k_title': kitsu_entry.get('canonicalTitle'),
+                        'k_url': kitsu_entry.get('kitsuUrl'),
+                        'k_image': smallest_image(kitsu_entry.get('kitsuImage'), KITSU_POSTER_WIDTHS),
+                        'k_status': kitsu_entry.get('status'),
+                        'k_progress': kitsu_entry.get('progress'),
+                    })
+
+            kitsu_media_ids_in_library = {str(k.get('media_id')) for k in kitsu_media_list if k.get('media_id')}
+            for anilist_entry, a_title, kitsu_search in zip(unprocessed_anilist_items, anilist_titles, kitsu_searches):
+                current_search_item += 1
+
+                if not a_title:
+                    yield 'log', "  -> Skipping AniList item with no usable title."
+                    reports['not_found_on_kitsu'].append({
+                        'a_title': None,
+                        'a_url': anilist_entry.get('siteUrl'),
+                        'a_image': _pick_anilist_image(anilist_entry.get('coverImage', {})),
+                        'a_status': anilist_entry.get('status'),
+                        'a_progress': anilist_entry.get('progress'),
+                    })
+                    continue
+
+                yield from yield_progress(
+                    current_search_item,
+                    total_search_items,
+                    f"Searching Kitsu for: {a_title}"
+                )
+
+                search_result = kitsu_search.result()
+                if search_result:
+                    k_media_id = search_result.get('id')
+                    if k_media_id in kitsu_media_ids_in_library:
+                        yield 'log', f"  -> SKIP: Kitsu media {k_media_id} for {a_title} is already in user library."
+                        continue
+                    if k_media_id in found_on_kitsu_ids:
+                        yield 'log', f"  -> Skipping duplicate Kitsu DB match for: {a_title}"
+                        continue
+
+                    yield 'log', f"  -> Found Kitsu DB match for: {a_title}"
+                    reports['found_on_kitsu'].append({
+                        'a_title': a_title,
+                        'a_url': anilist_entry.get('siteUrl'),
+                        'a_image': _pick_anilist_image(anilist_entry.get('coverImage', {})),
+                        'a_status': anilist_entry.get('status'),
+                        'a_progress': anilist_entry.get('progress'),
+                    
+                        'k_title': search_result.get('attributes', {}).get('canonicalTitle'),
+                        'k_url': f"https://kitsu.io/{kitsu_media_type}/{search_result.get('attributes', {}).get('slug')}",
+                        'k_image': smallest_image(search_result.get('attributes', {}).get('posterImage'), KITSU_POSTER_WIDTHS),
+                        'k_media_id': search_result.get('id'),
+                        'a_media_id': anilist_entry.get('mediaId'),
+                        'media_type': kitsu_media_type
+                    })
+                    found_on_kitsu_ids.add(k_media_id)
+                else:
+                    yield 'log', f"  -> No Kitsu DB match for: {a_title}"
+                    reports['not_found_on_kitsu'].append({
+                        'a_title': a_title,
+                        'a_url': anilist_entry.get('siteUrl'),
+                        'a_image': _pick_anilist_image(anilist_entry.get('coverImage', {})),
+                        'a_status': anilist_entry.get('status'),
+                        'a_progress': anilist_entry.get('progress'),
+                    })
+        finally:
+            search_cancelled.set()
+            anilist_lane.shutdown(wait=False, cancel_futures=True)
+            kitsu_lane.shutdown(wait=False, cancel_futures=True)
+
+        yield 'log', (
+            f"  -> Search cache: {search_cache_stats['hits']} hits "
+            f"({search_cache_stats['negative_hits']} cached misses), {search_cache_stats['misses']} misses"
+        )
+
+        seen_a_ids = set()
+        seen_k_ids = set()
+        seen_pairs = set()
+
+        def _pair(it):
+            return (normalize_for_dedupe(it.get('k_title') or ''), normalize_for_dedupe(it.get('a_title') or ''))
+
+        anilist_out = []
+        for it in reports['found_on_anilist']:
+            a_id = it.get('a_media_id')
+            k_id = it.get('k_media_id')
+            pair = _pair(it)
+            if a_id and a_id in seen_a_ids:
+                continue
+            if k_id and k_id in seen_k_ids:
+                continue
+            if pair in seen_pairs:
+                continue
+            anilist_out.append(it)
+            if a_id:
+                seen_a_ids.add(a_id)
+            if k_id:
+                seen_k_ids.add(k_id)
+            seen_pairs.add(pair)
+        reports['found_on_anilist'] = anilist_out
+
+        kitsu_out = []
+        for it in reports['found_on_kitsu']:
+            a_id = it.get('a_media_id')
+            k_id = it.get('k_media_id')
+            pair = _pair(it)
+
+            if a_id and a_id in seen_a_ids:
+                continue
+            if k_id and k_id in seen_k_ids:
+                continue
+            if pair in seen_pairs:
+                continue
+            kitsu_out.append(it)
+            if a_id:
+                seen_a_ids.add(a_id)
+            if k_id:
+                seen_k_ids.add(k_id)
+            seen_pairs.add(pair)
+        reports['found_on_kitsu'] = kitsu_out
+
+        if seen_a_ids:
+            reports['not_found_on_kitsu'] = [n for n in reports['not_found_on_kitsu'] if n.get('a_title') and normalize_for_dedupe(n.get('a_title')) not in {p[1] for p in seen_pairs} and n.get('a_title') not in {it.get('a_title') for it in reports['found_on_anilist']}]
+        if seen_k_ids:
+            reports['not_found_on_anilist'] = [n for n in reports['not_found_on_anilist'] if n.get('k_title') and normalize_for_dedupe(n.get('k_title')) not in {p[0] for p in seen_pairs} and n.get('k_title') not in {it.get('k_title') for it in reports['found_on_kitsu']}]
+
+        for category in SEARCH_CATEGORIES:
+            for item in reports[category]:
+                yield 'item', {'category': category, 'item': item}
+
+        reports['kitsu_user_id'] = kitsu_id
+        reports['media_type'] = kitsu_media_type
+
+        report_summary_data = {
+            'kitsu_total': len(kitsu_media_list),
+            'anilist_total': len(anilist_media_map),
+            'ok': match_counts['ok'],
+            'mismatch_status': match_counts['mismatch_status'],
+            'anilist_higher': match_counts['anilist_higher'],
+            'kitsu_higher': match_counts['kitsu_higher'],
+            'found_on_anilist': len(reports['found_on_anilist']),
+            'not_found_on_anilist': len(reports['not_found_on_anilist']),
+            'found_on_kitsu': len(reports['found_on_kitsu']),
+            'not_found_on_kitsu': len(reports['not_found_on_kitsu']),
+        }
+
+        yield 'report', {'summary': report_summary_data, 'report': reports}
+        yield 'log', "--- HTTP usage ---"
+        for line in _http_stats_lines(http_baseline):
+            yield 'log', line
+        yield 'log', "--- Audit Complete ---"
+
+    except GeneratorExit:
+        return
+    except Exception as e:
+        yield 'error', f"An uncaught error occurred: {e}"
+        import traceback
+        traceback.print_exc()
\ No newline at end of file
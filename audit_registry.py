@@ -0,0 +1,151 @@
+import itertools
+import threading
+import time
+from collections import deque
+
+# Messages kept for clients that attach late. Progress updates make up most
+# of a long audit's stream; a client joining (or falling this far behind)
+# after the oldest were dropped picks up from the oldest one kept, and the
+# final report still carries every result.
+MAX_REPLAY_EVENTS = 2000
+# How long an audit with no clients keeps running before it is cancelled,
+# so a page reload can pick the same run back up.
+CANCEL_GRACE_SECONDS = 10
+
+class AuditRun:
+    """
+    One audit running on a background thread. Its latest SSE messages are
+    kept so a client following it gets the stream from the start, or from
+    the oldest message still kept if it attached late. The audit is
+    stopped once its last client has been gone for `cancel_grace` seconds.
+    """
+
+    def __init__(self, key, cancel_grace=CANCEL_GRACE_SECONDS):
+        self.key = key
+        self.cancel_grace = cancel_grace
+        self.started_at = time.time()
+        self.finished = False
+        self.cancelled = threading.Event()
+        self.subscribers = 0
+        self._events = deque(maxlen=MAX_REPLAY_EVENTS)
+        self._published = 0
+        self._cond = threading.Condition()
+
+    def _attach(self):
+        with self._cond:
+            if self.finished or self.cancelled.is_set():
+                return False
+            self.subscribers += 1
+            return True
+
+    def _detach(self):
+        with self._cond:
+            self.subscribers -= 1
+            if self.subscribers or self.finished:
+                return
+        timer = threading.Timer(self.cancel_grace, self._cancel_if_abandoned)
+        timer.daemon = True
+        timer.start()
+
+    def _cancel_if_abandoned(self):
+        with self._cond:
+            if self.subscribers == 0 and not self.finished:
+                self.cancelled.set()
+
+    def _publish(self, event):
+        with self._cond:
+            self._events.append(event)
+            self._published += 1
+            self._cond.notify_all()
+
+    def _finish(self):
+        with self._cond:
+            self.finished = True
+            self._cond.notify_all()
+
+    def follow(self, keep_alive=15):
+        """
+        Yields the run's SSE messages from the oldest one kept until it
+        finishes. Call once per attach; closing the generator detaches the
+        client.
+        """
+        seen = 0
+        try:
+            while True:
+                with self._cond:
+                    if seen >= self._published and not self.finished:
+                        self._cond.wait(keep_alive)
+                    dropped = self._published - len(self._events)
+                    events = list(itertools.islice(self._events, max(seen - dropped, 0), None))
+                    seen = self._published
+                    finished = self.finished
+                yield from events
+                if not events:
+                    if finished:
+                        return
+                    # Keeps proxies from closing the stream during long silent phases.
+                    yield ": keep-alive\n\n"
+        finally:
+            self._detach()
+
+    def summary(self):
+        with self._cond:
+            return {
+                'key': list(self.key),
+                'started_at': self.started_at,
+                'subscribers': self.subscribers,
+                'events': self._published,
+                'finished': self.finished,
+            }
+
+class AuditRegistry:
+    """
+    In-flight audits keyed by account and media type. A request for an
+    audit that is already running follows that run instead of starting a
+    second one; each run keeps its own state, so different audits never
+    see each other's tokens or results.
+    """
+
+    def __init__(self, cancel_grace=CANCEL_GRACE_SECONDS):
+        self.cancel_grace = cancel_grace
+        self._runs = {}
+        self._lock = threading.Lock()
+
+    def start_or_attach(self, key, start):
+        """
+        Returns (run, attached). When an audit for `key` is running, its
+        run comes back with `attached` True; otherwise `start(cancelled)` is
+        called for a fresh SSE generator, which is run on a background
+        thread. `cancelled` is an Event set once the last client has been
+        gone for the grace period, so the audit can stop work in progress
+        instead of at its next message.
+        The caller must consume (or close) `run.follow()` exactly once.
+        """
+        with self._lock:
+            run = self._runs.get(key)
+            if run and run._attach():
+                return run, True
+            run = AuditRun(key, self.cancel_grace)
+            run._attach()
+            self._runs[key] = run
+
+        threading.Thread(target=self._run, args=(run, start(run.cancelled)), name=f"audit-{'-'.join(map(str, key))}", daemon=True).start()
+        return run, False
+
+    def _run(self, run, events):
+        try:
+            for event in events:
+                if run.cancelled.is_set():
+                    break
+                run._publish(event)
+        finally:
+            events.close()
+            run._finish()
+            with self._lock:
+                if self._runs.get(run.key) is run:
+                    del self._runs[run.key]
+
+    def active(self):
+        with self._lock:
+            runs = list(self._runs.values())
+        return [run.summary() for run in runs]
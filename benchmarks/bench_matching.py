@@ -0,0 +1,93 @@
+"""
+Synthetic benchmark for matching a Kitsu library against an AniList one.
+
+Builds a 20k x 20k library pair where a quarter of the Kitsu entries carry
+an AniList ID mapping and another quarter only share a title, then times
+`IncrementalMatcher` with both libraries arriving in interleaved 50-entry
+pages against the old full scan, which re-normalized every Kitsu title for
+each AniList entry. The old scan is quadratic, so it is timed on a sample
+and extrapolated.
+
+    python benchmarks/bench_matching.py [--size 20000] [--sample 50]
+"""
+import argparse
+import itertools
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from normalization import normalize_title_for_match, normalize_titles_for_match
+from matching import IncrementalMatcher
+
+WORDS = ['shin', 'no', 'kimi', 'sekai', 'hero', 'academia', 'tokyo', 'night', 'blade', 'spirit',
+         'love', 'story', 'season', 'school', 'dragon', 'quest', 'girl', 'boy', 'dark', 'light']
+PAGE_SIZE = 50
+
+def _random_title(rng, i):
+    words = rng.sample(WORDS, 3)
+    return f"{words[0].capitalize()}: {words[1]} {words[2]} - Part {i}!"
+
+def build_libraries(size, seed=1):
+    rng = random.Random(seed)
+    kitsu_entries = []
+    anilist_entries = []
+    for i in range(size):
+        kitsu_entry = {'titles': {_random_title(rng, i), f"Kitsu Alt {i}"}, 'anilistId': None, 'malId': None}
+        if i % 4 == 0:
+            kitsu_entry['anilistId'] = 100000 + i
+        kitsu_entries.append(kitsu_entry)
+    for i in range(size):
+        # Half of the AniList entries share a title with a Kitsu entry.
+        titles = kitsu_entries[i]['titles'] if i % 2 == 0 else {_random_title(rng, size + i)}
+        anilist_entries.append({'mediaId': 100000 + i, 'idMal': None, 'titles': sorted(titles)})
+    return kitsu_entries, anilist_entries
+
+def _pages(entries):
+    return [entries[i:i + PAGE_SIZE] for i in range(0, len(entries), PAGE_SIZE)]
+
+def run_incremental(kitsu_entries, anilist_entries):
+    normalize_title_for_match.cache_clear()
+    matcher = IncrementalMatcher(normalize_titles_for_match)
+    matches = 0
+    started = time.perf_counter()
+    for kitsu_page, anilist_page in itertools.zip_longest(_pages(kitsu_entries), _pages(anilist_entries)):
+        matches += len(matcher.add_kitsu(kitsu_page or []))
+        matches += len(matcher.add_anilist(anilist_page or []))
+    matches += len(matcher.finish())
+    return time.perf_counter() - started, matches, matcher.id_match_count
+
+def run_full_scan(kitsu_entries, anilist_entries, sample):
+    processed = set()
+    started = time.perf_counter()
+    for anilist_entry in anilist_entries[:sample]:
+        titles = {normalize_title_for_match.__wrapped__(t) for t in anilist_entry['titles']}
+        for i, kitsu_entry in enumerate(kitsu_entries):
+            if i in processed:
+                continue
+            kitsu_norm_titles = {normalize_title_for_match.__wrapped__(t) for t in kitsu_entry.get('titles', [])}
+            if kitsu_norm_titles & titles:
+                processed.add(i)
+                break
+    return time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', type=int, default=20000)
+    parser.add_argument('--sample', type=int, default=50)
+    args = parser.parse_args()
+
+    kitsu_entries, anilist_entries = build_libraries(args.size)
+
+    seconds, matches, id_matches = run_incremental(kitsu_entries, anilist_entries)
+    print(f"incremental: {seconds:8.3f} s for {args.size} x {args.size} ({matches} matches, {id_matches} by ID)")
+
+    sample = min(args.sample, args.size)
+    scan_seconds = run_full_scan(kitsu_entries, anilist_entries, sample)
+    estimated = scan_seconds / sample * args.size
+    print(f"full scan:   {scan_seconds:8.3f} s for {sample} AniList entries (~{estimated:,.0f} s extrapolated to {args.size})")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+import threading
+import time
+
+import requests
+
+from anilist_api import get_anilist_user_id
+from kitsu_api import request_kitsu_token, refresh_kitsu_token, get_kitsu_user_id_from_token
+
+# Tokens are renewed this long before Kitsu says they expire.
+TOKEN_REFRESH_MARGIN = 10 * 60
+
+class KitsuAuthError(requests.exceptions.RequestException):
+    """No Kitsu token could be obtained; handled like any failed request."""
+
+def is_unauthorized(error):
+    response = getattr(error, 'response', None)
+    return response is not None and response.status_code == 401
+
+class CredentialCache:
+    """
+    Keeps Kitsu access tokens until shortly before they expire (renewing
+    them with the refresh-token grant, falling back to the password grant)
+    and remembers each account's Kitsu and AniList user IDs, which never
+    change. Tokens are requested under a per-account lock, so one slow
+    grant does not hold up other accounts.
+    """
+
+    def __init__(self, refresh_margin=TOKEN_REFRESH_MARGIN):
+        self.refresh_margin = refresh_margin
+        self._kitsu_tokens = {}
+        self._user_ids = {}
+        self._token_locks = {}
+        self._lock = threading.Lock()
+
+    def kitsu_token(self, username, password):
+        """Returns a usable Kitsu access token for `username`, or None."""
+        with self._lock:
+            account_lock = self._token_locks.setdefault(username, threading.Lock())
+        with account_lock:
+            with self._lock:
+                cached = self._kitsu_tokens.get(username)
+            if cached and time.time() < cached['expires_at'] - self.refresh_margin:
+                return cached['access_token']
+
+            requested_at = time.time()
+            token_data = None
+            if cached and cached.get('refresh_token'):
+                token_data = refresh_kitsu_token(cached['refresh_token'])
+            if not token_data:
+                token_data = request_kitsu_token(username, password)
+            with self._lock:
+                if not token_data:
+                    self._kitsu_tokens.pop(username, None)
+                    return None
+                self._kitsu_tokens[username] = {
+                    'access_token': token_data['access_token'],
+                    'refresh_token': token_data.get('refresh_token'),
+                    # Without an expiry, treat the token as good for one refresh margin.
+                    'expires_at': requested_at + (token_data.get('expires_in') or 2 * self.refresh_margin),
+                }
+            return token_data['access_token']
+
+    def invalidate_kitsu_token(self, username, token=None):
+        """
+        Drops a token the API has rejected so the next call fetches a new
+        one. With `token`, only that token is dropped, so callers that were
+        rejected at the same time do not throw away each other's fresh one.
+        """
+        with self._lock:
+            cached = self._kitsu_tokens.get(username)
+            if cached and (token is None or cached['access_token'] == token):
+                del self._kitsu_tokens[username]
+
+    def with_kitsu_token(self, username, password, request):
+        """
+        Returns `request(token)` called with the account's Kitsu token. If
+        Kitsu answers 401 (the token was revoked, or the password changed),
+        the token is dropped and the call is retried once with a fresh one.
+        `request` must raise on HTTP errors; KitsuAuthError is raised when
+        no token can be obtained.
+        """
+        for attempt in range(2):
+            token = self.kitsu_token(username, password)
+            if not token:
+                raise KitsuAuthError("Could not get Kitsu token.")
+            try:
+                return request(token)
+            except requests.exceptions.HTTPError as e:
+                if attempt or not is_unauthorized(e):
+                    raise
+                self.invalidate_kitsu_token(username, token)
+
+    def kitsu_user_id(self, username, token):
+        return self._user_id(('kitsu', username), lambda: get_kitsu_user_id_from_token(token))
+
+    def anilist_user_id(self, username, token):
+        return self._user_id(('anilist', username), lambda: get_anilist_user_id(username, token))
+
+    def _user_id(self, key, lookup):
+        with self._lock:
+            if key in self._user_ids:
+                return self._user_ids[key]
+        user_id = lookup()
+        if user_id:
+            with self._lock:
+                self._user_ids[key] = user_id
+        return user_id
+
+credential_cache = CredentialCache()
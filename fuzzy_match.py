@@ -0,0 +1,142 @@
+import re
+
+FUZZY_MATCH_THRESHOLD = 0.8
+# Two candidates scoring within this margin of each other are ambiguous.
+AMBIGUITY_MARGIN = 0.03
+# Grams shared by more titles than this carry no signal for candidate lookup.
+MAX_POSTING_LENGTH = 5000
+# A title fully contained in a longer one (a dropped subtitle) still counts,
+# at a discount, but only when the shorter title is this long; "Naruto" is
+# not "Naruto Shippuden".
+SUBTITLE_MIN_LENGTH = 15
+SUBTITLE_WEIGHT = 0.9
+
+_ORDINAL_SEASON = re.compile(r'\b(\d+)(?:st|nd|rd|th) season\b')
+_SEASON_WORD = re.compile(r'\bseason (\d+)\b')
+# Only trailing numerals: a lone "x" or "v" mid-title is usually a word ("Hunter x Hunter").
+_TRAILING_ROMAN = re.compile(r'\b(ii|iii|iv|v|vi|vii|viii|ix|x)$')
+_ROMAN_VALUES = {'ii': '2', 'iii': '3', 'iv': '4', 'v': '5', 'vi': '6', 'vii': '7', 'viii': '8', 'ix': '9', 'x': '10'}
+_NUMBER = re.compile(r'\d+')
+# Words that mark a later instalment when a longer title adds them.
+_SEQUEL_WORDS = frozenset(('season', 'part', 'cour', 'final'))
+
+def canonicalize(norm_title):
+    """
+    Rewrites common spelling variants of the same title onto one form
+    ("2nd season" / "season 2" -> "s2", a trailing "ii" -> "2") before
+    n-grams are taken, so the number guard sees sequels however they are
+    spelled.
+    """
+    title = _TRAILING_ROMAN.sub(lambda m: _ROMAN_VALUES[m.group(1)], norm_title)
+    title = _ORDINAL_SEASON.sub(r's\1', title)
+    return _SEASON_WORD.sub(r's\1', title)
+
+def _adds_sequel_marker(shorter_words, longer_words):
+    return any(word in _SEQUEL_WORDS or _NUMBER.search(word) for word in longer_words - shorter_words)
+
+def trigrams(title):
+    padded = f"  {title} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+class TrigramIndex:
+    """
+    Character trigram index over the normalized titles of one library.
+    Each key (an entry ID) may carry several titles; a query scores a key by
+    its best-matching title using Jaccard similarity of the trigram sets, or
+    discounted containment when one title is the other minus a subtitle.
+    """
+
+    def __init__(self):
+        self._postings = {}
+        self._titles = []
+
+    def add(self, key, norm_title):
+        canonical = canonicalize(norm_title)
+        title_id = len(self._titles)
+        self._titles.append((key, norm_title, trigrams(canonical), frozenset(_NUMBER.findall(canonical)), frozenset(canonical.split())))
+        for gram in self._titles[title_id][2]:
+            self._postings.setdefault(gram, []).append(title_id)
+
+    def query(self, norm_title, threshold):
+        """Returns {key: (score, matched title)} for keys scoring at least `threshold`."""
+        canonical = canonicalize(norm_title)
+        grams = trigrams(canonical)
+        numbers = frozenset(_NUMBER.findall(canonical))
+        words = frozenset(canonical.split())
+
+        candidates = set()
+        for gram in grams:
+            posting = self._postings.get(gram, ())
+            if len(posting) > MAX_POSTING_LENGTH:
+                continue
+            candidates.update(posting)
+
+        best = {}
+        for title_id in candidates:
+            key, other_title, other_grams, other_numbers, other_words = self._titles[title_id]
+            # "Title 2" and "Title 3" are near-identical as strings but never the same work.
+            if numbers != other_numbers:
+                continue
+            common = len(grams & other_grams)
+            score = common / len(grams | other_grams)
+            # A subtitle may be dropped, but not one naming a season or part.
+            if min(len(canonical), len(other_title)) >= SUBTITLE_MIN_LENGTH and not (
+                    _adds_sequel_marker(words, other_words) or _adds_sequel_marker(other_words, words)):
+                score = max(score, SUBTITLE_WEIGHT * common / min(len(grams), len(other_grams)))
+            if score >= threshold and score > best.get(key, (0, None))[0]:
+                best[key] = (score, other_title)
+        return best
+
+def fuzzy_match_pairs(kitsu_items, anilist_items, threshold=FUZZY_MATCH_THRESHOLD, is_compatible=None):
+    """
+    Pairs leftover Kitsu and AniList entries by title similarity.
+
+    `kitsu_items` and `anilist_items` are iterables of (key, normalized
+    titles). Every Kitsu entry is scored against the AniList index; a Kitsu
+    entry whose top two candidates are within AMBIGUITY_MARGIN is left for
+    the network search. Pairs are then taken greedily from the highest
+    score down, so each entry is used once. Ties on score are broken by
+    the lower Kitsu key, then the lower AniList key.
+
+    Returns a list of dicts with kitsu_key, anilist_key, score, kitsu_title
+    and anilist_title.
+    """
+    index = TrigramIndex()
+    for key, titles in anilist_items:
+        for title in titles:
+            index.add(key, title)
+
+    candidates = []
+    for kitsu_key, titles in kitsu_items:
+        scored = {}
+        for title in titles:
+            for anilist_key, (score, anilist_title) in index.query(title, threshold).items():
+                if is_compatible and not is_compatible(kitsu_key, anilist_key):
+                    continue
+                if score > scored.get(anilist_key, (0,))[0]:
+                    scored[anilist_key] = (score, title, anilist_title)
+        if not scored:
+            continue
+
+        ranked = sorted(scored.items(), key=lambda item: (-item[1][0], item[0]))
+        if len(ranked) > 1 and ranked[0][1][0] - ranked[1][1][0] < AMBIGUITY_MARGIN:
+            continue
+        anilist_key, (score, kitsu_title, anilist_title) = ranked[0]
+        candidates.append((score, kitsu_key, anilist_key, kitsu_title, anilist_title))
+
+    pairs = []
+    used_kitsu = set()
+    used_anilist = set()
+    for score, kitsu_key, anilist_key, kitsu_title, anilist_title in sorted(candidates, key=lambda c: (-c[0], c[1], c[2])):
+        if kitsu_key in used_kitsu or anilist_key in used_anilist:
+            continue
+        used_kitsu.add(kitsu_key)
+        used_anilist.add(anilist_key)
+        pairs.append({
+            'kitsu_key': kitsu_key,
+            'anilist_key': anilist_key,
+            'score': round(score, 3),
+            'kitsu_title': kitsu_title,
+            'anilist_title': anilist_title,
+        })
+    return pairs
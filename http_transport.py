@@ -0,0 +1,109 @@
+import re
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from rate_limiter import anilist_limiter, kitsu_limiter
+
+DEFAULT_POOL_SIZE = 16
+DEFAULT_TIMEOUT = 30
+
+class Transport:
+    """
+    Pooled, rate-limited HTTP client for one provider.
+
+    Connections are kept alive in a `requests.Session` whose pool is sized for
+    the concurrent fetchers (see `fit_pools`), every call waits on the
+    provider's rate limiter, and per-endpoint request counts, bytes and
+    latency are recorded.
+    """
+
+    def __init__(self, name, limiter, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT):
+        self.name = name
+        self.limiter = limiter
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.resize_pool(pool_size)
+
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+
+    def resize_pool(self, pool_size):
+        """Remounts the session with room for `pool_size` kept-alive connections."""
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.pool_size = pool_size
+
+    def request(self, method, url, max_retries=3, **kwargs):
+        """
+        Sends a request through the pooled session, retrying after the
+        server-requested pause when the provider answers 429.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        endpoint = _endpoint_key(method, url)
+
+        for attempt in range(max_retries + 1):
+            self.limiter.acquire()
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.exceptions.RequestException:
+                self._record(endpoint, time.perf_counter() - started, 0, error=True)
+                raise
+            self._record(endpoint, time.perf_counter() - started, len(response.content or b''), error=response.status_code >= 400)
+            self.limiter.observe(response)
+            if response.status_code != 429:
+                break
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def patch(self, url, **kwargs):
+        return self.request('PATCH', url, **kwargs)
+
+    def _record(self, endpoint, latency, size, error=False):
+        with self._stats_lock:
+            stats = self._stats.setdefault(endpoint, {'requests': 0, 'errors': 0, 'bytes': 0, 'total_latency': 0.0, 'max_latency': 0.0})
+            stats['requests'] += 1
+            stats['bytes'] += size
+            stats['total_latency'] += latency
+            stats['max_latency'] = max(stats['max_latency'], latency)
+            if error:
+                stats['errors'] += 1
+
+    def stats(self):
+        """Returns a copy of the per-endpoint counters, with average latency in milliseconds."""
+        with self._stats_lock:
+            snapshot = {}
+            for endpoint, stats in self._stats.items():
+                snapshot[endpoint] = dict(stats)
+                snapshot[endpoint]['avg_latency_ms'] = round(1000 * stats['total_latency'] / stats['requests'], 1) if stats['requests'] else 0.0
+            return snapshot
+
+def _endpoint_key(method, url):
+    # Collapse numeric path segments so /users/123/library-entries and
+    # /users/456/library-entries count as one endpoint.
+    path = re.sub(r'/\d+(?=/|$)', '/{id}', urlparse(url).path or '/')
+    return f"{method.upper()} {path}"
+
+anilist_transport = Transport('anilist', anilist_limiter)
+kitsu_transport = Transport('kitsu', kitsu_limiter)
+
+def fit_pools(concurrent_requests):
+    """
+    Sizes both providers' connection pools for `concurrent_requests`
+    requests in flight at once, never below DEFAULT_POOL_SIZE. Call at
+    startup, once the worker counts are known.
+    """
+    pool_size = max(DEFAULT_POOL_SIZE, concurrent_requests)
+    for transport in (anilist_transport, kitsu_transport):
+        if transport.pool_size != pool_size:
+            transport.resize_pool(pool_size)
@@ -1,32 +1,47 @@
 import requests
-import time
-import json
+import itertools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
-def get_kitsu_auth_token(username, password):
-    url = "https://kitsu.io/api/oauth/token"
-    data = {
-        'grant_type': 'password',
-        'username': username,
-        'password': password
-    }
+from http_transport import kitsu_transport
+from rate_limiter import submit_in_context
+
+KITSU_TOKEN_URL = "https://kitsu.io/api/oauth/token"
+
+def _request_kitsu_token(data):
     headers = {
         'Content-Type': 'application/json',
         'Accept': 'application/json'
     }
-    
+
     try:
-        response = requests.post(url, json=data, headers=headers)
+        response = kitsu_transport.post(KITSU_TOKEN_URL, json=data, headers=headers)
         response.raise_for_status()
         token_data = response.json()
-        access_token = token_data.get('access_token')
-        
-        if access_token:
-            return access_token
-        else:
-            return None
-    except requests.exceptions.RequestException as e:
+        if token_data.get('access_token'):
+            return token_data
         return None
-    
+    except (requests.exceptions.RequestException, ValueError) as e:
+        return None
+
+def request_kitsu_token(username, password):
+    """
+    Password grant. Returns Kitsu's token response (access_token,
+    refresh_token, expires_in, ...) or None.
+    """
+    return _request_kitsu_token({
+        'grant_type': 'password',
+        'username': username,
+        'password': password
+    })
+
+def refresh_kitsu_token(refresh_token):
+    """Refresh-token grant; same return value as `request_kitsu_token`."""
+    return _request_kitsu_token({
+        'grant_type': 'refresh_token',
+        'refresh_token': refresh_token
+    })
+
 def get_kitsu_user_id_from_token(token):
     url = "https://kitsu.io/api/edge/users"
     params = {
@@ -35,7 +50,7 @@ def get_kitsu_user_id_from_token(token):
     headers = get_kitsu_auth_headers(token)
     
     try:
-        response = requests.get(url, params=params, headers=headers)
+        response = kitsu_transport.get(url, params=params, headers=headers)
         response.raise_for_status()
         data = response.json()
         
@@ -75,141 +90,301 @@ def translate_anilist_to_kitsu_status(anilist_status):
     return status_map.get(anilist_status)
 
 
-def fetch_kitsu_media_by_id(media_id, media_data_map, token, media_type='manga'):
+def _collect_kitsu_mappings(included):
+    """Maps mapping ID -> (externalSite, externalId) for `mappings` in an `included` list."""
+    return {
+        item['id']: (item.get('attributes', {}).get('externalSite'), item.get('attributes', {}).get('externalId'))
+        for item in included or [] if item.get('type') == 'mappings'
+    }
+
+def _parse_kitsu_media(item, mappings_by_id=None):
+    attr = item.get('attributes', {})
+    title_set = set()
+
+    canonical = attr.get('canonicalTitle')
+    if canonical:
+        title_set.add(canonical)
+
+    if attr.get('titles'):
+        for lang, title in attr['titles'].items():
+            if title: title_set.add(title)
+
+    if attr.get('abbreviatedTitles'):
+        title_set.update(attr['abbreviatedTitles'])
+
+    if attr.get('synonyms'):
+        title_set.update(attr['synonyms'])
+
+    anilist_id = None
+    mal_id = None
+    mapping_refs = ((item.get('relationships') or {}).get('mappings') or {}).get('data') or []
+    for ref in mapping_refs:
+        external_site, external_id = (mappings_by_id or {}).get(ref.get('id'), (None, None))
+        if not external_site or not external_id or not str(external_id).isdigit():
+            continue
+        if external_site.startswith('anilist/'):
+            anilist_id = int(external_id)
+        elif external_site.startswith('myanimelist/'):
+            mal_id = int(external_id)
+
+    return {
+        'canonicalTitle': canonical,
+        'slug': attr.get('slug'),
+        'titles': title_set,
+        'posterImage': attr.get('posterImage', {}),
+        'anilistId': anilist_id,
+        'malId': mal_id
+    }
+
+# Kitsu caps library-entries pages at 500 and media pages at 20.
+KITSU_LIBRARY_PAGE_LIMIT = 500
+KITSU_MEDIA_BATCH_SIZE = 20
+KITSU_UPDATES_PAGE_LIMIT = 50
+KITSU_PAGE_CONCURRENCY = 4
+
+def fetch_kitsu_media_batch(media_ids, token, media_type='manga'):
+    """
+    Resolves several media IDs with one `filter[id]=a,b,c` request.
+    Returns a map of media ID -> parsed media; IDs Kitsu did not return are absent.
+    """
+    media_type_lower = media_type.lower()
+    url = f"https://kitsu.io/api/edge/{media_type_lower}"
+    params = {
+        'filter[id]': ','.join(str(m_id) for m_id in media_ids),
+        'include': 'mappings',
+        'page[limit]': len(media_ids)
+    }
     try:
-        url = f"https://kitsu.io/api/edge/{media_type.lower()}/{media_id}"
-        response = requests.get(url, headers=get_kitsu_auth_headers(token)) 
+        response = kitsu_transport.get(url, params=params, headers=get_kitsu_auth_headers(token))
         response.raise_for_status()
         data = response.json()
-        
-        if 'data' in data:
-            item = data['data']
-            attr = item.get('attributes', {})
-            title_set = set()
-            
-            canonical = attr.get('canonicalTitle')
-            if canonical:
-                title_set.add(canonical)
-            
-            if attr.get('titles'):
-                for lang, title in attr['titles'].items():
-                    if title: title_set.add(title)
-            
-            if attr.get('abbreviatedTitles'):
-                title_set.update(attr['abbreviatedTitles'])
-            
-            if attr.get('synonyms'):
-                title_set.update(attr['synonyms'])
-            
-            media_data_map[media_id] = {
-                'canonicalTitle': canonical,
-                'slug': attr.get('slug'),
-                'titles': title_set,
-                'posterImage': attr.get('posterImage', {})
-            }
-            return True
+    except (requests.exceptions.RequestException, ValueError) as e:
+        return {}
+
+    mappings_by_id = _collect_kitsu_mappings(data.get('included'))
+    return {item['id']: _parse_kitsu_media(item, mappings_by_id) for item in data.get('data') or []}
+
+def _fetch_kitsu_library_page(url, params, offset, auth_headers):
+    page_params = dict(params)
+    page_params['page[offset]'] = offset
+    try:
+        response = kitsu_transport.get(url, params=page_params, headers=auth_headers)
+        response.raise_for_status()
+        return response.json()
     except requests.exceptions.RequestException as e:
-        return False
-    return False
+        return None
+
+def _fill_kitsu_entry(library_entry, media_info, media_type_lower):
+    library_entry.update({
+        'titles': media_info['titles'],
+        'canonicalTitle': media_info['canonicalTitle'],
+        'kitsuUrl': f"https://kitsu.io/{media_type_lower}/{media_info['slug']}",
+        'kitsuImage': media_info.get('posterImage'),
+        'anilistId': media_info.get('anilistId'),
+        'malId': media_info.get('malId')
+    })
+
+def iter_kitsu_library_pages(user_id, token, media_type='manga', yield_progress_callback=None, max_concurrency=KITSU_PAGE_CONCURRENCY, updated_after=None, library_info=None, page_callback=None):
+    """
+    Yields a user's Kitsu library entries for one media type in batches, one
+    per library page as it arrives.
+
+    The first page reports `meta.count`, so every remaining `page[offset]`
+    is known up front and fetched in parallel (at most `max_concurrency` in
+    flight); pages are yielded in offset order and each raw page is dropped
+    once its entries are built.
+
+    Media that Kitsu leaves out of `included` are resolved in `filter[id]`
+    batches alongside the page fetches. Their entries are held back and
+    yielded as an extra batch once their media arrives; entries whose
+    media cannot be resolved at all are left out.
 
-def fetch_kitsu_library(user_id, token, media_type='manga', yield_progress_callback=None):
+    With `updated_after` (an ISO timestamp) pages are walked newest-first by
+    `updatedAt` and the walk stops once it reaches older entries. If given,
+    `library_info` receives the library size Kitsu reports (`count`) and
+    whether every page arrived (`complete`), and `page_callback(pages_done,
+    pages_total, entry_count)` is called for every batch (`pages_total` is
+    None while walking changes).
+
+    Nothing is yielded if the first page cannot be fetched; otherwise the
+    first page is always yielded, even when it is empty.
+    """
     media_type_lower = media_type.lower()
     base_url = f"https://kitsu.io/api/edge/users/{user_id}/library-entries"
     
     params = {
         'filter[kind]': media_type_lower,
         'filter[status]': 'current,completed,on_hold,dropped,planned',
-        'include': media_type_lower,
-        'page[limit]': 50
+        'include': f"{media_type_lower},{media_type_lower}.mappings",
+        'sort': 'id',
+        'page[limit]': KITSU_LIBRARY_PAGE_LIMIT
     }
+    if updated_after is not None:
+        params['sort'] = '-updatedAt'
+        params['page[limit]'] = KITSU_UPDATES_PAGE_LIMIT
     
-    kitsu_media_list = []
     media_data_map = {}
-    next_url = base_url
-    page_num = 1
-    
+    placeholders = {}
+    batch_futures = deque()
     auth_headers = get_kitsu_auth_headers(token)
 
-    while next_url:
-        try:
+    def page_entries(data, executor):
+        mappings_by_id = _collect_kitsu_mappings(data.get('included'))
+        for item in data.get('included') or []:
+            if item['type'] == media_type_lower and item['id'] not in media_data_map:
+                media_data_map[item['id']] = _parse_kitsu_media(item, mappings_by_id)
+
+        entries = []
+        missing_ids = []
+        for entry in data.get('data') or []:
+            if 'relationships' in entry and media_type_lower in entry['relationships'] and entry['relationships'][media_type_lower].get('data'):
+                media_id = entry['relationships'][media_type_lower]['data']['id']
+                kitsu_status = entry['attributes']['status']
+
+                library_entry = {
+                    'titles': set(),
+                    'canonicalTitle': None,
+                    'kitsuUrl': None,
+                    'media_id': media_id, 
+                    'status': translate_kitsu_status(kitsu_status),
+                    'progress': entry['attributes']['progress'],
+                    'libraryEntryId': entry['id'],
+                    'updatedAt': entry['attributes'].get('updatedAt'),
+                    'kitsuImage': None,
+                    'anilistId': None,
+                    'malId': None
+                }
+
+                if media_id in media_data_map:
+                    _fill_kitsu_entry(library_entry, media_data_map[media_id], media_type_lower)
+                    entries.append(library_entry)
+                else:
+                    if media_id not in placeholders:
+                        missing_ids.append(media_id)
+                    placeholders.setdefault(media_id, []).append(library_entry)
+
+        if missing_ids and yield_progress_callback:
+            yield_progress_callback(f"  -> Kitsu 'included' data missing for {len(missing_ids)} items. Fetching in batches...")
+        for i in range(0, len(missing_ids), KITSU_MEDIA_BATCH_SIZE):
+            chunk = missing_ids[i:i + KITSU_MEDIA_BATCH_SIZE]
+            batch_futures.append((chunk, submit_in_context(executor, fetch_kitsu_media_batch, chunk, token, media_type_lower)))
+        return entries
+
+    def resolved_placeholders(wait):
+        entries = []
+        while batch_futures and (wait or batch_futures[0][1].done()):
+            chunk, future = batch_futures.popleft()
+            found = future.result()
+            media_data_map.update(found)
+            for media_id in chunk:
+                for library_entry in placeholders.pop(media_id, []):
+                    if media_id in found:
+                        _fill_kitsu_entry(library_entry, found[media_id], media_type_lower)
+                        entries.append(library_entry)
+        return entries
+
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+        if yield_progress_callback:
+            yield_progress_callback("Fetching Kitsu page 1...")
+        first_page = _fetch_kitsu_library_page(base_url, params, 0, auth_headers)
+        if first_page is None:
+            return
+
+        total_count = (first_page.get('meta') or {}).get('count') or 0
+        if library_info is not None:
+            library_info['count'] = total_count
+            library_info['complete'] = True
+
+        pages_done = 0
+        pages_total = None
+
+        def counted(entries, new_pages=1):
+            nonlocal pages_done
+            pages_done += new_pages
+            if page_callback:
+                page_callback(pages_done, pages_total, len(entries))
+            return entries
+
+        if updated_after is not None:
+            data = first_page
+            del first_page
+            offset = 0
+            checked = 0
+            while True:
+                page_data = data.get('data') or []
+                oldest = page_data[-1]['attributes'].get('updatedAt') if page_data else None
+                checked += len(page_data)
+                yield counted(page_entries(data, executor))
+                del data, page_data
+                offset += params['page[limit]']
+                if not oldest or oldest <= updated_after or offset >= total_count:
+                    break
+                data = _fetch_kitsu_library_page(base_url, params, offset, auth_headers)
+                if data is None:
+                    if library_info is not None:
+                        library_info['complete'] = False
+                    break
             if yield_progress_callback:
-                progress_message = f"Fetching Kitsu page {page_num}..."
-                yield_progress_callback(progress_message)
-            page_num += 1
-            
-            response = requests.get(next_url, params=params, headers=auth_headers)
-            response.raise_for_status()
-            data = response.json()
-            
-            if 'included' in data:
-                for item in data['included']:
-                    if item['type'] == media_type_lower:
-                        item_id = item['id']
-                        if item_id not in media_data_map:
-                            attr = item.get('attributes', {})
-                            title_set = set()
-                            
-                            canonical = attr.get('canonicalTitle')
-                            if canonical:
-                                title_set.add(canonical)
-                            
-                            if attr.get('titles'):
-                                for lang, title in attr['titles'].items():
-                                    if title: title_set.add(title)
-                            
-                            if attr.get('abbreviatedTitles'):
-                                title_set.update(attr['abbreviatedTitles'])
-                            
-                            if attr.get('synonyms'):
-                                title_set.update(attr['synonyms'])
-                            
-                            media_data_map[item_id] = {
-                                'canonicalTitle': canonical,
-                                'slug': attr.get('slug'),
-                                'titles': title_set,
-                                'posterImage': attr.get('posterImage', {})
-                            }
-
-            if 'data' in data:
-                for entry in data['data']:
-                    if 'relationships' in entry and media_type_lower in entry['relationships'] and entry['relationships'][media_type_lower].get('data'):
-                        media_id = entry['relationships'][media_type_lower]['data']['id']
-                        
-                        if media_id not in media_data_map:
-                            if yield_progress_callback:
-                                yield_progress_callback(f"  -> Kitsu 'included' data missing. Fetching {media_id} manually...")
-                            fetch_kitsu_media_by_id(media_id, media_data_map, token, media_type_lower)
-                            time.sleep(1)
-
-                        if media_id in media_data_map:
-                            media_info = media_data_map[media_id]
-                            kitsu_status = entry['attributes']['status']
-                            
-                            kitsu_media_list.append({
-                                'titles': media_info['titles'],
-                                'canonicalTitle': media_info['canonicalTitle'],
-                                'kitsuUrl': f"https://kitsu.io/{media_type_lower}/{media_info['slug']}",
-                                'media_id': media_id, 
-                                'status': translate_kitsu_status(kitsu_status),
-                                'progress': entry['attributes']['progress'],
-                                'libraryEntryId': entry['id'],
-                                'kitsuImage': media_info.get('posterImage') 
-                            })
-            
-            if 'links' in data and 'next' in data['links']:
-                next_url = data['links']['next']
-                params = {} 
-            else:
-                next_url = None
-                
-            time.sleep(1)
+                yield_progress_callback(f"Fetched Kitsu changes ({checked} entries checked)")
+        else:
+            offsets = iter(range(KITSU_LIBRARY_PAGE_LIMIT, total_count, KITSU_LIBRARY_PAGE_LIMIT))
+            total_pages = pages_total = (max(total_count, 1) + KITSU_LIBRARY_PAGE_LIMIT - 1) // KITSU_LIBRARY_PAGE_LIMIT
+
+            def submit(offset):
+                return submit_in_context(executor, _fetch_kitsu_library_page, base_url, params, offset, auth_headers)
+
+            in_flight = deque(submit(offset) for offset in itertools.islice(offsets, max(1, max_concurrency)))
+            if yield_progress_callback:
+                yield_progress_callback(f"Fetched Kitsu page 1 / {total_pages}")
+            entries = page_entries(first_page, executor)
+            del first_page
+            yield counted(entries)
+
+            page_num = 1
+            while in_flight:
+                future = in_flight.popleft()
+                next_offset = next(offsets, None)
+                if next_offset is not None:
+                    in_flight.append(submit(next_offset))
+
+                page_num += 1
+                data = future.result()
+                if data is None:
+                    if library_info is not None:
+                        library_info['complete'] = False
+                    counted([])
+                    continue
+                if yield_progress_callback:
+                    yield_progress_callback(f"Fetched Kitsu page {page_num} / {total_pages}")
+                entries = page_entries(data, executor)
+                del data
+                entries.extend(resolved_placeholders(wait=False))
+                yield counted(entries)
+
+        entries = resolved_placeholders(wait=True)
+        if entries:
+            yield counted(entries, new_pages=0)
+
+def fetch_kitsu_library(user_id, token, media_type='manga', yield_progress_callback=None, max_concurrency=KITSU_PAGE_CONCURRENCY, updated_after=None, library_info=None, page_callback=None):
+    """
+    Fetches a user's Kitsu library entries for one media type as one list;
+    see `iter_kitsu_library_pages`. A full fetch comes back in library
+    (`sort=id`) order. Returns None if the first page cannot be fetched.
+    """
+    pages = list(iter_kitsu_library_pages(user_id, token, media_type, yield_progress_callback, max_concurrency, updated_after, library_info, page_callback))
+    if not pages:
+        return None
+    entries = [entry for page in pages for entry in page]
+    if updated_after is None:
+        entries.sort(key=kitsu_library_order)
+    return entries
 
-        except requests.exceptions.RequestException as e:
-            break
-            
-    return kitsu_media_list
+def kitsu_library_order(entry):
+    """Sort key matching the `sort=id` order of a library listing."""
+    entry_id = str(entry['libraryEntryId'])
+    return int(entry_id) if entry_id.isdigit() else 0
 
-def search_kitsu_by_title(title, token, media_type='manga'):
+def search_kitsu_by_title(title, token, media_type='manga', raise_on_error=False):
     media_type_lower = media_type.lower()
     url = f"https://kitsu.io/api/edge/{media_type_lower}"
     params = {
@@ -219,7 +394,7 @@ def search_kitsu_by_title(title, token, media_type='manga'):
     headers = get_kitsu_auth_headers(token)
     
     try:
-        response = requests.get(url, params=params, headers=headers)
+        response = kitsu_transport.get(url, params=params, headers=headers)
         response.raise_for_status()
         data = response.json()
         
@@ -241,11 +416,14 @@ def search_kitsu_by_title(title, token, media_type='manga'):
                 }
         return None 
     except requests.exceptions.RequestException as e:
+        if raise_on_error:
+            raise
         return None
 
-def add_kitsu_entry(user_id, media_id, status, progress, token, media_type='manga'):
+def add_kitsu_entry(user_id, media_id, status, progress, token, media_type='manga', raise_on_error=False):
     """
     Creates a new library entry for a user.
+    With `raise_on_error`, request failures raise instead of returning False.
     """
     url = "https://kitsu.io/api/edge/library-entries"
     headers = get_kitsu_auth_headers(token)
@@ -275,16 +453,19 @@ def add_kitsu_entry(user_id, media_id, status, progress, token, media_type='mang
     }
     
     try:
-        response = requests.post(url, json=payload, headers=headers)
+        response = kitsu_transport.post(url, json=payload, headers=headers)
         response.raise_for_status()
         return True
     except requests.exceptions.RequestException as e:
+        if raise_on_error:
+            raise
         return False
 
-def update_kitsu_entry(library_entry_id, status, progress, token):
+def update_kitsu_entry(library_entry_id, status, progress, token, raise_on_error=False):
     """
     Updates an existing library entry by its ID.
     Can update status, progress, or both.
+    With `raise_on_error`, request failures raise instead of returning False.
     """
     url = f"https://kitsu.io/api/edge/library-entries/{library_entry_id}"
     headers = get_kitsu_auth_headers(token)
@@ -307,8 +488,10 @@ def update_kitsu_entry(library_entry_id, status, progress, token):
     }
     
     try:
-        response = requests.patch(url, json=payload, headers=headers)
+        response = kitsu_transport.patch(url, json=payload, headers=headers)
         response.raise_for_status()
         return True
     except requests.exceptions.RequestException as e:
+        if raise_on_error:
+            raise
         return False
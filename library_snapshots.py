@@ -0,0 +1,183 @@
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from anilist_api import fetch_anilist_library_entries, iter_anilist_library_pages
+from kitsu_api import fetch_kitsu_library, iter_kitsu_library_pages, kitsu_library_order
+
+# Incremental refreshes cannot see entries deleted on the remote side, so a
+# full refresh is forced once a snapshot is this old.
+FULL_REFRESH_AFTER_SECONDS = 24 * 60 * 60
+
+class SnapshotStore:
+    """
+    On-disk (SQLite) copy of each user's AniList and Kitsu library, keyed by
+    provider, user ID and media type. Entries are stored as JSON together
+    with their `updatedAt` value so later refreshes can ask only for changes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS snapshot_meta (
+                    provider TEXT, user_id TEXT, media_type TEXT,
+                    last_updated_at TEXT, full_refreshed_at REAL,
+                    PRIMARY KEY (provider, user_id, media_type)
+                )""")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS snapshot_entries (
+                    provider TEXT, user_id TEXT, media_type TEXT,
+                    entry_key TEXT, updated_at TEXT, data TEXT,
+                    PRIMARY KEY (provider, user_id, media_type, entry_key)
+                )""")
+
+    @contextmanager
+    def _connect(self):
+        # sqlite3's own context manager only commits; the connection is
+        # closed here so each call releases its file handle.
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def load_meta(self, provider, user_id, media_type):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT last_updated_at, full_refreshed_at FROM snapshot_meta WHERE provider=? AND user_id=? AND media_type=?",
+                (provider, str(user_id), media_type.lower())).fetchone()
+        if not row:
+            return None
+        return {'last_updated_at': row[0], 'full_refreshed_at': row[1]}
+
+    def load_entries(self, provider, user_id, media_type):
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT data FROM snapshot_entries WHERE provider=? AND user_id=? AND media_type=? ORDER BY rowid",
+                (provider, str(user_id), media_type.lower())).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def save(self, provider, user_id, media_type, entries, key_field, last_updated_at, replace=False):
+        """
+        Upserts `entries` (keyed by `entry[key_field]`); with `replace` the
+        previous snapshot for this key is dropped first and the snapshot
+        counts as freshly fully refreshed.
+        """
+        key = (provider, str(user_id), media_type.lower())
+        rows = [key + (str(e[key_field]), str(e.get('updatedAt') or ''), json.dumps(e, default=_json_default)) for e in entries]
+        with self._lock, self._connect() as conn:
+            if replace:
+                conn.execute("DELETE FROM snapshot_entries WHERE provider=? AND user_id=? AND media_type=?", key)
+            conn.executemany("INSERT OR REPLACE INTO snapshot_entries VALUES (?, ?, ?, ?, ?, ?)", rows)
+            last_updated_at = None if last_updated_at is None else str(last_updated_at)
+            if replace:
+                conn.execute("INSERT OR REPLACE INTO snapshot_meta VALUES (?, ?, ?, ?, ?)", key + (last_updated_at, time.time()))
+            else:
+                conn.execute("UPDATE snapshot_meta SET last_updated_at=? WHERE provider=? AND user_id=? AND media_type=?", (last_updated_at,) + key)
+
+def _json_default(value):
+    if isinstance(value, set):
+        return sorted(value)
+    raise TypeError(f"Cannot serialise {type(value).__name__}")
+
+def _needs_full_refresh(meta):
+    return (not meta or meta['last_updated_at'] is None
+            or time.time() - (meta['full_refreshed_at'] or 0) > FULL_REFRESH_AFTER_SECONDS)
+
+def iter_anilist_library(store, user_id, token, media_type, yield_progress_callback=None, page_callback=None):
+    """
+    Brings the AniList snapshot up to date, yielding the library in batches
+    of entries as they become available: page by page during a full
+    refresh, or as one merged batch after an incremental one. An
+    incremental refresh that fails part-way falls back to a full one.
+    Nothing is yielded if AniList could not be reached. `page_callback` is
+    passed on to the page fetcher, so it only counts pages downloaded this
+    time.
+    """
+    meta = store.load_meta('anilist', user_id, media_type)
+    library_info = {}
+
+    if not _needs_full_refresh(meta):
+        since = int(meta['last_updated_at'])
+        changed = fetch_anilist_library_entries(user_id, token, media_type, yield_progress_callback, updated_after=since, library_info=library_info, page_callback=page_callback)
+        if changed is not None and library_info.get('complete'):
+            if yield_progress_callback:
+                yield_progress_callback(f"AniList snapshot: {len(changed)} recent entries re-checked.")
+            if changed:
+                store.save('anilist', user_id, media_type, changed, 'mediaId', max(_max_updated_at(changed, since), since))
+
+            merged = {e['mediaId']: e for e in store.load_entries('anilist', user_id, media_type)}
+            for entry in changed:
+                merged[entry['mediaId']] = entry
+            yield list(merged.values())
+            return
+
+        if yield_progress_callback:
+            yield_progress_callback("AniList changes could not be fetched; doing a full refresh.")
+        library_info = {}
+
+    started = time.time()
+    entries = []
+    for page in iter_anilist_library_pages(user_id, token, media_type, yield_progress_callback, library_info=library_info, page_callback=page_callback):
+        entries.extend(page)
+        yield page
+    if library_info.get('complete'):
+        store.save('anilist', user_id, media_type, entries, 'mediaId', _max_updated_at(entries, int(started)), replace=True)
+
+def iter_kitsu_library(store, user_id, token, media_type, yield_progress_callback=None, page_callback=None):
+    """
+    Brings the Kitsu snapshot up to date, yielding the library in batches of
+    entries as they become available (see `iter_anilist_library`). Nothing
+    is yielded if Kitsu could not be reached.
+    """
+    meta = store.load_meta('kitsu', user_id, media_type)
+    library_info = {}
+
+    if not _needs_full_refresh(meta):
+        since = meta['last_updated_at']
+        changed = fetch_kitsu_library(user_id, token, media_type, yield_progress_callback, updated_after=since, library_info=library_info, page_callback=page_callback)
+        if changed is None:
+            return
+
+        merged = {}
+        for entry in store.load_entries('kitsu', user_id, media_type):
+            entry['titles'] = set(entry.get('titles') or [])
+            merged[entry['libraryEntryId']] = entry
+        for entry in changed:
+            merged[entry['libraryEntryId']] = entry
+
+        # Kitsu reports the live library size; a mismatch means entries were
+        # added or removed in a way the change walk did not see.
+        if library_info.get('complete') and library_info.get('count') == len(merged):
+            if yield_progress_callback:
+                yield_progress_callback(f"Kitsu snapshot: {len(changed)} recent entries re-checked.")
+            if changed:
+                store.save('kitsu', user_id, media_type, changed, 'libraryEntryId', max(_max_updated_at(changed, since), since))
+            yield sorted(merged.values(), key=kitsu_library_order)
+            return
+
+        if yield_progress_callback:
+            yield_progress_callback("Kitsu snapshot is out of step with the live library; doing a full refresh.")
+        library_info = {}
+
+    started = time.time()
+    entries = []
+    for page in iter_kitsu_library_pages(user_id, token, media_type, yield_progress_callback, library_info=library_info, page_callback=page_callback):
+        entries.extend(page)
+        yield page
+    if library_info.get('complete'):
+        store.save('kitsu', user_id, media_type, entries, 'libraryEntryId',
+                   _max_updated_at(entries, time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime(started))), replace=True)
+
+def _max_updated_at(entries, default):
+    # `default` is used when no entry carries an `updatedAt` (an empty
+    # library, or one sent without them). After a full refresh that is the
+    # time the fetch started, not 0, so the next incremental walk still
+    # stops early instead of re-reading the whole list.
+    updated = [e['updatedAt'] for e in entries if e.get('updatedAt') is not None]
+    return max(updated) if updated else default
@@ -0,0 +1,125 @@
+def ids_compatible(kitsu_entry, anilist_entry):
+    """
+    False when Kitsu's own mappings say the two entries are different media,
+    so a title-based pairing must not join them.
+    """
+    if kitsu_entry.get('anilistId') and kitsu_entry['anilistId'] != anilist_entry['mediaId']:
+        return False
+    if kitsu_entry.get('malId') and anilist_entry.get('idMal') and kitsu_entry['malId'] != anilist_entry['idMal']:
+        return False
+    return True
+
+class IncrementalMatcher:
+    """
+    Pairs Kitsu and AniList entries while both libraries are still arriving
+    in batches. A Kitsu entry whose AniList ID mapping names a loaded AniList
+    entry is paired as soon as both are in; that mapping is exact, so later
+    pages can never change the outcome.
+
+    MAL ID and title pairs are held back until `finish()`, once both
+    libraries are complete: an entry not yet downloaded could still claim
+    either side through an AniList ID, and pairing early would make the
+    result depend on which pages happened to arrive first.
+
+    Kitsu entries are identified by arrival index, AniList entries by media
+    ID. `add_kitsu`, `add_anilist` and `finish` return the pairs they made
+    as (kitsu index, AniList media ID, matched by ID) tuples.
+
+    `normalize_titles` maps an iterable of raw titles to a raw -> normalized
+    dict (see `normalize_titles_for_match`); each batch is normalized in one
+    call, so a whole-library snapshot batch can use the process pool.
+    """
+
+    def __init__(self, normalize_titles):
+        self.normalize_titles = normalize_titles
+        self.kitsu_entries = []
+        self.kitsu_norm_titles = []
+        self.anilist_entries = {}
+        self.anilist_norm_titles = {}
+        self.matched_kitsu = set()
+        self.matched_anilist = set()
+        self.id_match_count = 0
+        self._kitsu_by_anilist_id = {}
+        self._anilist_title_index = {}
+        self._anilist_by_mal_id = {}
+
+    def _batch_norms(self, entries):
+        normalized = self.normalize_titles(t for entry in entries for t in entry.get('titles', []))
+        return [self._norms(entry.get('titles', []), normalized) for entry in entries]
+
+    @staticmethod
+    def _norms(titles, normalized):
+        norms = []
+        for title in titles:
+            norm = normalized.get(title)
+            if norm and norm not in norms:
+                norms.append(norm)
+        return norms
+
+    def _pair(self, kitsu_index, media_id, by_id):
+        self.matched_kitsu.add(kitsu_index)
+        self.matched_anilist.add(media_id)
+        self.id_match_count += by_id
+        return (kitsu_index, media_id, by_id)
+
+    def add_kitsu(self, entries):
+        pairs = []
+        for entry, norms in zip(entries, self._batch_norms(entries)):
+            i = len(self.kitsu_entries)
+            self.kitsu_entries.append(entry)
+            self.kitsu_norm_titles.append(norms)
+            anilist_id = entry.get('anilistId')
+            if not anilist_id:
+                continue
+            self._kitsu_by_anilist_id.setdefault(anilist_id, []).append(i)
+            if anilist_id in self.anilist_entries and anilist_id not in self.matched_anilist:
+                pairs.append(self._pair(i, anilist_id, True))
+        return pairs
+
+    def add_anilist(self, entries):
+        pairs = []
+        for entry, norms in zip(entries, self._batch_norms(entries)):
+            media_id = entry['mediaId']
+            if media_id in self.anilist_entries:
+                continue
+            self.anilist_entries[media_id] = entry
+            self.anilist_norm_titles[media_id] = norms
+            for norm in norms:
+                self._anilist_title_index.setdefault(norm, []).append(media_id)
+            if entry.get('idMal'):
+                self._anilist_by_mal_id.setdefault(entry['idMal'], media_id)
+
+            for i in self._kitsu_by_anilist_id.get(media_id, ()):
+                if i not in self.matched_kitsu:
+                    pairs.append(self._pair(i, media_id, True))
+                    break
+        return pairs
+
+    def finish(self):
+        """
+        Makes the MAL ID pairs, then the shared-title pairs (never against
+        an ID mapping), walking unmatched Kitsu entries in library order.
+        Call once, after both libraries have been added in full.
+        """
+        pairs = []
+        for i, entry in enumerate(self.kitsu_entries):
+            if i in self.matched_kitsu:
+                continue
+            media_id = self._anilist_by_mal_id.get(entry.get('malId'))
+            if media_id is not None and media_id not in self.matched_anilist and ids_compatible(entry, self.anilist_entries[media_id]):
+                pairs.append(self._pair(i, media_id, True))
+
+        for i, entry in enumerate(self.kitsu_entries):
+            if i in self.matched_kitsu:
+                continue
+            pair = self._match_title(i, entry)
+            if pair:
+                pairs.append(pair)
+        return pairs
+
+    def _match_title(self, i, entry):
+        for norm in self.kitsu_norm_titles[i]:
+            for media_id in self._anilist_title_index.get(norm, ()):
+                if media_id not in self.matched_anilist and ids_compatible(entry, self.anilist_entries[media_id]):
+                    return self._pair(i, media_id, False)
+        return None
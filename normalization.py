@@ -0,0 +1,67 @@
+import os
+import re
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+_MATCH_PUNCTUATION = re.compile(r'[~:;,\-–—\.…·!?"\'\(\)\[\]\{\}\/\\&]')
+_SEARCH_PUNCTUATION = re.compile(r'[~:;,\-–—\.…·!?"\'\(\)\[\]\{\}\/\\]')
+_NON_ALPHANUMERIC = re.compile(r'[^0-9A-Za-z\s]')
+_WHITESPACE = re.compile(r'\s+')
+
+MEMO_SIZE = 65536
+
+# Below this many distinct titles a process pool costs more than it saves.
+PROCESS_POOL_MIN_TITLES = 50000
+PROCESS_POOL_CHUNK_SIZE = 5000
+
+@lru_cache(maxsize=MEMO_SIZE)
+def normalize_title_for_match(s):
+    if not s:
+        return None
+    cleaned = _MATCH_PUNCTUATION.sub(' ', s)
+    cleaned = _WHITESPACE.sub(' ', cleaned).strip().lower()
+    return cleaned or None
+
+@lru_cache(maxsize=MEMO_SIZE)
+def sanitize_search_query(s):
+    if not s:
+        return None
+    q = _SEARCH_PUNCTUATION.sub(' ', s)
+    q = _WHITESPACE.sub(' ', q).strip()
+    return q or None
+
+@lru_cache(maxsize=MEMO_SIZE)
+def normalize_for_dedupe(s):
+    if not s:
+        return None
+    nk = unicodedata.normalize('NFKD', s)
+    ascii_only = nk.encode('ascii', 'ignore').decode('ascii')
+    cleaned = _NON_ALPHANUMERIC.sub(' ', ascii_only)
+    cleaned = _WHITESPACE.sub(' ', cleaned).strip().lower()
+    return cleaned or None
+
+def _normalize_chunk(titles):
+    return [normalize_title_for_match(t) for t in titles]
+
+def normalize_titles_for_match(titles, processes=None):
+    """
+    Normalizes a whole library's titles in one pass and returns a
+    raw title -> normalized title map (None for titles that normalize away).
+
+    Very large title sets are split across a process pool; `processes=0`
+    forces in-process work, None picks a pool size from the CPU count.
+    """
+    unique_titles = list(dict.fromkeys(t for t in titles if t))
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if processes <= 1 or len(unique_titles) < PROCESS_POOL_MIN_TITLES:
+        return dict(zip(unique_titles, _normalize_chunk(unique_titles)))
+
+    chunks = [unique_titles[i:i + PROCESS_POOL_CHUNK_SIZE] for i in range(0, len(unique_titles), PROCESS_POOL_CHUNK_SIZE)]
+    normalized = {}
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        for chunk, results in zip(chunks, pool.map(_normalize_chunk, chunks)):
+            normalized.update(zip(chunk, results))
+    return normalized
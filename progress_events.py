@@ -0,0 +1,78 @@
+import queue
+import threading
+import time
+
+class EventChannel:
+    """
+    Thread-safe channel from worker threads to the SSE generator. Workers
+    `put` (event type, payload) pairs; the generator reads them back in
+    order with `drain`.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+
+    def put(self, event_type, payload):
+        self._queue.put((event_type, payload))
+
+    def log(self, message):
+        self.put('log', message)
+
+    def drain(self, futures, poll_interval=0.1):
+        """
+        Yields events as they arrive until every future has finished and
+        the channel is empty.
+        """
+        while True:
+            try:
+                yield self._queue.get(timeout=poll_interval)
+            except queue.Empty:
+                if all(f.done() for f in futures):
+                    break
+        while not self._queue.empty():
+            yield self._queue.get_nowait()
+
+class FetchProgress:
+    """
+    Running counters for one provider's library fetch: pages, entries,
+    throughput, requests sent through its transport and what is left of
+    its rate-limit budget. `page_done` matches the page fetchers'
+    `page_callback` signature and may be called from any thread.
+    """
+
+    def __init__(self, provider, transport):
+        self.provider = provider
+        self.transport = transport
+        self.pages_done = 0
+        self.pages_total = None
+        self.entries = 0
+        self._started_at = time.monotonic()
+        self._requests_at_start = self._request_count()
+        self._lock = threading.Lock()
+
+    def _request_count(self):
+        return sum(s['requests'] for s in self.transport.stats().values())
+
+    def page_done(self, pages_done, pages_total, entry_count):
+        with self._lock:
+            self.pages_done = pages_done
+            self.pages_total = pages_total
+            self.entries += entry_count
+        return self.snapshot()
+
+    def snapshot(self):
+        limiter = self.transport.limiter
+        with self._lock:
+            elapsed = max(time.monotonic() - self._started_at, 1e-6)
+            return {
+                'provider': self.provider,
+                'pages_done': self.pages_done,
+                'pages_total': self.pages_total,
+                'entries': self.entries,
+                'entries_per_sec': round(self.entries / elapsed, 1),
+                'elapsed': round(elapsed, 1),
+                'requests': self._request_count() - self._requests_at_start,
+                'rate_limit_remaining': limiter.remaining,
+                'rate_per_minute': round(limiter.rate * 60),
+                'throttled': limiter.throttled_count,
+            }
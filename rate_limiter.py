@@ -0,0 +1,127 @@
+import contextvars
+import threading
+import time
+from collections import deque
+
+# Who a request is made on behalf of (e.g. an account name). Waiting
+# requests are served round-robin across shares, so one busy account cannot
+# starve the others of a shared budget.
+budget_share = contextvars.ContextVar('budget_share', default=None)
+
+def submit_in_context(executor, fn, *args, **kwargs):
+    """`executor.submit` that runs `fn` in a copy of the caller's context, so `budget_share` follows the work."""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by every call to one provider.
+
+    The refill rate adapts while running: it creeps back up towards
+    `max_rate` on success, follows the provider's rate-limit headers when
+    they are present, and is halved (with a pause) whenever a 429 arrives.
+    Tokens go to waiting callers in turn: round-robin across
+    `budget_share` values, first come first served within one.
+    """
+
+    def __init__(self, name, rate, burst, min_rate, max_rate, window=60, default_retry_after=5):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.window = window
+        self.default_retry_after = default_retry_after
+        self.remaining = None
+        self.throttled_count = 0
+
+        self._tokens = burst
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._waiting = {}
+        self._turns = deque()
+
+    def _refill(self, now):
+        elapsed = now - self._updated_at
+        self._updated_at = now
+        self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+
+    def acquire(self):
+        share = budget_share.get()
+        ticket = object()
+        with self._cond:
+            waiting = self._waiting.get(share)
+            if waiting is None:
+                waiting = self._waiting[share] = deque()
+                self._turns.append(share)
+            waiting.append(ticket)
+
+            while True:
+                if self._turns[0] != share or waiting[0] is not ticket:
+                    self._cond.wait()
+                    continue
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    waiting.popleft()
+                    self._turns.popleft()
+                    if waiting:
+                        self._turns.append(share)
+                    else:
+                        del self._waiting[share]
+                    self._cond.notify_all()
+                    return
+                else:
+                    wait = (1 - self._tokens) / self.rate
+                self._cond.wait(wait)
+
+    def observe(self, response):
+        headers = response.headers
+        limit = _int_header(headers, 'X-RateLimit-Limit')
+        remaining = _int_header(headers, 'X-RateLimit-Remaining')
+
+        with self._lock:
+            if remaining is not None:
+                self.remaining = remaining
+            if limit:
+                self.max_rate = limit / self.window
+
+            if response.status_code == 429:
+                self.throttled_count += 1
+                self._paused_until = time.monotonic() + _retry_after_seconds(headers, self.default_retry_after)
+                self._tokens = 0
+                self.rate = max(self.min_rate, self.rate / 2)
+                return
+
+            if limit and remaining is not None and remaining < limit * 0.1:
+                # Nearly out of budget: spread what is left over the window.
+                self.rate = max(self.min_rate, min(self.rate, remaining / self.window))
+            else:
+                self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+def _int_header(headers, name):
+    value = headers.get(name)
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def _retry_after_seconds(headers, default):
+    retry_after = _int_header(headers, 'Retry-After')
+    if retry_after is not None:
+        return max(0, retry_after)
+    reset_at = _int_header(headers, 'X-RateLimit-Reset')
+    if reset_at is not None:
+        return max(0, reset_at - time.time())
+    return default
+
+# AniList allows 90 requests per minute and reports its budget in headers.
+anilist_limiter = TokenBucket('anilist', rate=1.5, burst=5, min_rate=0.25, max_rate=1.5, window=60, default_retry_after=60)
+
+# Kitsu publishes no limit and sends no budget headers; start modestly and
+# let 429 responses push the rate down.
+kitsu_limiter = TokenBucket('kitsu', rate=4, burst=8, min_rate=0.5, max_rate=8, window=1, default_retry_after=5)
@@ -0,0 +1,165 @@
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from report_view import REPORT_CATEGORIES
+
+# Runs kept per account and media type; older ones are deleted on save.
+REPORT_HISTORY_LIMIT = 100
+# Decoded reports kept in memory so paging through one does not re-read it.
+LOADED_REPORT_CACHE_SIZE = 4
+
+DIFF_FIELDS = ('category', 'k_status', 'k_progress', 'a_status', 'a_progress')
+
+def report_item_key(item):
+    """
+    Identifies an item across runs: its AniList page when it has one,
+    otherwise its Kitsu page, otherwise its title.
+    """
+    return item.get('a_url') or item.get('k_url') or f"title:{item.get('k_title') or item.get('a_title')}"
+
+class ReportStore:
+    """
+    On-disk (SQLite) history of audit reports, keyed by AniList account,
+    Kitsu account, media type and time. Each run is stored twice: the full
+    report as compressed JSON for the report page, and one small row per
+    item (category, status and progress of both sides) so runs can be
+    diffed without decoding whole reports.
+    """
+
+    def __init__(self, path, history_limit=REPORT_HISTORY_LIMIT):
+        self.path = path
+        self.history_limit = history_limit
+        self._lock = threading.Lock()
+        self._loaded = OrderedDict()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS reports (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    anilist_user TEXT, kitsu_user TEXT, media_type TEXT,
+                    created_at REAL, summary TEXT, data BLOB
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS reports_account ON reports (anilist_user, kitsu_user, media_type, created_at)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS report_items (
+                    report_id INTEGER, item_key TEXT, title TEXT, category TEXT,
+                    k_status TEXT, k_progress INTEGER, a_status TEXT, a_progress INTEGER,
+                    PRIMARY KEY (report_id, item_key)
+                )""")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def save(self, anilist_user, kitsu_user, media_type, report, summary=None):
+        """Stores one audit's report and returns its run ID."""
+        media_type = media_type.lower()
+        data = zlib.compress(json.dumps(report).encode('utf-8'))
+        items = {}
+        for category, _ in REPORT_CATEGORIES:
+            for item in report.get(category) or []:
+                # Later categories never repeat an item; first one wins if they do.
+                items.setdefault(report_item_key(item), (
+                    item.get('k_title') or item.get('a_title'), category,
+                    item.get('k_status'), item.get('k_progress'), item.get('a_status'), item.get('a_progress')))
+
+        with self._lock, self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO reports (anilist_user, kitsu_user, media_type, created_at, summary, data) VALUES (?, ?, ?, ?, ?, ?)",
+                (anilist_user, kitsu_user, media_type, time.time(), json.dumps(summary or {}), data))
+            report_id = cursor.lastrowid
+            conn.executemany("INSERT INTO report_items VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                             [(report_id, key) + values for key, values in items.items()])
+
+            stale = [row[0] for row in conn.execute(
+                "SELECT id FROM reports WHERE anilist_user=? AND kitsu_user=? AND media_type=? ORDER BY created_at DESC, id DESC LIMIT -1 OFFSET ?",
+                (anilist_user, kitsu_user, media_type, self.history_limit))]
+            if stale:
+                marks = ','.join('?' * len(stale))
+                conn.execute(f"DELETE FROM report_items WHERE report_id IN ({marks})", stale)
+                conn.execute(f"DELETE FROM reports WHERE id IN ({marks})", stale)
+        return report_id
+
+    def runs(self, anilist_user, kitsu_user, media_type=None, limit=None):
+        """Stored runs for an account, newest first, without their reports."""
+        query = "SELECT id, media_type, created_at, summary FROM reports WHERE anilist_user=? AND kitsu_user=?"
+        params = [anilist_user, kitsu_user]
+        if media_type:
+            query += " AND media_type=?"
+            params.append(media_type.lower())
+        query += " ORDER BY created_at DESC, id DESC"
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self._connect() as conn:
+            rows = conn.execute(query, params).fetchall()
+        return [{'id': row[0], 'media_type': row[1], 'created_at': row[2], 'summary': json.loads(row[3])} for row in rows]
+
+    def run_before(self, anilist_user, kitsu_user, media_type, timestamp):
+        """The newest run created at or before `timestamp`, or None."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id, media_type, created_at, summary FROM reports WHERE anilist_user=? AND kitsu_user=? AND media_type=? AND created_at<=? "
+                "ORDER BY created_at DESC, id DESC LIMIT 1",
+                (anilist_user, kitsu_user, media_type.lower(), timestamp)).fetchone()
+        if not row:
+            return None
+        return {'id': row[0], 'media_type': row[1], 'created_at': row[2], 'summary': json.loads(row[3])}
+
+    def load(self, report_id):
+        """The full report of one run, or None."""
+        with self._lock:
+            if report_id in self._loaded:
+                self._loaded.move_to_end(report_id)
+                return self._loaded[report_id]
+        with self._connect() as conn:
+            row = conn.execute("SELECT data FROM reports WHERE id=?", (report_id,)).fetchone()
+        if not row:
+            return None
+        report = json.loads(zlib.decompress(row[0]).decode('utf-8'))
+        with self._lock:
+            self._loaded[report_id] = report
+            while len(self._loaded) > LOADED_REPORT_CACHE_SIZE:
+                self._loaded.popitem(last=False)
+        return report
+
+    def latest(self, anilist_user, kitsu_user, media_type=None):
+        """The newest report for an account (of any media type if none is given), or None."""
+        runs = self.runs(anilist_user, kitsu_user, media_type, limit=1)
+        return self.load(runs[0]['id']) if runs else None
+
+    def diff(self, old_id, new_id):
+        """
+        Items whose category, status or progress differ between two runs,
+        including items only present in one of them.
+        """
+        columns = 'item_key, title, ' + ', '.join(DIFF_FIELDS)
+        with self._connect() as conn:
+            old = {row[0]: row[1:] for row in conn.execute(f"SELECT {columns} FROM report_items WHERE report_id=?", (old_id,))}
+            new = {row[0]: row[1:] for row in conn.execute(f"SELECT {columns} FROM report_items WHERE report_id=?", (new_id,))}
+
+        def state(row):
+            return dict(zip(DIFF_FIELDS, row[1:])) if row else None
+
+        changes = []
+        for key in list(new) + [k for k in old if k not in new]:
+            before, after = old.get(key), new.get(key)
+            if before and after and before[1:] == after[1:]:
+                continue
+            changes.append({
+                'key': key,
+                'title': (after or before)[0],
+                'change': 'changed' if before and after else ('added' if after else 'removed'),
+                'before': state(before),
+                'after': state(after),
+            })
+        return changes
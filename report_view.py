@@ -0,0 +1,83 @@
+REPORT_PAGE_LIMIT = 50
+REPORT_MAX_LIMIT = 500
+
+# Report categories in page order, with their section headings. The "ok"
+# category is served by the API but not shown on the report page.
+REPORT_CATEGORIES = [
+    ('kitsu_higher', 'Kitsu Progress is Higher'),
+    ('anilist_higher', 'AniList Progress is Higher'),
+    ('mismatch_status', 'Status Mismatch'),
+    ('found_on_anilist', 'Found on AniList DB (Not in your AniList Library)'),
+    ('found_on_kitsu', 'Found on Kitsu DB (Not in your Kitsu Library)'),
+    ('not_found_on_anilist', 'Not Found on AniList'),
+    ('not_found_on_kitsu', 'Not Found on Kitsu'),
+    ('ok', 'In Sync'),
+]
+HIDDEN_CATEGORIES = {'ok'}
+
+# Which sync each category offers per target: (syncType, side whose
+# status/progress is copied over).
+REPORT_SYNC_ACTIONS = {
+    'kitsu_higher': {'anilist': ('full', 'k'), 'kitsu': ('full', 'a')},
+    'anilist_higher': {'anilist': ('full', 'k'), 'kitsu': ('full', 'a')},
+    'mismatch_status': {'anilist': ('status', 'k'), 'kitsu': ('status', 'a')},
+    'found_on_anilist': {'anilist': ('add', 'k')},
+    'found_on_kitsu': {'kitsu': ('add', 'a')},
+}
+
+def sync_payload(category, item, target):
+    """
+    The `/sync` request that applies `item`'s difference to `target`, or
+    None when the category offers no sync in that direction.
+    """
+    action = REPORT_SYNC_ACTIONS.get(category, {}).get(target)
+    if not action:
+        return None
+    sync_type, source = action
+
+    payload = {'target': target, 'syncType': sync_type, 'status': item.get(f'{source}_status')}
+    if sync_type != 'status':
+        payload['progress'] = item.get(f'{source}_progress')
+    if target == 'anilist':
+        payload['aMediaId'] = item.get('a_media_id')
+    elif sync_type == 'add':
+        payload['kMediaId'] = item.get('k_media_id')
+        payload['mediaType'] = item.get('media_type')
+    else:
+        payload['kEntryId'] = item.get('k_library_id')
+    return payload
+
+def _matches(item, q, status):
+    if q:
+        titles = ' '.join(t for t in (item.get('k_title'), item.get('a_title')) if t).lower()
+        if q not in titles:
+            return False
+    if status and status not in (item.get('k_status'), item.get('a_status')):
+        return False
+    return True
+
+def filter_report_items(report, category, q=None, status=None):
+    """
+    Returns (index, item) pairs of one category that pass the filters; the
+    index is the item's position in the unfiltered category.
+    """
+    q = (q or '').strip().lower()
+    status = (status or '').strip().upper()
+    return [(i, item) for i, item in enumerate(report.get(category) or []) if _matches(item, q, status)]
+
+def report_page(report, category, offset=0, limit=REPORT_PAGE_LIMIT, q=None, status=None):
+    """
+    One page of a report category for the JSON API. Each item carries its
+    category index and the `/sync` payloads its buttons send.
+    """
+    matching = filter_report_items(report, category, q, status)
+    items = []
+    for index, item in matching[offset:offset + limit]:
+        row = dict(item)
+        row['index'] = index
+        row['sync'] = {target: sync_payload(category, item, target) for target in REPORT_SYNC_ACTIONS.get(category, {})}
+        items.append(row)
+    return {'category': category, 'total': len(matching), 'offset': offset, 'limit': limit, 'items': items}
+
+def report_counts(report, q=None, status=None):
+    return {category: len(filter_report_items(report, category, q, status)) for category, _ in REPORT_CATEGORIES}
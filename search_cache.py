@@ -0,0 +1,135 @@
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+class SearchCache:
+    """
+    Disk-backed (SQLite) cache of title searches, keyed by provider, media
+    type and sanitized query. Both hits and "no match" answers are stored,
+    each with its own TTL, and the least recently used rows are evicted once
+    the cache grows past `max_entries`.
+    """
+
+    def __init__(self, path, hit_ttl=7 * 24 * 3600, miss_ttl=24 * 3600, max_entries=20000):
+        self.path = path
+        self.hit_ttl = hit_ttl
+        self.miss_ttl = miss_ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS search_cache (
+                    provider TEXT, media_type TEXT, query TEXT,
+                    result TEXT, stored_at REAL, last_used_at REAL,
+                    PRIMARY KEY (provider, media_type, query)
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS search_cache_last_used ON search_cache (last_used_at)")
+            # Kept up to date by `get` and `put` so inserts need not count the
+            # table; it is only recounted when it says the cache is full.
+            self._row_count = conn.execute("SELECT COUNT(*) FROM search_cache").fetchone()[0]
+
+    @contextmanager
+    def _connect(self):
+        # Commits on success and always closes, unlike a bare connection.
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _key(provider, media_type, query):
+        return (provider, media_type.lower(), query.lower())
+
+    def get(self, provider, media_type, query):
+        """
+        Returns (found, result). `found` is False when nothing fresh is
+        cached; a cached miss comes back as (True, None).
+        """
+        key = self._key(provider, media_type, query)
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT result, stored_at FROM search_cache WHERE provider=? AND media_type=? AND query=?", key).fetchone()
+            if not row:
+                return False, None
+            result, stored_at = row
+            ttl = self.miss_ttl if result is None else self.hit_ttl
+            if now - stored_at > ttl:
+                conn.execute("DELETE FROM search_cache WHERE provider=? AND media_type=? AND query=?", key)
+                self._row_count -= 1
+                return False, None
+            conn.execute("UPDATE search_cache SET last_used_at=? WHERE provider=? AND media_type=? AND query=?", (now,) + key)
+        return True, (json.loads(result) if result is not None else None)
+
+    def put(self, provider, media_type, query, result):
+        key = self._key(provider, media_type, query)
+        now = time.time()
+        payload = json.dumps(result) if result is not None else None
+        with self._lock, self._connect() as conn:
+            exists = conn.execute(
+                "SELECT 1 FROM search_cache WHERE provider=? AND media_type=? AND query=?", key).fetchone()
+            conn.execute("INSERT OR REPLACE INTO search_cache VALUES (?, ?, ?, ?, ?, ?)", key + (payload, now, now))
+            if not exists:
+                self._row_count += 1
+            if self._row_count > self.max_entries:
+                # Another process may share the file, so trust only a fresh count.
+                count = conn.execute("SELECT COUNT(*) FROM search_cache").fetchone()[0]
+                if count > self.max_entries:
+                    conn.execute(
+                        "DELETE FROM search_cache WHERE rowid IN (SELECT rowid FROM search_cache ORDER BY last_used_at LIMIT ?)",
+                        (count - self.max_entries,))
+                self._row_count = min(count, self.max_entries)
+
+    def search(self, provider, media_type, query, search_fn, stats=None):
+        """
+        Answers `query` from the cache, or calls `search_fn(query)` and caches
+        whatever it returns. `stats`, if given, counts hits and misses; it
+        may be shared by several threads.
+        """
+        found, result = self.get(provider, media_type, query)
+        if found:
+            if stats is not None:
+                with self._lock:
+                    stats['hits'] = stats.get('hits', 0) + 1
+                    if result is None:
+                        stats['negative_hits'] = stats.get('negative_hits', 0) + 1
+            return result
+
+        if stats is not None:
+            with self._lock:
+                stats['misses'] = stats.get('misses', 0) + 1
+        result = search_fn(query)
+        self.put(provider, media_type, query, result)
+        return result
+
+    def search_many(self, provider, media_type, queries, batch_search_fn, stats=None):
+        """
+        Batch form of `search`: cached queries are answered locally and the
+        rest go to `batch_search_fn(queries)` in one call. That function
+        returns a map of query -> result; queries it leaves out (failed
+        requests) are not cached and are missing from the returned map.
+        """
+        results = {}
+        uncached = []
+        for query in dict.fromkeys(queries):
+            found, result = self.get(provider, media_type, query)
+            if found:
+                results[query] = result
+            else:
+                uncached.append(query)
+
+        if stats is not None:
+            with self._lock:
+                stats['hits'] = stats.get('hits', 0) + len(results)
+                stats['negative_hits'] = stats.get('negative_hits', 0) + sum(1 for r in results.values() if r is None)
+                stats['misses'] = stats.get('misses', 0) + len(uncached)
+
+        if uncached:
+            for query, result in batch_search_fn(uncached).items():
+                self.put(provider, media_type, query, result)
+                results[query] = result
+        return results
@@ -1,43 +1,423 @@
 document.addEventListener('DOMContentLoaded', () => {
-    const allSyncButtons = document.querySelectorAll('.sync-btn');
+    // Must match the .item height (500px) plus the 20px gap in report.html.
+    const ROW_HEIGHT = 520;
+    const CHUNK_SIZE = 50;
+    const OVERSCAN_ROWS = 3;
+    // Chunks further than this from the visible ones are dropped again.
+    const KEEP_CHUNKS = 4;
 
-    allSyncButtons.forEach(button => {
-        button.addEventListener('click', handleSyncClick);
+    const PROVIDER_NAMES = { anilist: 'AniList', kitsu: 'Kitsu' };
+    const filters = { q: '', status: '' };
+    // `${category}:${index}` -> { synced, error }; survives rows leaving the DOM.
+    const rowStates = new Map();
+
+    const sections = Array.from(document.querySelectorAll('.report-section')).map(el => ({
+        el,
+        category: el.dataset.category,
+        total: parseInt(el.dataset.total, 10) || 0,
+        itemsEl: el.querySelector('.report-items'),
+        chunks: new Map(),
+        loading: new Set(),
+        rows: new Map(),
+        generation: 0
+    }));
+
+    function escapeHtml(value) {
+        return String(value ?? '').replace(/[&<>"']/g, c => ({
+            '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'
+        })[c]);
+    }
+
+    function queryString(params) {
+        return Object.entries(params)
+            .filter(([, v]) => v !== '' && v !== undefined && v !== null)
+            .map(([k, v]) => `${encodeURIComponent(k)}=${encodeURIComponent(v)}`)
+            .join('&');
+    }
+
+    function coverHtml(url, alt, placeholder) {
+        if (url) {
+            const src = `/thumbnail?url=${encodeURIComponent(url)}`;
+            return `<img src="${escapeHtml(src)}" alt="${alt}" class="cover-image" width="150" height="210" loading="lazy" decoding="async">`;
+        }
+        return `<div class="cover-image-placeholder">${placeholder}</div>`;
+    }
+
+    function syncButtonHtml(target, payload) {
+        if (!payload) {
+            return '';
+        }
+        const isAdd = payload.syncType === 'add';
+        const label = `${isAdd ? 'Add to' : 'Sync this to'} ${PROVIDER_NAMES[target]}`;
+        return `<button class="sync-btn${isAdd ? ' add-btn' : ''}" data-target="${target}">${label}</button>`;
+    }
+
+    function detailsHtml(category, side, item) {
+        const status = item[`${side}_status`];
+        const progress = item[`${side}_progress`];
+        let statusClass = '';
+        let progressClass = '';
+        if (category === 'kitsu_higher' && side === 'k' || category === 'anilist_higher' && side === 'a') {
+            statusClass = progressClass = 'status-higher';
+        } else if (category === 'mismatch_status') {
+            statusClass = 'status-mismatch';
+        } else if (category !== 'kitsu_higher' && category !== 'anilist_higher') {
+            statusClass = progressClass = 'status-ok';
+        }
+        return `<div class="details ${statusClass}">Status: ${escapeHtml(status)}</div>
+                <div class="details ${progressClass}">Progress: ${escapeHtml(progress)}</div>`;
+    }
+
+    function kitsuSideHtml(category, item) {
+        if (category === 'not_found_on_kitsu') {
+            return `<div class="entry">
+                <div class="entry-header"><h3>(Not Found)</h3><h4>(Kitsu)</h4></div>
+                <div class="cover-image-placeholder">No match found on Kitsu database.</div>
+                <div class="details-extra">This may need to be added to Kitsu manually.</div>
+            </div>`;
+        }
+        const isMatch = category === 'found_on_kitsu';
+        // "Add" buttons sit on the side being added to, "sync" buttons on the side copied from.
+        const button = isMatch ? syncButtonHtml('kitsu', item.sync.kitsu) : syncButtonHtml('anilist', item.sync.anilist);
+        return `<div class="entry">
+            <div class="entry-header">
+                <h3 title="${escapeHtml(item.k_title)}">${escapeHtml(item.k_title)}</h3>
+                <h4>${isMatch ? '(Kitsu Match)' : '(Kitsu)'}</h4>
+                <a href="${escapeHtml(item.k_url)}" target="_blank" class="media-link">View on Kitsu</a>
+            </div>
+            ${coverHtml(item.k_image, 'Kitsu Cover', 'No Kitsu Image')}
+            ${isMatch
+                ? `<div class="details-extra">This ${escapeHtml(REPORT_MEDIA_TYPE)} was found in the Kitsu database.</div>`
+                : detailsHtml(category, 'k', item)}
+            ${button}
+        </div>`;
+    }
+
+    function anilistSideHtml(category, item) {
+        if (category === 'not_found_on_anilist') {
+            return `<div class="entry">
+                <div class="entry-header"><h3>(Not Found)</h3><h4>(AniList)</h4></div>
+                <div class="cover-image-placeholder">No match found on AniList database.</div>
+                <div class="details-extra">This may need to be added to AniList manually.</div>
+            </div>`;
+        }
+        const isMatch = category === 'found_on_anilist';
+        const button = isMatch ? syncButtonHtml('anilist', item.sync.anilist) : syncButtonHtml('kitsu', item.sync.kitsu);
+        return `<div class="entry">
+            <div class="entry-header">
+                <h3 title="${escapeHtml(item.a_title)}">${escapeHtml(item.a_title)}</h3>
+                <h4>${isMatch ? '(AniList Match)' : '(AniList)'}</h4>
+                <a href="${escapeHtml(item.a_url)}" target="_blank" class="media-link">View on AniList</a>
+            </div>
+            ${coverHtml(item.a_image, 'AniList Cover', 'No AniList Image')}
+            ${isMatch
+                ? `<div class="details-extra">This ${escapeHtml(REPORT_MEDIA_TYPE)} was found in the AniList database.</div>`
+                : detailsHtml(category, 'a', item)}
+            ${button}
+        </div>`;
+    }
+
+    function applyRowState(section, index, row) {
+        const state = rowStates.get(`${section.category}:${index}`);
+        if (!state) {
+            return;
+        }
+        if (state.synced) {
+            row.classList.add('synced');
+            row.querySelectorAll('.sync-btn').forEach(b => {
+                b.disabled = true;
+                b.textContent = 'Synced!';
+                b.classList.add('success');
+            });
+        } else if (state.error) {
+            const btn = row.querySelector(`.sync-btn[data-target="${state.target}"]`);
+            if (btn) {
+                btn.textContent = 'Error!';
+                btn.title = state.error;
+                btn.classList.add('error');
+            }
+        }
+    }
+
+    function getItem(section, index) {
+        const chunk = section.chunks.get(Math.floor(index / CHUNK_SIZE));
+        return chunk ? chunk[index % CHUNK_SIZE] : undefined;
+    }
+
+    function renderRow(section, position) {
+        const item = getItem(section, position);
+        const row = document.createElement('div');
+        row.style.top = `${position * ROW_HEIGHT}px`;
+        row.dataset.position = position;
+        if (!item) {
+            row.className = 'item loading';
+            row.textContent = 'Loading...';
+            return row;
+        }
+        row.className = 'item';
+        row.dataset.index = item.index;
+        row.innerHTML = kitsuSideHtml(section.category, item) + anilistSideHtml(section.category, item);
+        applyRowState(section, item.index, row);
+        return row;
+    }
+
+    async function loadChunk(section, chunkIndex) {
+        if (section.chunks.has(chunkIndex) || section.loading.has(chunkIndex)) {
+            return;
+        }
+        const generation = section.generation;
+        section.loading.add(chunkIndex);
+        try {
+            const params = queryString({
+                type: REPORT_MEDIA_TYPE,
+                category: section.category,
+                offset: chunkIndex * CHUNK_SIZE,
+                limit: CHUNK_SIZE,
+                q: filters.q,
+                status: filters.status
+            });
+            const response = await fetch(`/api/report?${params}`);
+            const data = await response.json();
+            if (!response.ok) {
+                throw new Error(data.message || 'Could not load report rows');
+            }
+            if (generation !== section.generation) {
+                return;
+            }
+            section.chunks.set(chunkIndex, data.items);
+        } catch (error) {
+            console.error('Report load failed:', error);
+        } finally {
+            if (generation === section.generation) {
+                section.loading.delete(chunkIndex);
+                // Re-render any placeholder rows this chunk covers.
+                section.rows.forEach((row, position) => {
+                    if (Math.floor(position / CHUNK_SIZE) === chunkIndex) {
+                        row.remove();
+                        section.rows.delete(position);
+                    }
+                });
+                scheduleUpdate();
+            }
+        }
+    }
+
+    function updateSection(section) {
+        section.itemsEl.style.height = section.total ? `${section.total * ROW_HEIGHT - 20}px` : '0';
+        if (!section.total) {
+            return;
+        }
+
+        const rect = section.itemsEl.getBoundingClientRect();
+        const first = Math.max(0, Math.floor(-rect.top / ROW_HEIGHT) - OVERSCAN_ROWS);
+        const last = Math.min(section.total - 1, Math.ceil((window.innerHeight - rect.top) / ROW_HEIGHT) + OVERSCAN_ROWS);
+
+        section.rows.forEach((row, position) => {
+            if (position < first || position > last) {
+                row.remove();
+                section.rows.delete(position);
+            }
+        });
+        if (last < first) {
+            return;
+        }
+
+        const firstChunk = Math.floor(first / CHUNK_SIZE);
+        const lastChunk = Math.floor(last / CHUNK_SIZE);
+        for (let c = firstChunk; c <= lastChunk; c++) {
+            loadChunk(section, c);
+        }
+        section.chunks.forEach((_, c) => {
+            if (c < firstChunk - KEEP_CHUNKS || c > lastChunk + KEEP_CHUNKS) {
+                section.chunks.delete(c);
+            }
+        });
+
+        for (let position = first; position <= last; position++) {
+            if (!section.rows.has(position)) {
+                const row = renderRow(section, position);
+                section.rows.set(position, row);
+                section.itemsEl.appendChild(row);
+            }
+        }
+    }
+
+    let updateScheduled = false;
+    function scheduleUpdate() {
+        if (updateScheduled) {
+            return;
+        }
+        updateScheduled = true;
+        requestAnimationFrame(() => {
+            updateScheduled = false;
+            sections.forEach(updateSection);
+        });
+    }
+
+    function resetSection(section, total) {
+        section.generation += 1;
+        section.total = total;
+        section.chunks.clear();
+        section.loading.clear();
+        section.rows.forEach(row => row.remove());
+        section.rows.clear();
+        section.el.querySelector('.section-count').textContent = total;
+        section.el.querySelector('.empty-section').style.display = total ? 'none' : '';
+        section.el.querySelectorAll('.bulk-sync-btn').forEach(b => {
+            b.style.display = total ? '' : 'none';
+        });
+    }
+
+    async function applyFilters() {
+        const params = queryString({ type: REPORT_MEDIA_TYPE, q: filters.q, status: filters.status });
+        try {
+            const response = await fetch(`/api/report?${params}`);
+            const data = await response.json();
+            if (!response.ok) {
+                throw new Error(data.message || 'Could not filter report');
+            }
+            sections.forEach(section => resetSection(section, data.counts[section.category] || 0));
+            scheduleUpdate();
+        } catch (error) {
+            console.error('Filter failed:', error);
+        }
+    }
+
+    let filterTimer = null;
+    document.getElementById('report-filter-q').addEventListener('input', event => {
+        filters.q = event.target.value;
+        clearTimeout(filterTimer);
+        filterTimer = setTimeout(applyFilters, 300);
+    });
+    document.getElementById('report-filter-status').addEventListener('change', event => {
+        filters.status = event.target.value;
+        applyFilters();
     });
 
-    async function handleSyncClick(event) {
-        const btn = event.target;
-        
+    function setRowState(category, index, state) {
+        rowStates.set(`${category}:${index}`, state);
+        const section = sections.find(s => s.category === category);
+        if (!section) {
+            return;
+        }
+        section.rows.forEach(row => {
+            if (row.dataset.index === String(index)) {
+                applyRowState(section, index, row);
+            }
+        });
+    }
+
+    document.addEventListener('click', event => {
+        const btn = event.target.closest('.sync-btn');
+        if (btn) {
+            handleSyncClick(btn);
+            return;
+        }
+        const bulkBtn = event.target.closest('.bulk-sync-btn');
+        if (bulkBtn) {
+            handleBulkSyncClick(bulkBtn);
+        }
+    });
+
+    window.addEventListener('scroll', scheduleUpdate, { passive: true });
+    window.addEventListener('resize', scheduleUpdate);
+    scheduleUpdate();
+
+    async function handleBulkSyncClick(bulkBtn) {
+        const section = sections.find(s => s.el === bulkBtn.closest('.report-section'));
+        const target = bulkBtn.dataset.target;
+        if (!section || !section.total) {
+            return;
+        }
+
+        const originalText = bulkBtn.textContent;
+        bulkBtn.disabled = true;
+        bulkBtn.textContent = 'Queued...';
+
+        try {
+            const response = await fetch('/sync/jobs', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify({
+                    type: REPORT_MEDIA_TYPE,
+                    category: section.category,
+                    target,
+                    q: filters.q,
+                    status: filters.status
+                })
+            });
+
+            const result = await response.json();
+            if (!response.ok || !result.jobId) {
+                throw new Error(result.message || 'Unknown error');
+            }
+
+            let done = 0;
+            const events = new EventSource(`/sync/jobs/${result.jobId}/events`);
+            events.addEventListener('result', e => {
+                const itemResult = JSON.parse(e.data);
+                if (itemResult.success) {
+                    setRowState(section.category, itemResult.ref, { synced: true });
+                } else {
+                    console.error('Sync failed:', itemResult.message);
+                    setRowState(section.category, itemResult.ref, { error: itemResult.message, target });
+                }
+                done += 1;
+                bulkBtn.textContent = `Synced ${done} of ${result.total}...`;
+            });
+            events.addEventListener('done', e => {
+                const summary = JSON.parse(e.data);
+                events.close();
+                bulkBtn.textContent = `${summary.succeeded} synced, ${summary.failed} failed`;
+                if (summary.failed) {
+                    bulkBtn.disabled = false;
+                }
+            });
+            events.onerror = () => {
+                events.close();
+                bulkBtn.disabled = false;
+                bulkBtn.textContent = originalText;
+            };
+        } catch (error) {
+            console.error('Bulk sync failed:', error);
+            bulkBtn.textContent = 'Error!';
+            setTimeout(() => {
+                bulkBtn.disabled = false;
+                bulkBtn.textContent = originalText;
+            }, 3000);
+        }
+    }
+
+    async function handleSyncClick(btn) {
+        const row = btn.closest('.item');
+        const section = sections.find(s => s.el === btn.closest('.report-section'));
+        const index = parseInt(row.dataset.index, 10);
+        const item = getItem(section, parseInt(row.dataset.position, 10));
+        const target = btn.dataset.target;
+        if (!item || !item.sync[target]) {
+            return;
+        }
+
         const originalText = btn.textContent;
-        
+
         btn.disabled = true;
         btn.textContent = 'Syncing...';
 
-        const payload = { ...btn.dataset };
-
         try {
             const response = await fetch('/sync', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json'
                 },
-                body: JSON.stringify(payload)
+                body: JSON.stringify(item.sync[target])
             });
 
             const result = await response.json();
 
             if (response.ok && result.success) {
-                btn.textContent = 'Synced!';
-                btn.classList.add('success');
-                
-                const reportItem = btn.closest('.report-item');
-                if (reportItem) {
-                    reportItem.style.opacity = '0.5';
-                    reportItem.querySelectorAll('.sync-btn').forEach(b => {
-                        b.disabled = true;
-                        b.style.pointerEvents = 'none';
-                    });
-                }
+                setRowState(section.category, index, { synced: true });
             } else {
                 throw new Error(result.message || 'Unknown error');
             }
@@ -46,13 +426,12 @@ document.addEventListener('DOMContentLoaded', () => {
             console.error('Sync failed:', error);
             btn.textContent = 'Error!';
             btn.classList.add('error');
-            
+
             setTimeout(() => {
                 btn.disabled = false;
                 btn.textContent = originalText;
                 btn.classList.remove('error');
-            }, 3000); 
+            }, 3000);
         }
     }
 });
-
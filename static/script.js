@@ -5,6 +5,8 @@ document.getElementById('start-audit-btn').addEventListener('click', () => {
     const progressBar = document.getElementById('progress-bar');
     const startButton = document.getElementById('start-audit-btn');
     const reportLink = document.getElementById('report-link-container');
+    const fetchStats = document.getElementById('fetch-stats');
+    const fetchStatsByProvider = {};
 
     const selectedMediaType = document.querySelector('input[name="mediaType"]:checked').value || 'MANGA';
 
@@ -13,6 +15,7 @@ document.getElementById('start-audit-btn').addEventListener('click', () => {
     progressText.textContent = 'Connecting...';
     progressBar.style.width = '0%';
     progressBar.textContent = '';
+    fetchStats.textContent = '';
     startButton.disabled = true;
     if (reportLink) {
         reportLink.style.display = 'none';
@@ -31,6 +34,7 @@ document.getElementById('start-audit-btn').addEventListener('click', () => {
         if (message.includes("--- Audit Complete ---")) {
             progressText.textContent = "Audit Complete!";
             if (reportLink) {
+                document.getElementById('report-link-btn').href = `/report?type=${selectedMediaType.toLowerCase()}`;
                 reportLink.style.display = 'block';
             }
             evtSource.close(); 
@@ -49,6 +53,21 @@ document.getElementById('start-audit-btn').addEventListener('click', () => {
         progressText.textContent = `(${data.current}/${data.total}) ${data.message}`;
     });
 
+    evtSource.addEventListener("fetch-progress", (event) => {
+        const data = JSON.parse(event.data);
+        const pages = data.pages_total ? `${data.pages_done}/${data.pages_total}` : `${data.pages_done}`;
+        let line = `${data.provider}: ${pages} pages, ${data.entries} entries (${data.entries_per_sec}/s), ${data.requests} requests`;
+        if (data.rate_limit_remaining !== null) {
+            line += `, ${data.rate_limit_remaining} left in rate-limit window`;
+        }
+        line += `, ${data.rate_per_minute} req/min`;
+        if (data.throttled) {
+            line += `, throttled ${data.throttled}x`;
+        }
+        fetchStatsByProvider[data.provider] = line;
+        fetchStats.textContent = Object.values(fetchStatsByProvider).join('\n');
+    });
+
     evtSource.addEventListener("report", (event) => {
         const data = JSON.parse(event.data);
         summary.textContent = JSON.stringify(data, null, 2);
@@ -0,0 +1,240 @@
+import heapq
+import itertools
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from anilist_api import update_anilist_entries_bulk, ANILIST_MUTATION_BATCH_SIZE
+from kitsu_api import add_kitsu_entry, update_kitsu_entry, translate_anilist_to_kitsu_status
+
+SYNC_JOB_WORKERS = 6
+SYNC_MAX_ATTEMPTS = 3
+# Seconds before the first retry; doubled for each one after that.
+SYNC_RETRY_DELAY = 2
+# Finished jobs stay readable for this long before they are dropped.
+FINISHED_JOB_TTL = 60 * 60
+
+VALID_SYNC_TYPES = ('full', 'status', 'add')
+
+def parse_sync_item(data):
+    """
+    Validates one sync operation in the shape the report sends to `/sync`
+    (target, syncType, aMediaId / kEntryId / kMediaId, status, progress,
+    mediaType) and returns it normalized. Raises ValueError when invalid.
+    """
+    target = data.get('target')
+    sync_type = data.get('syncType')
+    if target not in ('anilist', 'kitsu'):
+        raise ValueError(f"Invalid sync target: {target}")
+    if sync_type not in VALID_SYNC_TYPES:
+        raise ValueError(f"Invalid sync_type for {target}: {sync_type}")
+
+    progress = data.get('progress')
+    try:
+        progress = int(progress) if sync_type != 'status' and progress not in (None, '') else None
+    except (ValueError, TypeError):
+        raise ValueError("Invalid progress value; must be an integer.")
+
+    item = {'target': target, 'syncType': sync_type, 'status': data.get('status'), 'progress': progress}
+    if target == 'anilist':
+        try:
+            item['aMediaId'] = int(data.get('aMediaId'))
+        except (ValueError, TypeError):
+            raise ValueError("Invalid aMediaId; must be an integer.")
+    elif sync_type == 'add':
+        if not data.get('kMediaId'):
+            raise ValueError("Missing kMediaId for add operation.")
+        item['kMediaId'] = data['kMediaId']
+        item['mediaType'] = data.get('mediaType') or 'manga'
+    else:
+        if not data.get('kEntryId'):
+            raise ValueError("Missing kEntryId for Kitsu update.")
+        item['kEntryId'] = data['kEntryId']
+    return item
+
+def _is_transient(error):
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    response = getattr(error, 'response', None)
+    return response is not None and (response.status_code == 429 or response.status_code >= 500)
+
+class SyncJob:
+    """
+    One submitted batch of sync operations. Results are recorded as they
+    complete; readers follow them with `wait_for_results`.
+    """
+
+    def __init__(self, items):
+        self.id = uuid.uuid4().hex
+        self.items = items
+        self.created_at = time.time()
+        self.finished_at = None
+        self._results = []
+        self._remaining = len(items)
+        self._cond = threading.Condition()
+
+    def record(self, index, success, message, attempts):
+        with self._cond:
+            self._results.append({
+                'index': index,
+                'target': self.items[index]['target'],
+                'ref': self.items[index].get('ref'),
+                'success': success,
+                'message': message,
+                'attempts': attempts,
+            })
+            self._remaining -= 1
+            if self._remaining == 0:
+                self.finished_at = time.time()
+            self._cond.notify_all()
+
+    @property
+    def finished(self):
+        return self.finished_at is not None
+
+    def summary(self):
+        with self._cond:
+            succeeded = sum(1 for r in self._results if r['success'])
+            return {
+                'jobId': self.id,
+                'total': len(self.items),
+                'done': len(self._results),
+                'succeeded': succeeded,
+                'failed': len(self._results) - succeeded,
+                'finished': self.finished,
+            }
+
+    def wait_for_results(self, after, timeout=None):
+        """
+        Returns (results recorded after the first `after`, finished), waiting
+        up to `timeout` seconds for something new when nothing is pending.
+        """
+        with self._cond:
+            if len(self._results) <= after and not self.finished:
+                self._cond.wait(timeout)
+            return self._results[after:], self.finished
+
+class _DelayedSubmitter:
+    """
+    Submits calls to an executor once their delay has passed. One timer
+    thread holds every pending retry, so waiting out a backoff never ties
+    up a pool worker.
+    """
+
+    def __init__(self, executor):
+        self._executor = executor
+        self._pending = []  # heap of (due time, sequence, fn, args)
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def submit(self, delay, fn, *args):
+        with self._cond:
+            heapq.heappush(self._pending, (time.monotonic() + delay, next(self._sequence), fn, args))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='sync-job-retries', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending or self._pending[0][0] > time.monotonic():
+                    self._cond.wait(self._pending[0][0] - time.monotonic() if self._pending else None)
+                _, _, fn, args = heapq.heappop(self._pending)
+            self._executor.submit(fn, *args)
+
+class SyncJobManager:
+    """
+    Runs sync jobs on a shared worker pool. AniList operations go out as
+    batched mutations, Kitsu operations one request each; every request
+    still passes through its provider's transport and rate limiter, so the
+    pool size only bounds how much waits in parallel. Transient failures
+    (network errors, 429, 5xx) are resubmitted to the pool after a backoff.
+    """
+
+    def __init__(self, workers=SYNC_JOB_WORKERS, max_attempts=SYNC_MAX_ATTEMPTS, retry_delay=SYNC_RETRY_DELAY):
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='sync-job')
+        self._retries = _DelayedSubmitter(self._executor)
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, items, anilist_token=None, with_kitsu_token=None, kitsu_user_id=None):
+        """
+        Queues already-validated items (see `parse_sync_item`) and returns
+        the SyncJob straight away. Kitsu requests go through
+        `with_kitsu_token(request)`, which calls `request(token)` and renews
+        a rejected token (see `CredentialCache.with_kitsu_token`).
+        """
+        job = SyncJob(items)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+
+        anilist_indices = [i for i, item in enumerate(items) if item['target'] == 'anilist']
+        for start in range(0, len(anilist_indices), ANILIST_MUTATION_BATCH_SIZE):
+            chunk = anilist_indices[start:start + ANILIST_MUTATION_BATCH_SIZE]
+            self._executor.submit(self._run_anilist_chunk, job, chunk, anilist_token)
+        for i, item in enumerate(items):
+            if item['target'] == 'kitsu':
+                self._executor.submit(self._run_kitsu_item, job, i, with_kitsu_token, kitsu_user_id)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _prune(self):
+        cutoff = time.time() - FINISHED_JOB_TTL
+        for job_id in [j.id for j in self._jobs.values() if j.finished and j.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def _retry_later(self, attempt, fn, *args):
+        self._retries.submit(self.retry_delay * 2 ** (attempt - 1), fn, *args)
+
+    def _run_anilist_chunk(self, job, pending, token, attempt=1):
+        batch = [{'mediaId': job.items[i]['aMediaId'], 'status': job.items[i]['status'], 'progress': job.items[i]['progress']}
+                 for i in pending]
+        try:
+            results = update_anilist_entries_bulk(batch, token)
+        except Exception as e:
+            results = [{'success': False, 'retryable': False, 'message': str(e)} for _ in pending]
+
+        retry = []
+        for i, result in zip(pending, results):
+            if not result['success'] and result.get('retryable') and attempt < self.max_attempts:
+                retry.append(i)
+            else:
+                job.record(i, result['success'], result['message'], attempt)
+        if retry:
+            self._retry_later(attempt, self._run_anilist_chunk, job, retry, token, attempt + 1)
+
+    def _run_kitsu_item(self, job, index, with_kitsu_token, user_id, attempt=1):
+        item = job.items[index]
+        kitsu_status = translate_anilist_to_kitsu_status(item['status'])
+        try:
+            if item['syncType'] == 'add':
+                if not user_id:
+                    job.record(index, False, 'Could not determine Kitsu user id for add operation.', attempt)
+                    return
+                with_kitsu_token(lambda token: add_kitsu_entry(user_id, item['kMediaId'], kitsu_status, item['progress'] or 0, token,
+                                                               media_type=item['mediaType'], raise_on_error=True))
+                job.record(index, True, 'Kitsu entry added.', attempt)
+            else:
+                progress = item['progress'] if item['syncType'] == 'full' else None
+                if not with_kitsu_token(lambda token: update_kitsu_entry(item['kEntryId'], kitsu_status, progress, token, raise_on_error=True)):
+                    job.record(index, False, 'Nothing to update.', attempt)
+                else:
+                    job.record(index, True, 'Kitsu entry updated.', attempt)
+        except requests.exceptions.RequestException as e:
+            if not _is_transient(e) or attempt >= self.max_attempts:
+                job.record(index, False, f"Request failed: {e}", attempt)
+                return
+            self._retry_later(attempt, self._run_kitsu_item, job, index, with_kitsu_token, user_id, attempt + 1)
+        except Exception as e:
+            job.record(index, False, str(e), attempt)
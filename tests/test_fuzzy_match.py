@@ -0,0 +1,65 @@
+import pytest
+
+from fuzzy_match import canonicalize, fuzzy_match_pairs, FUZZY_MATCH_THRESHOLD
+from normalization import normalize_title_for_match
+
+def _pairs(kitsu_titles, anilist_titles):
+    kitsu_items = [(i, [normalize_title_for_match(t)]) for i, t in enumerate(kitsu_titles)]
+    anilist_items = [(i, [normalize_title_for_match(t)]) for i, t in enumerate(anilist_titles)]
+    return [(p['kitsu_key'], p['anilist_key']) for p in fuzzy_match_pairs(kitsu_items, anilist_items)]
+
+@pytest.mark.parametrize('title, expected', [
+    ('overlord ii', 'overlord 2'),
+    ('overlord iii', 'overlord 3'),
+    ('persona x', 'persona 10'),
+    ('hunter x hunter', 'hunter x hunter'),
+    ('attack on titan 2nd season', 'attack on titan s2'),
+    ('attack on titan season 2', 'attack on titan s2'),
+])
+def test_canonicalize(title, expected):
+    assert canonicalize(title) == expected
+
+@pytest.mark.parametrize('kitsu_title, anilist_title', [
+    ('Kaguya-sama wa Kokurasetai: Tensai-tachi no Renai Zunousen', 'Kaguya-sama wa Kokurasetai - Tensai-tachi no Renai Zunousen'),
+    ('Attack on Titan 2nd Season', 'Attack on Titan Season 2'),
+    ('Sword Art Online Progressive', 'Sword Art Online: Progressive'),
+    ('Mushoku Tensei: Isekai Ittara Honki Dasu', 'Mushoku Tensei: Isekai Ittara Honki Dasu - Jobless Reincarnation'),
+])
+def test_pairs_spelling_variants(kitsu_title, anilist_title):
+    assert _pairs([kitsu_title], [anilist_title]) == [(0, 0)]
+
+@pytest.mark.parametrize('kitsu_title, anilist_title', [
+    ('Overlord II', 'Overlord III'),
+    ('Overlord', 'Overlord II'),
+    ('Mob Psycho 100 II', 'Mob Psycho 100 III'),
+    ('Attack on Titan Season 2', 'Attack on Titan Season 3'),
+    ('Attack on Titan 2nd Season', 'Attack on Titan'),
+    ('Kaguya-sama wa Kokurasetai', 'Kaguya-sama wa Kokurasetai Season 2'),
+    ('Shingeki no Kyojin The Final Season', 'Shingeki no Kyojin The Final Season Part 2'),
+    ('Shingeki no Kyojin Attack', 'Shingeki no Kyojin Attack The Final Season'),
+    ('Ascendance of a Bookworm', 'Ascendance of a Bookworm Part 2'),
+    ('Re:Zero kara Hajimeru Isekai Seikatsu', 'Re:Zero kara Hajimeru Isekai Seikatsu 2nd Season'),
+])
+def test_never_pairs_sequels(kitsu_title, anilist_title):
+    assert _pairs([kitsu_title], [anilist_title]) == []
+    assert _pairs([anilist_title], [kitsu_title]) == []
+
+def test_sequel_pairs_with_its_own_season():
+    kitsu = ['Overlord II', 'Overlord III']
+    anilist = ['Overlord III', 'Overlord', 'Overlord II']
+    assert sorted(_pairs(kitsu, anilist)) == [(0, 2), (1, 0)]
+
+def test_ambiguous_candidates_are_left_for_search():
+    kitsu_items = [(0, ['tokyo ghoul re'])]
+    anilist_items = [(0, ['tokyo ghoul re']), (1, ['tokyo ghoul re'])]
+    assert fuzzy_match_pairs(kitsu_items, anilist_items) == []
+
+def test_incompatible_pairs_are_skipped():
+    kitsu_items = [(0, ['some long manga title here'])]
+    anilist_items = [(0, ['some long manga title here'])]
+    assert fuzzy_match_pairs(kitsu_items, anilist_items, is_compatible=lambda k, a: False) == []
+
+def test_threshold_is_respected():
+    kitsu_items = [(0, ['completely different words'])]
+    anilist_items = [(0, ['nothing alike at all'])]
+    assert fuzzy_match_pairs(kitsu_items, anilist_items, threshold=FUZZY_MATCH_THRESHOLD) == []
@@ -0,0 +1,131 @@
+import time
+
+import pytest
+
+import library_snapshots
+from library_snapshots import SnapshotStore, iter_anilist_library, iter_kitsu_library
+
+USER_ID = 7
+
+def anilist_entry(media_id, updated_at, progress=0):
+    return {'mediaId': media_id, 'updatedAt': updated_at, 'progress': progress, 'titles': [f"Title {media_id}"]}
+
+def kitsu_entry(entry_id, updated_at, progress=0):
+    return {'libraryEntryId': str(entry_id), 'media_id': str(entry_id), 'updatedAt': updated_at,
+            'progress': progress, 'titles': {f"Title {entry_id}"}}
+
+def kitsu_time(n):
+    return f"2024-01-01T00:00:{n:02d}.000Z"
+
+class FakeProvider:
+    """Stands in for one provider's full page iterator and change fetcher."""
+
+    def __init__(self, library, count=None):
+        self.library = library
+        self.count = count
+        self.full_fetches = 0
+        self.change_fetches = []
+        self.changes_fail = False
+
+    def pages(self, user_id, token, media_type, progress=None, library_info=None, page_callback=None):
+        self.full_fetches += 1
+        library_info.update(complete=True, count=len(self.library) if self.count is None else self.count)
+        for i in range(0, len(self.library), 2):
+            yield self.library[i:i + 2]
+
+    def changes(self, user_id, token, media_type, progress=None, updated_after=None, library_info=None, page_callback=None):
+        self.change_fetches.append(updated_after)
+        library_info.update(complete=not self.changes_fail, count=len(self.library) if self.count is None else self.count)
+        return [e for e in self.library if e.get('updatedAt') and e['updatedAt'] > updated_after]
+
+@pytest.fixture
+def store(tmp_path):
+    return SnapshotStore(str(tmp_path / 'snapshots.sqlite3'))
+
+@pytest.fixture
+def anilist(monkeypatch):
+    provider = FakeProvider([anilist_entry(1, 100), anilist_entry(2, 200), anilist_entry(3, 300)])
+    monkeypatch.setattr(library_snapshots, 'iter_anilist_library_pages', provider.pages)
+    monkeypatch.setattr(library_snapshots, 'fetch_anilist_library_entries', provider.changes)
+    return provider
+
+@pytest.fixture
+def kitsu(monkeypatch):
+    provider = FakeProvider([kitsu_entry(1, kitsu_time(1)), kitsu_entry(2, kitsu_time(2)), kitsu_entry(3, kitsu_time(3))])
+    monkeypatch.setattr(library_snapshots, 'iter_kitsu_library_pages', provider.pages)
+    monkeypatch.setattr(library_snapshots, 'fetch_kitsu_library', provider.changes)
+    return provider
+
+def _anilist(store):
+    return [e for batch in iter_anilist_library(store, USER_ID, 'token', 'MANGA') for e in batch]
+
+def _kitsu(store):
+    return [e for batch in iter_kitsu_library(store, USER_ID, 'token', 'manga') for e in batch]
+
+def test_first_anilist_run_is_a_full_refresh_page_by_page(store, anilist):
+    batches = list(iter_anilist_library(store, USER_ID, 'token', 'MANGA'))
+    assert [len(b) for b in batches] == [2, 1]
+    assert anilist.full_fetches == 1
+    assert store.load_meta('anilist', USER_ID, 'MANGA')['last_updated_at'] == '300'
+    assert [e['mediaId'] for e in store.load_entries('anilist', USER_ID, 'MANGA')] == [1, 2, 3]
+
+def test_incremental_anilist_refresh_merges_changes_into_the_snapshot(store, anilist):
+    _anilist(store)
+    anilist.library[1] = anilist_entry(2, 400, progress=5)
+    anilist.library.append(anilist_entry(4, 500))
+
+    entries = _anilist(store)
+    assert anilist.full_fetches == 1
+    assert anilist.change_fetches == [300]
+    assert sorted((e['mediaId'], e['progress']) for e in entries) == [(1, 0), (2, 5), (3, 0), (4, 0)]
+    assert store.load_meta('anilist', USER_ID, 'MANGA')['last_updated_at'] == '500'
+
+    # Nothing changed since: the watermark holds and the snapshot is served as is.
+    assert len(_anilist(store)) == 4
+    assert anilist.change_fetches == [300, 500]
+    assert store.load_meta('anilist', USER_ID, 'MANGA')['last_updated_at'] == '500'
+
+def test_failed_anilist_change_walk_falls_back_to_a_full_refresh(store, anilist):
+    _anilist(store)
+    anilist.changes_fail = True
+    assert len(_anilist(store)) == 3
+    assert anilist.full_fetches == 2
+
+def test_old_snapshot_gets_a_full_refresh(store, anilist, monkeypatch):
+    _anilist(store)
+    monkeypatch.setattr(library_snapshots, 'FULL_REFRESH_AFTER_SECONDS', -1)
+    _anilist(store)
+    assert anilist.full_fetches == 2
+    assert anilist.change_fetches == []
+
+def test_watermark_falls_back_to_fetch_time_without_updated_at(store, anilist):
+    anilist.library[:] = [anilist_entry(1, None), anilist_entry(2, None)]
+    started = int(time.time())
+    _anilist(store)
+    assert int(store.load_meta('anilist', USER_ID, 'MANGA')['last_updated_at']) >= started
+
+    _anilist(store)
+    assert anilist.change_fetches == [pytest.approx(started, abs=2)]
+
+def test_incremental_kitsu_refresh_when_the_count_matches(store, kitsu):
+    _kitsu(store)
+    kitsu.library[0] = kitsu_entry(1, kitsu_time(9), progress=4)
+
+    entries = _kitsu(store)
+    assert kitsu.full_fetches == 1
+    assert kitsu.change_fetches == [kitsu_time(3)]
+    assert sorted((e['libraryEntryId'], e['progress']) for e in entries) == [('1', 4), ('2', 0), ('3', 0)]
+    assert all(isinstance(e['titles'], set) for e in entries)
+    assert store.load_meta('kitsu', USER_ID, 'manga')['last_updated_at'] == kitsu_time(9)
+
+def test_kitsu_count_mismatch_falls_back_to_a_full_refresh(store, kitsu):
+    _kitsu(store)
+    # An entry removed on Kitsu leaves no trace in the change walk; only the
+    # live count gives it away.
+    del kitsu.library[1]
+
+    entries = _kitsu(store)
+    assert kitsu.change_fetches == [kitsu_time(3)]
+    assert kitsu.full_fetches == 2
+    assert sorted(e['libraryEntryId'] for e in entries) == ['1', '3']
+    assert sorted(e['libraryEntryId'] for e in store.load_entries('kitsu', USER_ID, 'manga')) == ['1', '3']
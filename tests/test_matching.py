@@ -0,0 +1,133 @@
+import itertools
+import random
+
+import pytest
+
+from matching import IncrementalMatcher, ids_compatible
+from normalization import normalize_title_for_match, normalize_titles_for_match
+
+def _norms(titles):
+    norms = []
+    for title in titles:
+        norm = normalize_title_for_match(title)
+        if norm and norm not in norms:
+            norms.append(norm)
+    return norms
+
+def full_scan(kitsu_entries, anilist_entries):
+    """Pairs both complete libraries in one pass: AniList ID, then MAL ID, then shared title."""
+    anilist_by_id = {}
+    for entry in anilist_entries:
+        anilist_by_id.setdefault(entry['mediaId'], entry)
+    by_mal_id = {}
+    title_index = {}
+    for media_id, entry in anilist_by_id.items():
+        if entry.get('idMal'):
+            by_mal_id.setdefault(entry['idMal'], media_id)
+        for norm in _norms(entry['titles']):
+            title_index.setdefault(norm, []).append(media_id)
+
+    pairs = set()
+    matched_kitsu = set()
+    matched_anilist = set()
+
+    def pair(i, media_id, by_id):
+        matched_kitsu.add(i)
+        matched_anilist.add(media_id)
+        pairs.add((i, media_id, by_id))
+
+    for i, entry in enumerate(kitsu_entries):
+        media_id = entry.get('anilistId')
+        if media_id in anilist_by_id and media_id not in matched_anilist:
+            pair(i, media_id, True)
+    for i, entry in enumerate(kitsu_entries):
+        media_id = by_mal_id.get(entry.get('malId'))
+        if i not in matched_kitsu and media_id is not None and media_id not in matched_anilist and ids_compatible(entry, anilist_by_id[media_id]):
+            pair(i, media_id, True)
+    for i, entry in enumerate(kitsu_entries):
+        if i in matched_kitsu:
+            continue
+        candidates = (media_id for norm in _norms(entry['titles']) for media_id in title_index.get(norm, ()))
+        for media_id in candidates:
+            if media_id not in matched_anilist and ids_compatible(entry, anilist_by_id[media_id]):
+                pair(i, media_id, False)
+                break
+    return pairs
+
+def build_libraries(seed, size=300):
+    rng = random.Random(seed)
+    titles = [f"Series {n}: Part {n % 7}" for n in range(size // 2)]
+    anilist_entries = []
+    for n in range(size):
+        entry_titles = [rng.choice(titles)] + ([f"AniList Only {n}"] if rng.random() < 0.5 else [])
+        anilist_entries.append({'mediaId': 1000 + n, 'idMal': 5000 + n if rng.random() < 0.6 else None, 'titles': entry_titles})
+    # A few duplicate pages, as AniList sends when the list changes mid-fetch.
+    anilist_entries += rng.sample(anilist_entries, 5)
+
+    kitsu_entries = []
+    for n in range(size):
+        roll = rng.random()
+        entry = {'titles': [rng.choice(titles).upper()], 'anilistId': None, 'malId': None}
+        if roll < 0.3:
+            # Two Kitsu entries may claim the same AniList entry.
+            entry['anilistId'] = 1000 + rng.randrange(size + 20)
+        elif roll < 0.6:
+            entry['malId'] = 5000 + rng.randrange(size)
+        kitsu_entries.append(entry)
+    return kitsu_entries, anilist_entries
+
+def _pages(entries, size):
+    return [entries[i:i + size] for i in range(0, len(entries), size)]
+
+def incremental(kitsu_entries, anilist_entries, kitsu_page, anilist_page, anilist_first):
+    matcher = IncrementalMatcher(normalize_titles_for_match)
+    pairs = []
+    for kitsu_batch, anilist_batch in itertools.zip_longest(_pages(kitsu_entries, kitsu_page), _pages(anilist_entries, anilist_page)):
+        if anilist_first:
+            pairs += matcher.add_anilist(anilist_batch or [])
+            pairs += matcher.add_kitsu(kitsu_batch or [])
+        else:
+            pairs += matcher.add_kitsu(kitsu_batch or [])
+            pairs += matcher.add_anilist(anilist_batch or [])
+    pairs += matcher.finish()
+    return pairs, matcher
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('kitsu_page, anilist_page, anilist_first', [
+    (500, 500, False),
+    (50, 50, False),
+    (50, 50, True),
+    (7, 93, False),
+    (93, 7, True),
+])
+def test_incremental_matches_full_scan(seed, kitsu_page, anilist_page, anilist_first):
+    kitsu_entries, anilist_entries = build_libraries(seed)
+    pairs, matcher = incremental(kitsu_entries, anilist_entries, kitsu_page, anilist_page, anilist_first)
+
+    assert set(pairs) == full_scan(kitsu_entries, anilist_entries)
+    assert len(pairs) == len(set(pairs))
+    assert matcher.matched_kitsu == {i for i, _, _ in pairs}
+    assert matcher.matched_anilist == {media_id for _, media_id, _ in pairs}
+    assert matcher.id_match_count == sum(1 for _, _, by_id in pairs if by_id)
+
+def test_id_pairs_are_made_while_fetching_and_title_pairs_only_at_finish():
+    matcher = IncrementalMatcher(normalize_titles_for_match)
+    assert matcher.add_kitsu([
+        {'titles': ['Mapped'], 'anilistId': 1, 'malId': None},
+        {'titles': ['Shared Title'], 'anilistId': None, 'malId': None},
+    ]) == []
+    assert matcher.add_anilist([
+        {'mediaId': 1, 'idMal': None, 'titles': ['Something Else']},
+        {'mediaId': 2, 'idMal': None, 'titles': ['Shared Title!']},
+    ]) == [(0, 1, True)]
+    assert matcher.finish() == [(1, 2, False)]
+
+def test_title_pair_never_overrides_a_later_id_mapping():
+    # Kitsu entry 0 shares a title with AniList 2, but Kitsu entry 1 (on a
+    # later page) maps to AniList 2 by ID: the ID mapping must win.
+    matcher = IncrementalMatcher(normalize_titles_for_match)
+    pairs = matcher.add_anilist([{'mediaId': 2, 'idMal': None, 'titles': ['Same Name']}])
+    pairs += matcher.add_kitsu([{'titles': ['Same Name'], 'anilistId': None, 'malId': None}])
+    pairs += matcher.add_kitsu([{'titles': ['Other Name'], 'anilistId': 2, 'malId': None}])
+    pairs += matcher.finish()
+    assert pairs == [(1, 2, True)]
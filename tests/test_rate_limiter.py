@@ -0,0 +1,95 @@
+import threading
+import time
+
+import pytest
+
+from rate_limiter import TokenBucket, budget_share
+
+class _Response:
+    def __init__(self, status_code=200, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+def _bucket(**kwargs):
+    options = dict(rate=10, burst=2, min_rate=0.5, max_rate=10, window=60, default_retry_after=7)
+    options.update(kwargs)
+    return TokenBucket('test', **options)
+
+def _pause_left(bucket):
+    return bucket._paused_until - time.monotonic()
+
+def test_429_halves_rate_and_pauses_for_retry_after():
+    bucket = _bucket()
+    bucket.observe(_Response(429, {'Retry-After': '3'}))
+    assert bucket.rate == 5
+    assert bucket.throttled_count == 1
+    assert bucket._tokens == 0
+    assert 2.9 <= _pause_left(bucket) <= 3
+
+def test_429_pause_follows_the_reset_header_without_retry_after():
+    bucket = _bucket()
+    bucket.observe(_Response(429, {'X-RateLimit-Reset': str(int(time.time()) + 20)}))
+    assert 18.9 <= _pause_left(bucket) <= 20
+
+@pytest.mark.parametrize('headers, pause', [
+    ({}, 7),
+    ({'Retry-After': 'soon'}, 7),
+    ({'Retry-After': '-5'}, 0),
+])
+def test_429_pause_without_a_usable_header(headers, pause):
+    bucket = _bucket()
+    bucket.observe(_Response(429, headers))
+    assert pause - 0.1 <= _pause_left(bucket) <= pause
+
+def test_repeated_429s_stop_at_min_rate():
+    bucket = _bucket()
+    for _ in range(10):
+        bucket.observe(_Response(429, {'Retry-After': '0'}))
+    assert bucket.rate == bucket.min_rate
+    assert bucket.throttled_count == 10
+
+def test_success_creeps_back_towards_max_rate():
+    bucket = _bucket(rate=5)
+    bucket.observe(_Response(200))
+    assert bucket.rate == pytest.approx(5.5)
+    for _ in range(20):
+        bucket.observe(_Response(200))
+    assert bucket.rate == bucket.max_rate
+
+def test_budget_headers_set_max_rate_and_spread_the_last_of_the_budget():
+    bucket = _bucket(rate=1.5, max_rate=3, min_rate=0.05)
+    bucket.observe(_Response(200, {'X-RateLimit-Limit': '90', 'X-RateLimit-Remaining': '6'}))
+    assert bucket.remaining == 6
+    assert bucket.max_rate == 1.5
+    assert bucket.rate == pytest.approx(6 / 60)
+
+def test_acquire_waits_out_a_429_pause():
+    bucket = _bucket(rate=100, burst=5, default_retry_after=0.3)
+    bucket.observe(_Response(429))
+    started = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - started >= 0.25
+
+def test_waiting_shares_are_served_round_robin():
+    bucket = _bucket(rate=50, burst=1)
+    bucket._tokens = 0
+    served = []
+    lock = threading.Lock()
+
+    def worker(share, count):
+        budget_share.set(share)
+        for _ in range(count):
+            bucket.acquire()
+            with lock:
+                served.append(share)
+
+    busy = threading.Thread(target=worker, args=('busy', 6))
+    busy.start()
+    time.sleep(0.005)
+    quiet = threading.Thread(target=worker, args=('quiet', 2))
+    quiet.start()
+    busy.join()
+    quiet.join()
+    # The quiet share gets its two tokens long before the busy one is done.
+    assert served.index('quiet') <= 2
+    assert [i for i, share in enumerate(served) if share == 'quiet'][-1] <= 4
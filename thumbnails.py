@@ -0,0 +1,185 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional; without it covers are cached at their source size.
+    Image = None
+
+# Covers are shown at 150px wide; thumbnails are sized for 2x displays.
+THUMBNAIL_WIDTH = 300
+THUMBNAIL_CACHE_MAX_BYTES = 200 * 1024 * 1024
+THUMBNAIL_JPEG_QUALITY = 85
+# Only artwork from the two providers' CDNs is proxied.
+IMAGE_HOSTS = ('kitsu.app', 'kitsu.io', 'anilist.co')
+
+# Known variant widths, smallest first. Kitsu's original has no fixed size.
+KITSU_POSTER_WIDTHS = [('tiny', 110), ('small', 284), ('medium', 390), ('large', 550), ('original', None)]
+ANILIST_COVER_WIDTHS = [('medium', 100), ('large', 230), ('extraLarge', 460)]
+
+IMAGE_EXTENSIONS = {'image/jpeg': '.jpg', 'image/png': '.png', 'image/webp': '.webp', 'image/gif': '.gif'}
+
+def smallest_image(images, widths, min_width=THUMBNAIL_WIDTH):
+    """
+    URL of the smallest variant in `images` at least `min_width` wide, or
+    the largest one present when none is big enough.
+    """
+    if not isinstance(images, dict):
+        return None
+    present = [(name, width) for name, width in widths if images.get(name)]
+    for name, width in present:
+        if width is None or width >= min_width:
+            return images[name]
+    return images[present[-1][0]] if present else None
+
+def is_proxied_image_url(url):
+    parsed = urlparse(url or '')
+    host = (parsed.hostname or '').lower()
+    return parsed.scheme in ('http', 'https') and any(host == h or host.endswith('.' + h) for h in IMAGE_HOSTS)
+
+def _downscale(data, width):
+    # Returns (bytes, extension); extension is None when the image is kept as is.
+    if Image is None:
+        return data, None
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            if img.width <= width:
+                return data, None
+            height = max(1, round(img.height * width / img.width))
+            thumb = img.convert('RGB').resize((width, height), Image.LANCZOS)
+            out = io.BytesIO()
+            thumb.save(out, 'JPEG', quality=THUMBNAIL_JPEG_QUALITY, optimize=True)
+            return out.getvalue(), '.jpg'
+    except (OSError, ValueError):
+        return data, None
+
+class ThumbnailCache:
+    """
+    On-disk cache of downscaled cover art, keyed by source URL. Each cover
+    is downloaded and resized once; the least recently served files are
+    deleted once the directory grows past `max_bytes`. File modification
+    times record recency, so the LRU order survives restarts.
+    """
+
+    def __init__(self, directory, max_bytes=THUMBNAIL_CACHE_MAX_BYTES, width=THUMBNAIL_WIDTH, timeout=15):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.width = width
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=8)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._files = OrderedDict()  # key -> (filename, size), least recently used first
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._fetch_locks = {}  # key -> [lock, number of callers using it]
+
+        os.makedirs(directory, exist_ok=True)
+        existing = []
+        for filename in os.listdir(directory):
+            key, ext = os.path.splitext(filename)
+            if ext in IMAGE_EXTENSIONS.values():
+                stat = os.stat(os.path.join(directory, filename))
+                existing.append((stat.st_mtime, key, filename, stat.st_size))
+        for _, key, filename, size in sorted(existing):
+            self._files[key] = (filename, size)
+            self._total_bytes += size
+
+    def get(self, url):
+        """
+        Returns the path of the thumbnail for `url`, downloading and
+        downscaling it on first use. Raises ValueError for URLs outside
+        IMAGE_HOSTS or responses that are not images, and RequestException
+        when the download fails.
+        """
+        if not is_proxied_image_url(url):
+            raise ValueError(f"Not a Kitsu or AniList image URL: {url}")
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+        path = self._touch(key)
+        if path:
+            return path
+        # Concurrent requests for the same cover wait for one download. The
+        # lock stays registered until its last waiter is done, so a caller
+        # arriving meanwhile queues behind it instead of starting its own.
+        with self._lock:
+            fetch_entry = self._fetch_locks.setdefault(key, [threading.Lock(), 0])
+            fetch_entry[1] += 1
+        try:
+            with fetch_entry[0]:
+                path = self._touch(key)
+                if path:
+                    return path
+                data, ext = self._download(url)
+                data, resized_ext = _downscale(data, self.width)
+                return self._store(key, key + (resized_ext or ext), data)
+        finally:
+            with self._lock:
+                fetch_entry[1] -= 1
+                if not fetch_entry[1]:
+                    del self._fetch_locks[key]
+
+    def _touch(self, key):
+        with self._lock:
+            entry = self._files.get(key)
+            if not entry:
+                return None
+            path = os.path.join(self.directory, entry[0])
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                del self._files[key]
+                self._total_bytes -= entry[1]
+                return None
+            self._files.move_to_end(key)
+            return path
+
+    def _download(self, url):
+        response = self.session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        ext = IMAGE_EXTENSIONS.get(content_type)
+        if not ext:
+            raise ValueError(f"Unsupported image type: {content_type or 'unknown'}")
+        return response.content, ext
+
+    def _store(self, key, filename, data):
+        path = os.path.join(self.directory, filename)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            old_entry = self._files.pop(key, None)
+            if old_entry:
+                self._total_bytes -= old_entry[1]
+                if old_entry[0] != filename:
+                    try:
+                        os.remove(os.path.join(self.directory, old_entry[0]))
+                    except FileNotFoundError:
+                        pass
+            self._files[key] = (filename, len(data))
+            self._total_bytes += len(data)
+            # Always keep the file just written, even if it alone is over budget.
+            while self._total_bytes > self.max_bytes and len(self._files) > 1:
+                _, (old_filename, old_size) = self._files.popitem(last=False)
+                self._total_bytes -= old_size
+                try:
+                    os.remove(os.path.join(self.directory, old_filename))
+                except FileNotFoundError:
+                    pass
+        return path
+
+    def stats(self):
+        with self._lock:
+            return {'files': len(self._files), 'bytes': self._total_bytes, 'max_bytes': self.max_bytes}